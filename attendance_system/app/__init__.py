@@ -1,7 +1,13 @@
+from functools import cached_property
+
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import import_string
 from config import Config # Assuming attendance_system is in PYTHONPATH
-from .models import db, User # Import db and User model
+from sqlalchemy import create_engine
+from .models import db, User, REPLICA_EXTENSION_KEY # Import db and User model
 from flask_login import LoginManager
+from . import fragments, profiling, sessions
 
 login_manager = LoginManager()
 login_manager.login_view = 'login' # Adjusted as per instruction, will be routes.login
@@ -11,16 +17,51 @@ login_manager.login_message_category = 'info'
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+class LazyView:
+    # Imports the view function on first call (Flask's "lazily loading views" pattern),
+    # so endpoint names stay the same while startup skips the web stack.
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+class _LazyViews:
+    # `routes.home` -> LazyView('app.routes.home'), keeps the registrations below readable
+    def __init__(self, module_name):
+        self.module_name = module_name
+
+    def __getattr__(self, name):
+        view = LazyView(f'{self.module_name}.{name}')
+        setattr(self, name, view) # One view object per endpoint, even if it has several rules
+        return view
+
 def create_app(config_class=Config):
-    app = Flask(__name__)
+    app = Flask(__name__, template_folder='../templates') # Templates live next to the package
     app.config.from_object(config_class)
+    if app.config.get('TRUSTED_PROXY_HOPS'):
+        # Client IPs (login rate limiting) come from the proxies' X-Forwarded-For
+        hops = app.config['TRUSTED_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
 
     db.init_app(app) # Initialize db with the app
+    if app.config.get('READ_REPLICA_URL'):
+        # Not an SQLALCHEMY_BINDS entry: the replica has the same tables as the primary
+        # and must never be created or written to by this app
+        app.extensions[REPLICA_EXTENSION_KEY] = create_engine(app.config['READ_REPLICA_URL'])
     login_manager.init_app(app) # Initialize login_manager with the app
+    fragments.init_app(app) # Template bytecode cache and {% cache %} fragments
+    sessions.init_app(app) # Server-side sessions if SESSION_BACKEND = 'database'
+    profiling.init_app(app) # Sampled request profiles if PROFILING is on
 
-    from . import routes # Import routes module
-
-    # Register routes from the routes module
+    # Register routes from the routes module; the module (and with it WTForms and the
+    # form classes) is only imported when the first request is dispatched
+    routes = _LazyViews(f'{__name__}.routes')
     app.add_url_rule('/', 'home', routes.home)
     # app.add_url_rule('/home', 'home_alt', routes.home) # 'home' endpoint covers both / and /home via routes.py logic if desired, or keep separate
     app.add_url_rule('/home', 'home', routes.home)
@@ -39,10 +80,28 @@ def create_app(config_class=Config):
     app.add_url_rule('/add_student', 'add_student', routes.add_student, methods=['GET', 'POST'])
     app.add_url_rule('/edit_student/<int:student_id>', 'edit_student', routes.edit_student, methods=['GET', 'POST'])
     app.add_url_rule('/delete_student/<int:student_id>', 'delete_student', routes.delete_student, methods=['POST'])
+    app.add_url_rule('/students/<int:student_id>/history', 'student_history', routes.student_history)
 
     # Attendance route
     app.add_url_rule('/attendance/take', 'take_attendance', routes.take_attendance, methods=['GET', 'POST'])
     app.add_url_rule('/attendance/view', 'view_attendance', routes.view_attendance, methods=['GET', 'POST'])
+    app.add_url_rule('/attendance/matrix', 'attendance_matrix', routes.attendance_matrix, methods=['GET', 'POST'])
+
+    # Early-warning alerts
+    app.add_url_rule('/alerts', 'absence_alerts', routes.absence_alerts)
+    app.add_url_rule('/alerts.json', 'absence_alerts_json', routes.absence_alerts_json)
+    app.add_url_rule('/attendance/missing', 'missing_marks', routes.missing_marks, methods=['GET', 'POST'])
+
+    # JSON API: asynchronous attendance submission
+    app.add_url_rule('/api/attendance', 'submit_attendance_api', routes.submit_attendance_api, methods=['POST'])
+    app.add_url_rule('/api/attendance/<ticket_id>', 'attendance_ticket_api', routes.attendance_ticket_api)
+    app.add_url_rule('/api/scans', 'ingest_scans_api', routes.ingest_scans_api, methods=['POST'])
+    app.add_url_rule('/api/changes', 'changes_feed', routes.changes_feed)
+
+    # Admin counters
+    app.add_url_rule('/admin/login_throttle.json', 'login_throttle_stats', routes.login_throttle_stats)
+    app.add_url_rule('/admin/profiles', 'request_profiles', routes.request_profiles)
+    app.add_url_rule('/admin/profiles/<int:profile_id>.folded', 'download_profile', routes.download_profile)
 
     # The login_manager.login_view = 'login' set earlier will use the 'login' endpoint defined above.
     # current_user will be available in templates due to login_manager.
@@ -50,5 +109,7 @@ def create_app(config_class=Config):
     return app
 
 def create_db(app_instance):
+    from .migrations import stamp
     with app_instance.app_context():
         db.create_all()
+        stamp() # Fresh tables already match the models
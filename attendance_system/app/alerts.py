@@ -0,0 +1,160 @@
+"""Chronic absence early-warning counters.
+
+Each student has one AbsenceCounter row that is updated from the marks that changed
+in a save (see app/attendance.py), so detection costs O(changed students) per
+submission. The alerts page and JSON feed only read counters with ``in_alert`` set.
+
+``recent_bits`` is a sliding window over the student's last marked school days:
+bit 0 is ``last_date`` and a set bit means absent. New days shift the window and
+edits of ``last_date`` itself flip bit 0. A mark for an older day (a late or
+corrected mark) can change any bit or insert a day into the window, so the window
+and streak are then rebuilt from the student's last marked days (one query).
+"""
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import Integer, cast, func
+
+from .models import db, AbsenceCounter, Attendance, Student
+from .tenancy import school_filter
+
+
+def _settings():
+    config = current_app.config
+    return {
+        'streak': config.get('ABSENCE_ALERT_STREAK', 3),
+        'window': config.get('ABSENCE_ALERT_WINDOW', 20),
+        'min_days': config.get('ABSENCE_ALERT_MIN_DAYS', 5),
+        'rate': config.get('CHRONIC_ABSENCE_THRESHOLD', 0.10),
+    }
+
+
+def _trailing_ones(bits, width):
+    count = 0
+    while count < width and bits & (1 << count):
+        count += 1
+    return count
+
+
+def _new_counter(student_id):
+    return AbsenceCounter(student_id=student_id, current_streak=0, recent_bits=0, recent_days=0,
+                          recent_absences=0, total_days=0, total_absences=0, in_alert=False)
+
+
+def _apply(counter, day, old_value, new_value, settings):
+    absent = not new_value
+    if old_value is None:
+        counter.total_days += 1
+        counter.total_absences += int(absent)
+    else:
+        counter.total_absences += int(absent) - int(not old_value)
+
+    mask = (1 << settings['window']) - 1
+    if counter.last_date is None or day > counter.last_date:
+        counter.recent_bits = ((counter.recent_bits << 1) | int(absent)) & mask
+        counter.recent_days = min(counter.recent_days + 1, settings['window'])
+        counter.current_streak = counter.current_streak + 1 if absent else 0
+        counter.last_date = day
+    elif day == counter.last_date:
+        counter.recent_bits = (counter.recent_bits & ~1) | int(absent)
+        # The run before last_date is still in the window (capped at its width)
+        counter.current_streak = 1 + _trailing_ones(counter.recent_bits >> 1, counter.recent_days - 1) if absent else 0
+    else:
+        _rebuild_window(counter, settings)
+    counter.recent_absences = counter.recent_bits.bit_count()
+
+    in_alert = is_alert(counter, settings)
+    if in_alert and not counter.in_alert:
+        counter.alert_since = day
+    elif not in_alert:
+        counter.alert_since = None
+    counter.in_alert = in_alert
+    counter.updated_at = datetime.utcnow()
+
+
+def _rebuild_window(counter, settings):
+    # The student's last marked days, newest first; present if any period was (attendance.day_status)
+    days = db.session.query(Attendance.date, func.max(cast(Attendance.is_present, Integer))) \
+        .filter(Attendance.student_id == counter.student_id) \
+        .group_by(Attendance.date) \
+        .order_by(Attendance.date.desc()) \
+        .limit(settings['window']) \
+        .all()
+    counter.recent_bits = sum(int(not present) << i for i, (_, present) in enumerate(days))
+    counter.recent_days = len(days)
+    counter.current_streak = _trailing_ones(counter.recent_bits, len(days))
+    counter.last_date = days[0][0] if days else None
+
+
+def is_alert(counter, settings=None):
+    settings = settings or _settings()
+    if counter.current_streak >= settings['streak']:
+        return True
+    return (counter.recent_days >= settings['min_days']
+            and counter.recent_absences > settings['rate'] * counter.recent_days)
+
+
+def apply_changes(changes):
+    """Fold changed marks into the students' counters (added to the current session).
+
+    `changes` are app.attendance.MarkChange tuples; one query loads the counters of
+    all students involved.
+    """
+    if not changes:
+        return
+    settings = _settings()
+    student_ids = {change.student_id for change in changes}
+    counters = {c.student_id: c for c in AbsenceCounter.query.filter(AbsenceCounter.student_id.in_(student_ids))}
+    for change in sorted(changes, key=lambda c: c.date):
+        counter = counters.get(change.student_id)
+        if counter is None:
+            counter = counters[change.student_id] = _new_counter(change.student_id)
+            db.session.add(counter)
+        _apply(counter, change.date, change.old_value, change.new_value, settings)
+
+
+def rebuild_counters():
+    """Recompute every counter from the attendance table, for the initial fill.
+
+    This is the one place that reads the whole table; it is not used on the save path.
+    """
+    settings = _settings()
+    AbsenceCounter.query.delete()
+    counters = {}
+    # One entry per student and day, present if any period was (attendance.day_status)
+    rows = db.session.query(Attendance.student_id, Attendance.date, func.max(cast(Attendance.is_present, Integer))) \
+        .group_by(Attendance.student_id, Attendance.date) \
+        .order_by(Attendance.student_id, Attendance.date).yield_per(10000)
+    for student_id, day, is_present in rows:
+        counter = counters.get(student_id)
+        if counter is None:
+            counter = counters[student_id] = _new_counter(student_id)
+        _apply(counter, day, None, bool(is_present), settings)
+    db.session.add_all(counters.values())
+    db.session.commit()
+    return len(counters)
+
+
+def active_alerts(school_id=None):
+    """(counter, student) pairs of a school currently in alert, longest streaks first."""
+    return db.session.query(AbsenceCounter, Student) \
+        .join(Student, Student.id == AbsenceCounter.student_id) \
+        .filter(AbsenceCounter.in_alert.is_(True), school_filter(Student, school_id)) \
+        .order_by(AbsenceCounter.current_streak.desc(), AbsenceCounter.recent_absences.desc(), Student.last_name) \
+        .all()
+
+
+def alert_feed(school_id=None):
+    """The active alerts of a school as JSON-serialisable dicts."""
+    return [{
+        'student_id': student.id,
+        'student_name': f'{student.first_name} {student.last_name}',
+        'class_id': student.class_id,
+        'current_streak': counter.current_streak,
+        'recent_absences': counter.recent_absences,
+        'recent_days': counter.recent_days,
+        'total_absences': counter.total_absences,
+        'total_days': counter.total_days,
+        'last_date': counter.last_date.isoformat() if counter.last_date else None,
+        'alert_since': counter.alert_since.isoformat() if counter.alert_since else None,
+    } for counter, student in active_alerts(school_id)]
@@ -0,0 +1,173 @@
+"""Vectorized attendance analytics.
+
+Marks are loaded as NumPy columns straight from a Core result (no ORM objects),
+sorted by student and date, and every metric below is computed with array
+operations over the whole data set instead of Python loops over Attendance rows.
+"""
+from collections import namedtuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import Integer, String, select, type_coerce
+
+from .models import db, Attendance
+from .bitmap import compacted_marks
+
+# One entry per mark, sorted by (student_id, date)
+AttendanceColumns = namedtuple('AttendanceColumns', ['student_id', 'class_id', 'date', 'is_present'])
+# One entry per (student, school day), sorted the same way
+DailyColumns = namedtuple('DailyColumns', ['student_id', 'date', 'is_present'])
+StudentRates = namedtuple('StudentRates', ['student_id', 'days', 'absences', 'rate'])
+
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def load_columns(start=None, end=None, class_id=None):
+    """Load (student_id, class_id, date, is_present) as columnar arrays, compacted terms included."""
+    table = Attendance.__table__
+    # Skip the per-row Date/Boolean result processing, NumPy parses the raw values in bulk
+    stmt = select(table.c.student_id, table.c.class_id,
+                  type_coerce(table.c.date, String), type_coerce(table.c.is_present, Integer))
+    if start is not None:
+        stmt = stmt.where(table.c.date >= start)
+    if end is not None:
+        stmt = stmt.where(table.c.date <= end)
+    if class_id is not None:
+        stmt = stmt.where(table.c.class_id == class_id)
+    stmt = stmt.order_by(table.c.student_id, table.c.date)
+
+    with db.engine.connect() as conn:
+        rows = conn.execute(stmt).fetchall()
+    compacted = compacted_marks(start, end, class_id=class_id)
+    if compacted:
+        hot_days = {(student_id, row_class_id, day) for student_id, row_class_id, day, _ in rows}
+        rows += [(mark.student_id, mark.class_id, mark.date.isoformat(), int(mark.is_present)) for mark in compacted
+                 if (mark.student_id, mark.class_id, mark.date.isoformat()) not in hot_days]
+        rows.sort(key=lambda row: (row[0], row[2]))
+    return columns_from_rows(rows)
+
+
+def columns_from_rows(rows):
+    """Build AttendanceColumns from (student_id, class_id, date, is_present) tuples."""
+    if not rows:
+        return AttendanceColumns(np.empty(0, np.int64), np.empty(0, np.int64),
+                                 np.empty(0, 'datetime64[D]'), np.empty(0, bool))
+    student_ids, class_ids, dates, present = zip(*rows)
+    return AttendanceColumns(np.array(student_ids, dtype=np.int64),
+                             np.array(class_ids, dtype=np.int64),
+                             np.array(dates, dtype='datetime64[D]'),
+                             np.array(present, dtype=bool))
+
+
+def _group_starts(*keys):
+    """Boolean mask that is True where any of the (sorted) key columns changes."""
+    n = len(keys[0])
+    starts = np.zeros(n, dtype=bool)
+    if n:
+        starts[0] = True
+        for key in keys:
+            starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+
+def daily(columns):
+    """Collapse marks to one per (student, day); a day counts as present if any mark was."""
+    starts = _group_starts(columns.student_id, columns.date)
+    idx = np.flatnonzero(starts)
+    if not len(idx):
+        return DailyColumns(columns.student_id, columns.date, columns.is_present)
+    present = np.maximum.reduceat(columns.is_present.astype(np.int8), idx).astype(bool)
+    return DailyColumns(columns.student_id[idx], columns.date[idx], present)
+
+
+def absence_rates(days):
+    """Per-student day count, absence count and absence rate."""
+    student_ids, inverse = np.unique(days.student_id, return_inverse=True)
+    totals = np.bincount(inverse, minlength=len(student_ids))
+    absences = np.bincount(inverse, weights=~days.is_present, minlength=len(student_ids)).astype(np.int64)
+    rates = np.divide(absences, totals, out=np.zeros(len(student_ids)), where=totals > 0)
+    return StudentRates(student_ids, totals, absences, rates)
+
+
+def chronic_absentees(days, threshold=None):
+    """Student ids whose absence rate is above `threshold` (defaults to the app config)."""
+    if threshold is None:
+        threshold = current_app.config.get('CHRONIC_ABSENCE_THRESHOLD', 0.10)
+    rates = absence_rates(days)
+    return rates.student_id[rates.rate > threshold]
+
+
+def absence_streaks(days):
+    """(student_ids, longest_streak, current_streak) of consecutive absent school days.
+
+    Runs are found with one pass of change detection over the sorted columns; the
+    current streak is the trailing run of each student if it is an absent one.
+    """
+    absent = ~days.is_present
+    run_starts = _group_starts(days.student_id, absent)
+    student_ids, inverse = np.unique(days.student_id, return_inverse=True)
+    longest = np.zeros(len(student_ids), dtype=np.int64)
+    current = np.zeros(len(student_ids), dtype=np.int64)
+    if not len(absent):
+        return student_ids, longest, current
+
+    run_ids = np.cumsum(run_starts) - 1
+    run_lengths = np.bincount(run_ids)
+    run_index = np.flatnonzero(run_starts)
+    run_student = inverse[run_index]
+    run_absent = absent[run_index]
+
+    np.maximum.at(longest, run_student[run_absent], run_lengths[run_absent])
+
+    # The last run of each student is the one before the next student's first run
+    last_runs = np.append(np.flatnonzero(run_student[1:] != run_student[:-1]), len(run_index) - 1)
+    trailing_absent = run_absent[last_runs]
+    current[run_student[last_runs][trailing_absent]] = run_lengths[last_runs][trailing_absent]
+    return student_ids, longest, current
+
+
+def rolling_absence_rate(days, window=20):
+    """Absence rate over each student's last `window` school days, per entry of `days`.
+
+    Uses a cumulative sum, so the window never reaches back into the previous student.
+    """
+    absent = (~days.is_present).astype(np.int64)
+    n = len(absent)
+    if not n:
+        return np.zeros(0)
+    cumulative = np.concatenate(([0], np.cumsum(absent)))
+    positions = np.arange(n)
+    group_start = np.maximum.accumulate(np.where(_group_starts(days.student_id), positions, 0))
+    window_start = np.maximum(positions - window + 1, group_start)
+    counts = cumulative[positions + 1] - cumulative[window_start]
+    return counts / (positions - window_start + 1)
+
+
+def weekday_pattern(days):
+    """{weekday name: absence rate} over all school days in `days`."""
+    # 1970-01-01 was a Thursday, so shifting by 3 makes Monday 0
+    weekdays = (days.date.astype(np.int64) + 3) % 7
+    totals = np.bincount(weekdays, minlength=7)
+    absences = np.bincount(weekdays, weights=~days.is_present, minlength=7)
+    rates = np.divide(absences, totals, out=np.zeros(7), where=totals > 0)
+    return {WEEKDAY_NAMES[i]: float(rates[i]) for i in range(7) if totals[i]}
+
+
+def summarize(start=None, end=None, class_id=None, window=20, threshold=None):
+    """Run every metric over one load of the data (`python run.py analytics`)."""
+    days = daily(load_columns(start=start, end=end, class_id=class_id))
+    rates = absence_rates(days)
+    student_ids, longest, current = absence_streaks(days)
+    rolling = rolling_absence_rate(days, window=window)
+    # Index of each student's most recent day
+    last_days = np.flatnonzero(np.append(_group_starts(days.student_id)[1:], True)) \
+        if len(days.student_id) else np.empty(0, dtype=np.int64)
+    return {
+        'students': len(rates.student_id),
+        'student_days': int(len(days.date)),
+        'chronic_absentees': chronic_absentees(days, threshold=threshold).tolist(),
+        'longest_streaks': dict(zip(student_ids.tolist(), longest.tolist())),
+        'current_streaks': dict(zip(student_ids.tolist(), current.tolist())),
+        'weekday_pattern': weekday_pattern(days),
+        'recent_absence_rates': dict(zip(days.student_id[last_days].tolist(), rolling[last_days].tolist())),
+    }
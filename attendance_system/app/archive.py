@@ -0,0 +1,139 @@
+"""Archival of closed school years out of the hot ``attendance`` table.
+
+Every closed school year is moved into its own ``attendance_archive_<year>`` table
+(same columns as ``attendance``), so the hot table and its indexes only hold the
+current year. ``attendance_history`` is a UNION ALL view over the hot table and all
+archive tables for reports that need to look across years.
+"""
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import Column, Index, MetaData, Table, column, inspect, select, table, text
+
+from .models import db, Attendance
+from .changes import record_moves
+from .reads import attendance_rows
+
+ARCHIVE_TABLE_PREFIX = 'attendance_archive_'
+HISTORY_VIEW_NAME = 'attendance_history'
+
+
+def school_year_for(day, start_month=None):
+    """Return the school year (the calendar year it starts in) that `day` belongs to."""
+    if start_month is None:
+        start_month = current_app.config.get('SCHOOL_YEAR_START_MONTH', 9)
+    return day.year if day.month >= start_month else day.year - 1
+
+
+def school_year_bounds(year, start_month=None):
+    """Return the (first_day, last_day) of a school year, both inclusive."""
+    if start_month is None:
+        start_month = current_app.config.get('SCHOOL_YEAR_START_MONTH', 9)
+    first_day = date(year, start_month, 1)
+    last_day = date(year + 1, start_month, 1) - timedelta(days=1)
+    return first_day, last_day
+
+
+def archive_table_name(year):
+    return f'{ARCHIVE_TABLE_PREFIX}{int(year)}'
+
+
+def archived_years():
+    """Years that already have an archive table, oldest first."""
+    years = []
+    for name in inspect(db.engine).get_table_names():
+        suffix = name[len(ARCHIVE_TABLE_PREFIX):]
+        if name.startswith(ARCHIVE_TABLE_PREFIX) and suffix.isdigit():
+            years.append(int(suffix))
+    return sorted(years)
+
+
+def _build_archive_table(year, metadata):
+    # Mirror the hot table's columns, but without foreign keys: archived rows are
+    # history and must not block deleting a class or student later on.
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+               for c in Attendance.__table__.columns]
+    name = archive_table_name(year)
+    return Table(name, metadata, *columns,
+                 Index(f'ix_{name}_class_date', 'class_id', 'date'),
+                 Index(f'ix_{name}_student_date', 'student_id', 'date'))
+
+
+def get_archive_table(year, connection, create=False):
+    """Return the archive Table for `year`, reflecting it if it already exists."""
+    name = archive_table_name(year)
+    metadata = MetaData()
+    if inspect(connection).has_table(name):
+        return Table(name, metadata, autoload_with=connection)
+    if not create:
+        return None
+    archive = _build_archive_table(year, metadata)
+    archive.create(connection)
+    return archive
+
+
+def archive_year(year):
+    """Move every attendance row of a closed school year into its archive table.
+
+    Runs as a single transaction: rows are copied with INSERT ... SELECT and then
+    deleted from the hot table. Returns the number of rows moved.
+    """
+    current_year = school_year_for(date.today())
+    if year >= current_year:
+        raise ValueError(f'School year {year} is not closed yet (current school year is {current_year}).')
+
+    first_day, last_day = school_year_bounds(year)
+    hot = Attendance.__table__
+    in_year = hot.c.date.between(first_day, last_day)
+
+    with db.engine.begin() as conn:
+        archive = get_archive_table(year, conn, create=True)
+        # Only copy the columns both tables share, in case the archive was created
+        # before a column was added to the hot table.
+        shared = [c.name for c in hot.columns if c.name in archive.c]
+        conn.execute(archive.insert().from_select(shared, select(*[hot.c[name] for name in shared]).where(in_year)))
+        record_moves(conn, in_year, 'archive') # The change feed reports them as moved
+        moved = conn.execute(hot.delete().where(in_year)).rowcount
+
+    rebuild_history_view()
+    return moved
+
+
+def rebuild_history_view():
+    """(Re)create the attendance_history view over the hot and all archive tables."""
+    preparer = db.engine.dialect.identifier_preparer
+    hot = Attendance.__table__
+    column_names = [c.name for c in hot.columns]
+
+    with db.engine.begin() as conn:
+        selects = [f"SELECT {', '.join(preparer.quote(name) for name in column_names)} FROM {preparer.quote(hot.name)}"]
+        for year in archived_years():
+            archive = get_archive_table(year, conn)
+            # Columns the archive table predates are filled with NULL
+            parts = [preparer.quote(name) if name in archive.c else f'NULL AS {preparer.quote(name)}'
+                     for name in column_names]
+            selects.append(f"SELECT {', '.join(parts)} FROM {preparer.quote(archive.name)}")
+
+        conn.execute(text(f'DROP VIEW IF EXISTS {preparer.quote(HISTORY_VIEW_NAME)}'))
+        conn.execute(text(f"CREATE VIEW {preparer.quote(HISTORY_VIEW_NAME)} AS {' UNION ALL '.join(selects)}"))
+
+
+def history_table():
+    """A lightweight selectable for the attendance_history view."""
+    return table(HISTORY_VIEW_NAME, *[column(c.name) for c in Attendance.__table__.columns])
+
+
+def is_archived_date(day):
+    return school_year_for(day) in archived_years()
+
+
+def load_archived_records(filter_date, class_id=None, school_id=None):
+    """Attendance records of a school for a date that lives in an archive table.
+
+    Only the archive table for the date's school year is read, never the union view.
+    """
+    with db.engine.connect() as conn:
+        archive = get_archive_table(school_year_for(filter_date), conn)
+    if archive is None:
+        return []
+    return attendance_rows(filter_date, class_id=class_id, school_id=school_id, source=archive)
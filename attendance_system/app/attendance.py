@@ -0,0 +1,157 @@
+"""Roster loading, batched saving and range reads of attendance marks.
+
+Used by the take_attendance page: loading a roster and saving a submission each
+read the class's marks for the day with a single query instead of one query per
+student. Rosters are the students enrolled in the class on that day, so past days
+still show who was in the class back then. The matrix view reads a whole date
+range of a class the same way.
+
+Marks are taken per lesson period; period 0 is the whole-day registration used by
+schools (and door scans) that mark once a day. Everywhere a day is summed up (the
+matrix view and reports, the absence counters, analytics.daily() and term bitmaps)
+a student is present on a day if any period of it says present: day_status() in
+Python, day_present() in SQL.
+"""
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import Integer, cast, func
+
+from .models import db, Attendance, Class, Student
+from .bitmap import compacted_marks, term_days
+from . import alerts, audit, enrollment, notifications
+
+WHOLE_DAY = 0 # Period of once-a-day marks
+
+# A mark that was created (old_value is None) or flipped by a save
+MarkChange = namedtuple('MarkChange', ['student_id', 'class_id', 'date', 'period', 'old_value', 'new_value'])
+# Students x days grid of a class; statuses are True (present), False (absent) or None (unmarked)
+AttendanceMatrix = namedtuple('AttendanceMatrix', ['days', 'rows', 'absences_per_day'])
+MatrixRow = namedtuple('MatrixRow', ['student', 'statuses', 'absences'])
+
+
+def class_students(class_id, day=None):
+    """Students of a class on `day` (see app/enrollment.py), or its current students."""
+    if day is not None:
+        return enrollment.students_on(class_id, day)
+    return Student.query.filter_by(class_id=class_id).order_by(Student.last_name, Student.first_name).all()
+
+
+def day_status(values):
+    """Status of a day from the is_present values of its periods; None if unmarked."""
+    values = list(values)
+    return any(values) if values else None
+
+
+def day_present(is_present):
+    """day_status() as an SQL aggregate over a day's is_present column: 1 if any period is present."""
+    return func.max(cast(is_present, Integer))
+
+
+def load_day_marks(class_id, day):
+    """{(student_id, period): Attendance} of a class on a day, all periods in one query."""
+    records = Attendance.query.filter(Attendance.class_id == class_id, Attendance.date == day)
+    return {(record.student_id, record.period): record for record in records}
+
+
+def load_marks(class_id, day, period=WHOLE_DAY):
+    """{student_id: Attendance} of a class in one period of a day."""
+    records = Attendance.query.filter(Attendance.class_id == class_id, Attendance.date == day,
+                                      Attendance.period == period)
+    return {record.student_id: record for record in records}
+
+
+def load_roster(class_id, day, period=WHOLE_DAY):
+    """(student, {'is_present': bool}) pairs for the template; unmarked students default to present."""
+    marks = load_marks(class_id, day, period)
+    return [(student, {'is_present': marks[student.id].is_present if student.id in marks else True})
+            for student in class_students(class_id, day)]
+
+
+def save_marks(class_id, day, marks, period=WHOLE_DAY, changed_by=None, source='web'):
+    """Upsert {student_id: is_present} for a class in one period of a day and commit.
+
+    Returns the MarkChange list of marks that were created or actually changed;
+    unchanged marks cause no writes. Changes are logged to the audit trail as made
+    by user `changed_by` through `source` (see app/audit.py).
+    """
+    changes = stage_marks(class_id, day, marks, period, changed_by, source)
+    db.session.commit()
+    return changes
+
+
+def stage_marks(class_id, day, marks, period=WHOLE_DAY, changed_by=None, source='web'):
+    """Like save_marks(), but leaves the commit to the caller (see app/ingest.py)."""
+    # Every period of the day in one query: the other periods decide the day's status
+    day_marks = load_day_marks(class_id, day)
+    # New marks belong to the class's school (usually already in the identity map)
+    school_id = db.session.get(Class, class_id).school_id
+    changes = []
+    for student_id, is_present in marks.items():
+        record = day_marks.get((student_id, period))
+        if record is None:
+            db.session.add(Attendance(student_id=student_id, class_id=class_id, date=day, period=period,
+                                      is_present=is_present, school_id=school_id))
+            changes.append(MarkChange(student_id, class_id, day, period, None, is_present))
+        elif record.is_present != is_present:
+            changes.append(MarkChange(student_id, class_id, day, period, record.is_present, is_present))
+            record.is_present = is_present
+
+    audit.record_changes(changes, school_id, changed_by, source) # One INSERT, committed with the marks
+    day_changes = _day_changes(changes, day_marks)
+    alerts.apply_changes(day_changes)
+    if current_app.config.get('NOTIFY_ABSENCES', True):
+        notifications.enqueue_absences(day_changes, school_id) # Committed together with the marks
+    return changes
+
+
+def _day_changes(changes, day_marks):
+    # The absence counters follow whole days: turn period changes into day changes
+    if all(period == WHOLE_DAY for _, period in day_marks) and all(c.period == WHOLE_DAY for c in changes):
+        return changes # One mark per day, nothing to fold
+    other_periods = {}
+    for (student_id, period), record in day_marks.items():
+        other_periods.setdefault(student_id, {})[period] = record.is_present
+    day_changes = []
+    for change in changes:
+        others = [value for period, value in other_periods.get(change.student_id, {}).items() if period != change.period]
+        old = day_status(others + ([] if change.old_value is None else [change.old_value]))
+        new = day_status(others + [change.new_value])
+        if old != new:
+            day_changes.append(change._replace(period=WHOLE_DAY, old_value=old, new_value=new))
+    return day_changes
+
+
+def load_matrix(class_id, start, end):
+    """Build the students x school days matrix of a class for a date range.
+
+    All marks come from one GROUP BY query over the (class_id, date, period) index,
+    plus the days of compacted terms (bitmap.compacted_marks()); a day's periods
+    are summed up with day_present().
+    """
+    marks = db.session.query(Attendance.student_id, Attendance.date, day_present(Attendance.is_present)) \
+        .filter(Attendance.class_id == class_id, Attendance.date.between(start, end)) \
+        .group_by(Attendance.student_id, Attendance.date) \
+        .all()
+    status = {(student_id, day): bool(present) for student_id, day, present in marks}
+    for mark in compacted_marks(start, end, class_id=class_id):
+        status.setdefault((mark.student_id, mark.date), mark.is_present)
+
+    # Weekdays, plus any weekend day that was marked anyway
+    days = sorted(set(term_days(start, end)) | {day for _, day in status})
+    # Everyone enrolled at some point of the range (ix_enrollment_class_interval)
+    students = enrollment.students_between(class_id, start, end)
+    # Students with marks here but no enrollment covering them
+    missing_ids = {student_id for student_id, _ in status} - {student.id for student in students}
+    if missing_ids:
+        students += Student.query.filter(Student.id.in_(missing_ids)).order_by(Student.last_name, Student.first_name).all()
+
+    rows = []
+    absences_per_day = [0] * len(days)
+    for student in students:
+        statuses = [status.get((student.id, day)) for day in days]
+        for i, value in enumerate(statuses):
+            if value is False:
+                absences_per_day[i] += 1
+        rows.append(MatrixRow(student, statuses, statuses.count(False)))
+    return AttendanceMatrix(days, rows, absences_per_day)
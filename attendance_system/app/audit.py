@@ -0,0 +1,104 @@
+"""Append-only audit log of attendance mark changes.
+
+Saves overwrite ``attendance.is_present`` in place; the log keeps who changed a
+mark, when and through which channel. attendance.stage_marks() already knows
+which marks a save created or flipped (its MarkChange list, compared against the
+marks it loaded), so record_changes() writes exactly those as one multi-row
+INSERT in the same transaction. Resubmitting an unchanged roster logs nothing.
+
+Deleting a student deletes their marks but not their log: record_student_deletion()
+adds an entry with action STUDENT_DELETED in the same commit, and the log has no
+foreign key to the student. Deletion entries have no mark (date, period, values)
+and are never compacted.
+
+Rows are never updated. ``python run.py compact_audit`` rolls entries older than
+AUDIT_COMPACT_AFTER_DAYS up: all old entries of one mark (student, class, day,
+period) become one row from the first old value to the last new value, stamped
+with the last change and the number of edits it stands for.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, func, select
+
+from .models import db, AttendanceAudit, Class, User
+
+HistoryEntry = namedtuple('HistoryEntry', ['date', 'period', 'class_id', 'class_name', 'old_value', 'new_value',
+                                           'username', 'source', 'changed_at', 'edits', 'action'])
+
+STUDENT_DELETED = 'deleted' # AttendanceAudit.action of deleting a student with all their marks
+
+
+def record_changes(changes, school_id=None, changed_by=None, source='web'):
+    """Add audit rows for a save's MarkChange list (see attendance.stage_marks)."""
+    changed_at = datetime.utcnow()
+    rows = [{'school_id': school_id, 'student_id': change.student_id, 'class_id': change.class_id,
+             'date': change.date, 'period': change.period, 'old_value': change.old_value,
+             'new_value': change.new_value, 'changed_by': changed_by, 'source': source,
+             'changed_at': changed_at, 'edits': 1}
+            for change in changes]
+    if rows:
+        db.session.execute(AttendanceAudit.__table__.insert(), rows)
+
+
+def record_student_deletion(student, changed_by=None, source='web'):
+    """Add the audit row of deleting `student` and all their marks, with their last class."""
+    db.session.execute(AttendanceAudit.__table__.insert().values(
+        school_id=student.school_id, action=STUDENT_DELETED, student_id=student.id, class_id=student.class_id,
+        date=None, period=None, old_value=None, new_value=None, changed_by=changed_by,
+        source=source, changed_at=datetime.utcnow(), edits=1))
+
+
+def student_history(student_id, limit=200):
+    """The latest `limit` changes of a student's marks, newest first (HistoryEntry tuples)."""
+    audit = AttendanceAudit.__table__
+    query = select(audit.c.date, audit.c.period, audit.c.class_id, Class.name, audit.c.old_value,
+                   audit.c.new_value, User.username, audit.c.source, audit.c.changed_at, audit.c.edits,
+                   audit.c.action) \
+        .select_from(audit.outerjoin(Class, Class.id == audit.c.class_id)
+                     .outerjoin(User, User.id == audit.c.changed_by)) \
+        .where(audit.c.student_id == student_id) \
+        .order_by(audit.c.changed_at.desc(), audit.c.id.desc()).limit(limit)
+    return [HistoryEntry(*row) for row in db.session.execute(query)]
+
+
+def _rollup(entries):
+    first, last = entries[0], entries[-1]
+    return {'school_id': last.school_id, 'student_id': last.student_id, 'class_id': last.class_id,
+            'date': last.date, 'period': last.period, 'old_value': first.old_value, 'new_value': last.new_value,
+            'changed_by': last.changed_by, 'source': last.source, 'changed_at': last.changed_at,
+            'edits': sum(entry.edits for entry in entries)}
+
+
+def compact_audit(before, batch_size=500):
+    """Fold entries changed before `before` into one row per mark; returns the rows removed.
+
+    Works through the affected students `batch_size` at a time, one commit each.
+    """
+    audit = AttendanceAudit.__table__
+    mark = (audit.c.student_id, audit.c.class_id, audit.c.date, audit.c.period)
+    old = and_(audit.c.changed_at < before, audit.c.action.is_(None)) # Deletion entries stay as they are
+    # Only students with a mark that has more than one old entry need any work
+    student_ids = [row[0] for row in db.session.execute(
+        select(audit.c.student_id).where(old).group_by(*mark).having(func.count() > 1)
+        .distinct().order_by(audit.c.student_id))]
+
+    removed = 0
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        entries = db.session.execute(select(audit).where(old, audit.c.student_id.in_(batch))
+                                     .order_by(*mark, audit.c.changed_at, audit.c.id)).all()
+        groups = {}
+        for entry in entries:
+            groups.setdefault((entry.student_id, entry.class_id, entry.date, entry.period), []).append(entry)
+        rollups, folded_ids = [], []
+        for group in groups.values():
+            if len(group) > 1:
+                rollups.append(_rollup(group))
+                folded_ids += [entry.id for entry in group]
+        if rollups:
+            db.session.execute(audit.delete().where(audit.c.id.in_(folded_ids)))
+            db.session.execute(audit.insert(), rollups)
+        db.session.commit()
+        removed += len(folded_ids) - len(rollups)
+    return removed
@@ -0,0 +1,122 @@
+"""Online backups of the SQLite database (``python run.py backup`` / ``restore``).
+
+Copying site.db while the app runs can tear the copy. Locking the database out
+while copying stalls every save for the whole copy. SQLite's online backup API
+copies the database in steps of BACKUP_PAGES_PER_STEP pages instead. Each step
+holds only a short read lock, and the copy sleeps BACKUP_STEP_SLEEP_MS between
+steps, so a take_attendance commit waits at most one step.
+
+If another connection writes while a copy is running, SQLite restarts the copy
+from the first page, because the copy must be one consistent snapshot. When
+writes are frequent enough to restart it BACKUP_MAX_RESTARTS times, the rest is
+copied in a single step. That step holds the read lock for the one full copy.
+
+The copy is written next to the target and checked with ``PRAGMA
+integrity_check``. It may then be gzipped. Only a complete, verified backup is
+moved into place, so the target is never a partial file. restore_backup()
+decompresses and verifies a backup into a new database file.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from collections import namedtuple
+
+from sqlalchemy.engine import make_url
+
+BackupResult = namedtuple('BackupResult', ['path', 'pages', 'restarts', 'seconds', 'size', 'verified'])
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def database_path(uri):
+    """File path of an SQLite database URI; ValueError for other databases."""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise ValueError('Online backups need an SQLite database file.')
+    return url.database
+
+
+def verify(path):
+    """Raise ValueError unless the SQLite file at `path` passes integrity_check."""
+    conn = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as e: # Not a database at all
+        problems = [str(e)]
+    finally:
+        conn.close()
+    if problems != ['ok']:
+        raise ValueError(f'{path} failed the integrity check: {"; ".join(problems[:5])}')
+
+
+def _copy(source, target, pages, sleep, max_restarts):
+    # Returns (pages copied, restarts)
+    state = {'remaining': None, 'restarts': 0, 'total': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1 # Another connection wrote: the copy started over
+            if state['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        state['remaining'], state['total'] = remaining, total
+        if remaining and sleep:
+            time.sleep(sleep) # No lock is held between steps, writers go first
+
+    destination = sqlite3.connect(target)
+    try:
+        try:
+            source.backup(destination, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            source.backup(destination, pages=-1) # The rest in one step
+    finally:
+        destination.close()
+    return state['total'], state['restarts']
+
+
+def backup_database(source_path, target, compress=False, check=True, pages=256, sleep=0.01, max_restarts=5):
+    """Copy the database at `source_path` to `target` (gzipped if `compress`); returns a BackupResult."""
+    started = time.monotonic()
+    partial = f'{target}.partial'
+    if os.path.exists(partial):
+        os.remove(partial) # Left over from an interrupted backup
+    source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True, timeout=30)
+    try:
+        copied, restarts = _copy(source, partial, pages, sleep, max_restarts)
+    finally:
+        source.close()
+
+    packed = f'{partial}.gz'
+    try:
+        if check:
+            verify(partial)
+        if compress:
+            with open(partial, 'rb') as raw, gzip.open(packed, 'wb') as out:
+                shutil.copyfileobj(raw, out, 1024 * 1024)
+        os.replace(packed if compress else partial, target)
+    finally:
+        for leftover in (partial, packed):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return BackupResult(target, copied, restarts, round(time.monotonic() - started, 3), os.path.getsize(target), check)
+
+
+def restore_backup(backup_path, target):
+    """Write the backup at `backup_path` (plain or gzipped) to a new database file `target`."""
+    if os.path.exists(target):
+        raise ValueError(f'{target} already exists; restore into a new file and swap it in while the app is stopped.')
+    partial = f'{target}.partial'
+    with open(backup_path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    try:
+        with (gzip.open if compressed else open)(backup_path, 'rb') as raw, open(partial, 'wb') as out:
+            shutil.copyfileobj(raw, out, 1024 * 1024)
+        verify(partial)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return target
@@ -0,0 +1,205 @@
+"""Packed bitset storage of attendance for closed terms.
+
+A term is the list of school days (Monday to Friday) between its first and last day.
+Each (student, class, term) is stored as two bitsets over that list, bit i being the
+i-th school day:
+
+- ``marked_bits``: the day has a mark at all (unmarked days are 0)
+- ``absent_bits``: the day was marked absent (always a subset of ``marked_bits``)
+
+Bitsets are little-endian byte strings, so a 190-day school year takes 24 bytes per
+bitset and absence totals are popcounts.
+
+Compacted days are still attendance: compacted_marks() decodes them for the readers
+of the attendance table (the attendance views and reports through
+attendance.load_matrix() and reads.attendance_rows(), and analytics.load_columns()).
+Where the attendance table still has a mark for the same student, class and day,
+that mark wins.
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from .models import db, Attendance, AttendanceBitmap, Class, bump_data_version
+from .changes import record_moves
+from .tenancy import school_filter
+
+TermTotals = namedtuple('TermTotals', ['student_id', 'marked', 'absent'])
+# A whole-day mark decoded from a bitmap
+CompactedMark = namedtuple('CompactedMark', ['student_id', 'class_id', 'date', 'is_present'])
+ANY_SCHOOL = object() # compacted_marks(): no tenant filter
+
+
+def term_days(term_start, term_end):
+    """School days of a term (weekdays, both ends inclusive) in bit order."""
+    days = []
+    day = term_start
+    while day <= term_end:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _to_bytes(bits, day_count):
+    return bits.to_bytes((day_count + 7) // 8, 'little')
+
+
+def _to_int(data):
+    return int.from_bytes(data, 'little')
+
+
+def popcount(data):
+    """Number of set bits in a packed bitset."""
+    return _to_int(data).bit_count()
+
+
+def encode_marks(days, marks):
+    """Pack {date: is_present} into (marked_bits, absent_bits) over `days`.
+
+    Marks for dates that are not in `days` raise ValueError, since they could not be
+    decoded again.
+    """
+    index = {day: i for i, day in enumerate(days)}
+    marked = absent = 0
+    for day, is_present in marks.items():
+        if day not in index:
+            raise ValueError(f'{day} is not a school day of this term.')
+        bit = 1 << index[day]
+        marked |= bit
+        if not is_present:
+            absent |= bit
+    return _to_bytes(marked, len(days)), _to_bytes(absent, len(days))
+
+
+def decode_marks(days, marked_bits, absent_bits):
+    """Unpack bitsets back into {date: is_present}; unmarked days are left out."""
+    marked = _to_int(marked_bits)
+    absent = _to_int(absent_bits)
+    marks = {}
+    for i, day in enumerate(days):
+        bit = 1 << i
+        if marked & bit:
+            marks[day] = not (absent & bit)
+    return marks
+
+
+def compacted_marks(start=None, end=None, class_id=None, school_id=ANY_SCHOOL):
+    """CompactedMark tuples of the bitmap days in [start, end], optionally of one class or school.
+
+    Only bitmaps whose term overlaps the range are read (ix_attendance_bitmap_class_term
+    when a class is given).
+    """
+    bitmaps = AttendanceBitmap.__table__
+    classes = Class.__table__
+    query = select(bitmaps.c.student_id, bitmaps.c.class_id, bitmaps.c.term_start, bitmaps.c.term_end,
+                   bitmaps.c.marked_bits, bitmaps.c.absent_bits) \
+        .select_from(bitmaps.join(classes, classes.c.id == bitmaps.c.class_id))
+    if class_id is not None:
+        query = query.where(bitmaps.c.class_id == class_id)
+    if school_id is not ANY_SCHOOL:
+        query = query.where(school_filter(classes.c, school_id))
+    if start is not None:
+        query = query.where(bitmaps.c.term_end >= start)
+    if end is not None:
+        query = query.where(bitmaps.c.term_start <= end)
+
+    marks = []
+    for student_id, row_class_id, term_start, term_end, marked_bits, absent_bits in db.session.execute(query):
+        for day, is_present in decode_marks(term_days(term_start, term_end), marked_bits, absent_bits).items():
+            if (start is None or day >= start) and (end is None or day <= end):
+                marks.append(CompactedMark(student_id, row_class_id, day, is_present))
+    return marks
+
+
+def compact_term(class_id, term_start, term_end, delete_rows=False):
+    """Fold a class's Attendance rows for a closed term into AttendanceBitmap rows.
+
+    Reads the term with one ranged query, merges into any bitmap already stored for
+    the term and, with `delete_rows`, deletes the folded rows. Marks on weekends are not
+    representable and stay in the attendance table. Returns the number of rows folded.
+    Raises ValueError for a term that has not ended yet.
+    """
+    if term_end >= date.today():
+        raise ValueError(f'The term ending {term_end} is not closed yet; only past terms can be compacted.')
+    school_days = set(term_days(term_start, term_end))
+
+    rows = db.session.query(Attendance.id, Attendance.student_id, Attendance.date, Attendance.is_present) \
+        .filter(Attendance.class_id == class_id, Attendance.date.between(term_start, term_end)) \
+        .all()
+
+    marks_by_student = {}
+    folded_ids = []
+    for row_id, student_id, day, is_present in rows:
+        if day in school_days:
+            # Lesson periods fold into the day: present if any period was (attendance.day_status)
+            marks = marks_by_student.setdefault(student_id, {})
+            marks[day] = marks.get(day, False) or is_present
+            folded_ids.append(row_id)
+
+    existing = {bm.student_id: bm for bm in AttendanceBitmap.query.filter_by(class_id=class_id, term_start=term_start)}
+    for student_id, marks in marks_by_student.items():
+        bitmap = existing.get(student_id)
+        end = term_end
+        if bitmap:
+            end = max(term_end, bitmap.term_end)
+            merged = decode_marks(term_days(bitmap.term_start, bitmap.term_end), bitmap.marked_bits, bitmap.absent_bits)
+            merged.update(marks)
+            marks = merged
+        marked_bits, absent_bits = encode_marks(term_days(term_start, end), marks)
+        if bitmap:
+            bitmap.term_end = end
+            bitmap.marked_bits = marked_bits
+            bitmap.absent_bits = absent_bits
+        else:
+            db.session.add(AttendanceBitmap(student_id=student_id, class_id=class_id,
+                                            term_start=term_start, term_end=term_end,
+                                            marked_bits=marked_bits, absent_bits=absent_bits))
+
+    if delete_rows and folded_ids:
+        folded = Attendance.id.in_(folded_ids)
+        record_moves(db.session.connection(), folded, 'bitmap') # The change feed reports them as moved
+        Attendance.query.filter(folded).delete(synchronize_session=False)
+        # Bulk deletes skip the flush hooks, so cached fragments are invalidated here
+        bump_data_version(db.session.connection(), [db.session.get(Class, class_id).school_id])
+    db.session.commit()
+    return len(folded_ids)
+
+
+def _term_bitmaps(class_id, term_start):
+    return db.session.query(AttendanceBitmap.student_id, AttendanceBitmap.marked_bits, AttendanceBitmap.absent_bits) \
+        .filter(AttendanceBitmap.class_id == class_id, AttendanceBitmap.term_start == term_start) \
+        .order_by(AttendanceBitmap.student_id) \
+        .all()
+
+
+def term_totals(class_id, term_start):
+    """Marked and absent day counts per student of a class for a term (popcounts)."""
+    return [TermTotals(student_id, popcount(marked_bits), popcount(absent_bits))
+            for student_id, marked_bits, absent_bits in _term_bitmaps(class_id, term_start)]
+
+
+def daily_absence_counts(class_id, term_start, term_end):
+    """{date: number of absent students} for every school day of a class's term.
+
+    Works on the whole class at once: each bitset is walked over its set bits only.
+    """
+    days = term_days(term_start, term_end)
+    counts = [0] * len(days)
+    for _, _, absent_bits in _term_bitmaps(class_id, term_start):
+        # Days past `term_end` are masked off
+        bits = _to_int(absent_bits) & ((1 << len(days)) - 1)
+        while bits:
+            lowest = bits & -bits
+            counts[lowest.bit_length() - 1] += 1
+            bits ^= lowest
+    return dict(zip(days, counts))
+
+
+def student_term_marks(student_id, class_id, term_start):
+    """Decoded {date: is_present} of one student's term, or {} if nothing is stored."""
+    bitmap = AttendanceBitmap.query.filter_by(student_id=student_id, class_id=class_id, term_start=term_start).first()
+    if not bitmap:
+        return {}
+    return decode_marks(term_days(bitmap.term_start, bitmap.term_end), bitmap.marked_bits, bitmap.absent_bits)
@@ -0,0 +1,97 @@
+"""Change feed for incremental sync (``GET /api/changes?since=<cursor>``).
+
+Every flush that writes a class, student or attendance row stamps those rows with
+the next number of a global change sequence (``updated_seq``, see
+models.next_change_seq) and records deleted rows as tombstones under the same
+number. Rows of one flush share their number, so the feed is ordered by
+(seq, entity, id) and the cursor is those three values, ``"<seq>.<entity>.<id>"``.
+
+A page reads at most `limit` + 1 rows from each of the four tables through their
+(school_id, updated_seq) indexes and merges them, so a sync costs the number of
+changes, not the size of the tables. Without a cursor the feed starts from the
+beginning, which is the initial full load; rows from before the feed existed have
+sequence number 0. Archiving and term compaction move marks out of the attendance
+table; record_moves() reports them as ``"op": "moved"`` with ``"to": "archive"`` or
+``"bitmap"``, so clients can tell them from deletions.
+"""
+from sqlalchemy import and_, literal, or_, select
+
+from .models import db, Attendance, ChangeTombstone, Class, Student, next_change_seq
+from .tenancy import school_filter
+
+# Merge order of the entities within one sequence number
+_SOURCES = [
+    ('class', Class, ['id', 'name', 'teacher_name', 'next_class_id']),
+    ('student', Student, ['id', 'first_name', 'last_name', 'class_id']),
+    ('attendance', Attendance, ['id', 'student_id', 'class_id', 'date', 'period', 'is_present']),
+]
+_TOMBSTONE_RANK = len(_SOURCES)
+START = (-1, 0, 0) # Before everything
+
+
+def parse_cursor(value):
+    """(seq, rank, id) from a cursor string; raises ValueError for malformed ones."""
+    if not value:
+        return START
+    seq, rank, row_id = (int(part) for part in value.split('.'))
+    return seq, rank, row_id
+
+
+def format_cursor(position):
+    return '.'.join(str(part) for part in position)
+
+
+def _after(seq_column, id_column, rank, cursor):
+    # Rows of the entity with this rank that come after the cursor position
+    seq, cursor_rank, row_id = cursor
+    if rank < cursor_rank:
+        return seq_column > seq
+    if rank > cursor_rank:
+        return seq_column >= seq
+    return and_(seq_column >= seq, or_(seq_column > seq, id_column > row_id))
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def record_moves(connection, where, moved_to):
+    """Record the attendance rows matching `where` as moved to `moved_to`; call before removing them.
+
+    One INSERT ... SELECT under one sequence number, whatever the number of rows.
+    """
+    marks = Attendance.__table__
+    seq = next_change_seq(connection)
+    connection.execute(ChangeTombstone.__table__.insert().from_select(
+        ['school_id', 'seq', 'entity', 'entity_id', 'moved_to'],
+        select(marks.c.school_id, literal(seq), literal('attendance'), marks.c.id, literal(moved_to)).where(where)))
+
+
+def changes_since(cursor=START, school_id=None, limit=500):
+    """Up to `limit` changes after `cursor`; returns (changes, next cursor, has_more)."""
+    candidates = [] # ((seq, rank, id), change dict)
+    for rank, (entity, model, fields) in enumerate(_SOURCES):
+        table = model.__table__
+        seq_column = table.c.updated_seq
+        query = select(seq_column, *[table.c[name] for name in fields]) \
+            .where(school_filter(table.c, school_id), _after(seq_column, table.c.id, rank, cursor)) \
+            .order_by(seq_column, table.c.id).limit(limit + 1)
+        for seq, *values in db.session.execute(query):
+            data = {name: _value(value) for name, value in zip(fields, values)}
+            candidates.append(((seq, rank, data['id']),
+                               {'seq': seq, 'entity': entity, 'op': 'upsert', 'id': data['id'], 'data': data}))
+
+    tombstones = ChangeTombstone.__table__
+    query = select(tombstones.c.seq, tombstones.c.id, tombstones.c.entity, tombstones.c.entity_id, tombstones.c.moved_to) \
+        .where(school_filter(tombstones.c, school_id), _after(tombstones.c.seq, tombstones.c.id, _TOMBSTONE_RANK, cursor)) \
+        .order_by(tombstones.c.seq, tombstones.c.id).limit(limit + 1)
+    for seq, tombstone_id, entity, entity_id, moved_to in db.session.execute(query):
+        change = {'seq': seq, 'entity': entity, 'op': 'delete', 'id': entity_id}
+        if moved_to:
+            change.update(op='moved', to=moved_to)
+        candidates.append(((seq, _TOMBSTONE_RANK, tombstone_id), change))
+
+    candidates.sort(key=lambda candidate: candidate[0])
+    page = candidates[:limit]
+    next_cursor = page[-1][0] if page else cursor
+    return [change for _, change in page], format_cursor(next_cursor), len(candidates) > limit
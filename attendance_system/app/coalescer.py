@@ -0,0 +1,183 @@
+"""Write coalescing: one writer thread commits the writes of all request threads.
+
+On SQLite every commit is its own fsync'd transaction and concurrent writers queue
+on the database lock, so throughput is bounded by fsync latency. With coalescing on
+(WRITE_COALESCING, by default for SQLite databases), views hand their write to
+``run_write(fn, *args)`` instead of committing themselves. The writer thread takes
+the first queued write, collects whatever else arrives within
+WRITE_COALESCE_WINDOW_MS (at most WRITE_COALESCE_MAX_BATCH writes) and runs them
+all in one transaction with one commit. Each caller blocks on its own Future and
+gets its write's return value or exception back.
+
+A write function only stages ORM changes in ``db.session`` (it must not commit)
+and works from ids and plain values, because it runs in the writer's session, not
+the request's. If one write fails, it alone is failed and the rest of its batch is
+re-run in a fresh transaction, so write functions must be safe to run again.
+
+The writer never dies on an error: anything a batch raises outside the writes (the
+app context, the session teardown) fails that batch's Futures and the writer takes
+the next batch. Should the thread still be gone, the next submit() starts a new
+one. Callers wait at most WRITE_COALESCE_TIMEOUT_S and then get a
+concurrent.futures.TimeoutError; a write that has not started by then is dropped.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from functools import partial
+
+from flask import current_app
+
+from .models import db, stamp_last_write
+
+COALESCER_EXTENSION_KEY = 'write_coalescer' # app.extensions key of the WriteCoalescer
+
+
+def run_batch(writes):
+    """Run write callables in one transaction; returns each one's result or exception.
+
+    A failing write is taken out and the others are re-run, never committed twice.
+    """
+    results = [None] * len(writes)
+    pending = list(range(len(writes)))
+    while pending:
+        done = []
+        try:
+            for index in pending:
+                result = writes[index]()
+                db.session.flush() # Pins constraint errors on the write that caused them
+                done.append((index, result))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(done) == len(pending): # The commit itself failed, nothing to single out
+                for index in pending:
+                    results[index] = e
+                return results
+            failed = pending[len(done)]
+            results[failed] = e
+            pending.remove(failed)
+            continue
+        for index, result in done:
+            results[index] = result
+        pending = []
+    return results
+
+
+class WriteCoalescer:
+    def __init__(self, app, window=0.005, max_batch=100):
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0 # Transactions committed so far
+        self.writes = 0
+        self.restarts = 0 # Writer threads started to replace a dead one
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._thread is not None:
+                self.restarts += 1
+            self._thread = threading.Thread(target=self._run, name='write-coalescer', daemon=True)
+            self._thread.start()
+
+    def submit(self, write):
+        """Queue a write callable; returns a Future of its result."""
+        self._ensure_writer()
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._apply(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _apply(self, batch):
+        # Callers that timed out before their write started cancelled it
+        batch = [(write, future) for write, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        with self.app.app_context():
+            try:
+                results = run_batch([write for write, _ in batch])
+            finally:
+                db.session.remove()
+        self.batches += 1
+        self.writes += len(batch)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def coalescing_enabled(app):
+    enabled = app.config.get('WRITE_COALESCING')
+    if enabled is None:
+        return app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    return enabled
+
+
+_start_lock = threading.Lock()
+
+
+def get_coalescer(app):
+    """The worker's WriteCoalescer, started on first use."""
+    coalescer = app.extensions.get(COALESCER_EXTENSION_KEY)
+    if coalescer is None:
+        with _start_lock:
+            coalescer = app.extensions.get(COALESCER_EXTENSION_KEY)
+            if coalescer is None:
+                coalescer = app.extensions[COALESCER_EXTENSION_KEY] = WriteCoalescer(
+                    app, window=app.config.get('WRITE_COALESCE_WINDOW_MS', 5) / 1000,
+                    max_batch=app.config.get('WRITE_COALESCE_MAX_BATCH', 100))
+    return coalescer
+
+
+def run_write(write, *args, **kwargs):
+    """Apply `write(*args, **kwargs)` and commit; returns its result or raises its error.
+
+    Goes through the coalescer when it is enabled, otherwise runs and commits in
+    the caller's session. Raises concurrent.futures.TimeoutError if the coalescer does not answer within
+    WRITE_COALESCE_TIMEOUT_S.
+    """
+    app = current_app._get_current_object()
+    if not coalescing_enabled(app):
+        try:
+            result = write(*args, **kwargs)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result
+
+    future = get_coalescer(app).submit(partial(write, *args, **kwargs))
+    try:
+        result = future.result(timeout=app.config.get('WRITE_COALESCE_TIMEOUT_S', 30))
+    except FutureTimeoutError: # Not the builtin TimeoutError before Python 3.11
+        future.cancel() # Only drops the write if the writer has not started it
+        raise
+    # The write was committed by another session; don't serve stale objects from this one
+    db.session.expire_all()
+    stamp_last_write() # Read-your-writes, see models.RoutingSession
+    return result
@@ -0,0 +1,70 @@
+"""Class membership over time, and the yearly promotion.
+
+Every student has Enrollment rows ``[valid_from, valid_to)`` recording which class
+they belonged to when; Student.class_id is only the current class. Rosters of any
+date are read from the (class_id, valid_from, valid_to) index, so "who should have
+been marked" stays right after transfers.
+
+``promote_classes()`` moves every class with a ``next_class_id`` up a year with
+set-based statements in one transaction, whatever the number of students: close
+the open enrollments, open the new ones and repoint Student.class_id.
+"""
+from sqlalchemy import Date, and_, literal, or_, select
+
+from .models import db, Class, Enrollment, Student, bump_data_version, next_change_seq
+from .tenancy import school_filter
+
+
+def enrolled_on(day):
+    """Enrollment condition: the enrollment covers `day`."""
+    return and_(Enrollment.valid_from <= day, or_(Enrollment.valid_to.is_(None), Enrollment.valid_to > day))
+
+
+def students_on(class_id, day):
+    """Students enrolled in a class on a day, ordered by name."""
+    return Student.query.join(Enrollment, Enrollment.student_id == Student.id) \
+        .filter(Enrollment.class_id == class_id, enrolled_on(day)) \
+        .order_by(Student.last_name, Student.first_name).all()
+
+
+def students_between(class_id, start, end):
+    """Students enrolled in a class on any day of [start, end], ordered by name."""
+    overlaps = and_(Enrollment.valid_from <= end, or_(Enrollment.valid_to.is_(None), Enrollment.valid_to > start))
+    enrolled = select(Enrollment.student_id).where(Enrollment.class_id == class_id, overlaps)
+    return Student.query.filter(Student.id.in_(enrolled)) \
+        .order_by(Student.last_name, Student.first_name).all()
+
+
+def promote_classes(effective_date, school_id=None):
+    """Move the students of every class that has a next class into it from `effective_date`.
+
+    school_id None promotes every school. Classes without a next class (final
+    years) keep their students. Chains like 1A -> 2A -> 3A move in one step, as
+    every statement reads the classes from before the promotion. Returns the
+    number of students moved.
+    """
+    classes = Class.__table__.c
+    students = Student.__table__.c
+    enrollments = Enrollment.__table__
+    promoted = select(classes.id).where(classes.next_class_id.isnot(None))
+    if school_id is not None:
+        promoted = promoted.where(school_filter(classes, school_id))
+    next_class = select(classes.next_class_id).where(classes.id == students.class_id).scalar_subquery()
+
+    with db.engine.begin() as conn:
+        # Enrollments that would start on or after the promotion are superseded by it
+        conn.execute(enrollments.delete().where(enrollments.c.valid_to.is_(None),
+                                                enrollments.c.class_id.in_(promoted),
+                                                enrollments.c.valid_from >= effective_date))
+        conn.execute(enrollments.update()
+                     .where(enrollments.c.valid_to.is_(None), enrollments.c.class_id.in_(promoted))
+                     .values(valid_to=effective_date))
+        conn.execute(enrollments.insert().from_select(
+            ['school_id', 'student_id', 'class_id', 'valid_from'],
+            select(students.school_id, students.id, next_class, literal(effective_date, Date))
+            .where(students.class_id.in_(promoted))))
+        # One change feed number for the whole promotion
+        moved = conn.execute(Student.__table__.update().where(students.class_id.in_(promoted))
+                             .values(class_id=next_class, updated_seq=next_change_seq(conn))).rowcount
+        bump_data_version(conn, None if school_id is None else [school_id])
+    return moved
@@ -1,12 +1,16 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, HiddenField
+from flask import current_app
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, HiddenField, SelectField
 from wtforms.fields.html5 import DateField # For better browser date picker support
-from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, Optional
+from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, Optional, Regexp
 from wtforms_sqlalchemy.fields import QuerySelectField
-from .models import User, Class
+from .models import User, Class, Student
+from .tenancy import scoped, resolve_school
 from datetime import date
 
 class RegistrationForm(FlaskForm):
+    school = StringField('School Code',
+                         validators=[Optional(), Length(max=50)]) # Blank for the default school
     username = StringField('Username',
                            validators=[DataRequired(), Length(min=4, max=25)])
     password = PasswordField('Password',
@@ -15,22 +19,47 @@ class RegistrationForm(FlaskForm):
                                      validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Sign Up')
 
+    def validate_school(self, school):
+        found, _ = resolve_school(school.data)
+        if not found:
+            raise ValidationError('Unknown school code.')
+
     def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
+        # Usernames only have to be unique within a school
+        found, school = resolve_school(self.school.data)
+        if not found:
+            return # Reported by validate_school
+        user = scoped(User, school.id if school else None).filter_by(username=username.data).first()
         if user:
             raise ValidationError('That username is already taken. Please choose a different one.')
 
 class LoginForm(FlaskForm):
+    school = StringField('School Code', validators=[Optional(), Length(max=50)])
     username = StringField('Username', validators=[DataRequired()])
     password = PasswordField('Password', validators=[DataRequired()])
     remember = BooleanField('Remember Me')
     submit = SubmitField('Login')
 
+# Helper function for QuerySelectField to get all classes
+def get_all_classes():
+    # Only the current school's classes; served by the (school_id, name) unique index
+    return scoped(Class).order_by(Class.name).all()
+
+def get_class_label(class_obj):
+    return class_obj.name
+
 class ClassForm(FlaskForm):
     name = StringField('Class Name',
                        validators=[DataRequired(), Length(min=2, max=100)])
     teacher_name = StringField('Teacher Name',
                                validators=[Optional(), Length(max=100)]) # Optional validator allows empty field
+    # Where run.py promote moves the students at the start of a school year
+    next_class = QuerySelectField('Promotes To',
+                                  query_factory=get_all_classes,
+                                  get_label=get_class_label,
+                                  allow_blank=True,
+                                  blank_text='-- Final Year --',
+                                  validators=[Optional()])
     submit = SubmitField('Save Class')
 
     def validate_name(self, name_field):
@@ -42,17 +71,10 @@ class ClassForm(FlaskForm):
         if name_field.data == current_name:
             return # Name hasn't changed
 
-        existing_class = Class.query.filter(Class.name == name_field.data).first()
+        existing_class = scoped(Class).filter(Class.name == name_field.data).first()
         if existing_class:
             raise ValidationError('A class with this name already exists. Please use a different name.')
 
-# Helper function for QuerySelectField to get all classes
-def get_all_classes():
-    return Class.query.order_by(Class.name).all()
-
-def get_class_label(class_obj):
-    return class_obj.name
-
 class StudentForm(FlaskForm):
     first_name = StringField('First Name',
                              validators=[DataRequired(), Length(min=1, max=100)])
@@ -66,8 +88,24 @@ class StudentForm(FlaskForm):
                                 allow_blank=True,
                                 blank_text='-- Not Assigned --',
                                 validators=[Optional()])
+    card_uid = StringField('Card / QR Code', validators=[Optional(), Length(max=64)])
+    guardian_email = StringField('Parent / Guardian Email',
+                                 validators=[Optional(), Length(max=120),
+                                             Regexp(r'^[^@\s]+@[^@\s]+\.[^@\s]+$', message='Please enter an email address.')])
     submit = SubmitField('Save Student')
 
+    def validate_card_uid(self, card_uid):
+        # Door scans resolve students by this code, it must be unique within the school
+        if card_uid.data == card_uid.object_data:
+            return # Unchanged
+        if scoped(Student).filter(Student.card_uid == card_uid.data).first():
+            raise ValidationError('Another student already has this card.')
+
+def period_choices():
+    # Period 0 is the once-a-day registration, 1..ATTENDANCE_PERIODS the lessons
+    return [(0, 'Whole Day')] + [(period, f'Period {period}')
+                                 for period in range(1, current_app.config.get('ATTENDANCE_PERIODS', 0) + 1)]
+
 class AttendanceSelectionForm(FlaskForm):
     class_id = QuerySelectField('Select Class',
                                 query_factory=get_all_classes, # Re-use existing helper
@@ -76,8 +114,13 @@ class AttendanceSelectionForm(FlaskForm):
     date = DateField('Select Date',
                      validators=[DataRequired()],
                      default=date.today)
+    period = SelectField('Select Period', coerce=int, default=0)
     submit_select = SubmitField('Load Students')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.period.choices = period_choices()
+
 # AttendanceRecordForm is conceptual, no changes needed to it.
 
 class AttendanceViewSelectionForm(FlaskForm):
@@ -90,3 +133,27 @@ class AttendanceViewSelectionForm(FlaskForm):
     date = DateField('Filter by Date (Optional)',
                      validators=[Optional()]) # DateField will be None if not filled
     submit_view = SubmitField('View Attendance')
+
+class DateRangeForm(FlaskForm):
+    # Start and end day of a report, both included, at most MAX_DAYS apart
+    start_date = DateField('From', validators=[DataRequired()])
+    end_date = DateField('To', validators=[DataRequired()])
+
+    MAX_DAYS = 366
+
+    def validate_end_date(self, end_date):
+        if self.start_date.data and end_date.data:
+            if end_date.data < self.start_date.data:
+                raise ValidationError('The end date must not be before the start date.')
+            if (end_date.data - self.start_date.data).days >= self.MAX_DAYS:
+                raise ValidationError(f'Please choose a range of at most {self.MAX_DAYS} days.')
+
+class AttendanceRangeForm(DateRangeForm):
+    class_id = QuerySelectField('Select Class',
+                                query_factory=get_all_classes,
+                                get_label=get_class_label,
+                                validators=[DataRequired()])
+    submit_matrix = SubmitField('Show Calendar')
+
+class MissingMarksForm(DateRangeForm):
+    submit = SubmitField('Find Missing Attendance')
@@ -0,0 +1,143 @@
+"""Template caching: on-disk bytecode cache and a fragment cache tag.
+
+Jinja compiles every template to Python on first use in each worker. With
+``TEMPLATE_CACHE_DIR`` set, the compiled bytecode is kept on disk and new workers
+load it instead of recompiling (``python run.py compile_templates`` fills it ahead
+of a deploy).
+
+Large tables are wrapped in ``{% cache 'name', key... %} ... {% endcache %}``. The
+rendered HTML is kept in a per-process LRU and keyed on the given parts plus the
+current school and its data version (models.DataVersion), which every write to a
+class, student or attendance row of the school bumps, so a cached table is never
+served after its data changed. Views pass their rows through ``Deferred`` so the
+query only runs when the fragment has to be rendered.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from sqlalchemy import select
+
+from .models import db, DataVersion
+from .tenancy import current_school_id
+
+FRAGMENT_CACHE_EXTENSION_KEY = 'fragment_cache' # app.extensions key of the FragmentCache
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def data_version(school_id):
+    """Current data version of a school (0 before its first write)."""
+    version = db.session.execute(
+        select(DataVersion.version).where(DataVersion.school_key == (school_id or 0))).scalar()
+    return version or 0
+
+
+class Deferred:
+    """A sequence that is only loaded on first use: `Deferred(reads.student_rows, school_id)`."""
+
+    def __init__(self, loader, *args, **kwargs):
+        self._loader = loader
+        self._args = args
+        self._kwargs = kwargs
+        self._rows = None
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = self._loader(*self._args, **self._kwargs)
+        return self._rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'name', key... %}`` ... ``{% endcache %}``"""
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(key_parts)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render(self, key_parts, caller):
+        cache = current_app.extensions.get(FRAGMENT_CACHE_EXTENSION_KEY)
+        if cache is None:
+            return caller()
+        school_id = current_school_id()
+        key = (*key_parts, school_id, data_version(school_id))
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, html)
+        return html
+
+
+def init_app(app):
+    """Install the bytecode cache and the cache tag; call before the first render."""
+    options = dict(app.jinja_options)
+    options['extensions'] = [*options.get('extensions', []), FragmentCacheExtension]
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        options['bytecode_cache'] = FileSystemBytecodeCache(cache_dir)
+    app.jinja_options = options
+
+    size = app.config.get('FRAGMENT_CACHE_SIZE', 256)
+    if size:
+        app.extensions[FRAGMENT_CACHE_EXTENSION_KEY] = FragmentCache(size)
+
+
+def compile_templates(app):
+    """Compile every template so its bytecode lands in TEMPLATE_CACHE_DIR. Returns the count."""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
@@ -0,0 +1,236 @@
+"""Asynchronous attendance ingest for the start-of-period burst.
+
+``POST /api/attendance`` only checks that the class belongs to the caller's school,
+commits the marks to the ``ingest_submission`` table and answers 202 with a ticket;
+no request waits for the marks to be applied. The insert goes through
+coalescer.run_write(), so the submissions of a burst share one commit instead of
+one fsync each. A submission that was acknowledged is in the database, so a crash
+or restart of the worker never loses it.
+
+Each worker process runs one asyncio event loop in a background thread (started on
+first use, so after any fork). Its single writer coroutine wakes up when the worker
+accepts a submission (and every INGEST_POLL_S anyway), lets the burst collect for
+INGEST_MAX_WAIT_MS and then drains the table: it claims up to INGEST_MAX_BATCH queued
+submissions at a time, whichever worker accepted them, and applies each claimed
+batch in one transaction that also marks its rows applied. Many classes' upserts
+share one commit instead of one commit each. A submission that fails only fails its
+own ticket (see coalescer.run_batch). Rows claimed by a writer that died are claimed
+again after INGEST_CLAIM_TIMEOUT_S; marks that are already saved change nothing.
+
+``GET /api/attendance/<ticket>`` reads the ticket from the table, so any worker can
+report queued/applying/applied/failed and the number of changed marks. The Future
+on the Ticket that submit() returns lets in-process callers wait for the result; it
+resolves when this worker's writer applies the submission.
+"""
+import asyncio
+import json
+import secrets
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+from sqlalchemy import and_, or_, select
+
+from .models import db, IngestSubmission
+from . import attendance
+from .coalescer import run_batch, run_write
+
+INGEST_EXTENSION_KEY = 'attendance_ingest' # app.extensions key of the IngestService
+MAX_TICKETS = 10000 # Tickets of this worker's submissions kept for their Futures
+
+# `marks` is {student_id: is_present}, already limited to the class's roster; the
+# fields are stage_marks()'s arguments, `changed_by` is the submitting user's id
+Submission = namedtuple('Submission', ['class_id', 'date', 'marks', 'period', 'changed_by', 'source'],
+                        defaults=[0, None, 'api'])
+
+
+class Ticket:
+    __slots__ = ('id', 'school_id', 'submission', 'status', 'changed', 'error', 'future')
+
+    def __init__(self, ticket_id, school_id, submission, status='queued', changed=None, error=None, future=None):
+        self.id = ticket_id
+        self.school_id = school_id
+        self.submission = submission
+        self.status = status
+        self.changed = changed
+        self.error = error
+        self.future = future # Set on the Tickets of this worker's submissions
+
+    @classmethod
+    def from_row(cls, row, future=None):
+        return cls(str(row.id), row.school_id, _submission(row), row.status, row.changed, row.error, future)
+
+    def as_dict(self):
+        return {'ticket': self.id, 'status': self.status, 'class_id': self.submission.class_id,
+                'date': self.submission.date.isoformat(), 'period': self.submission.period, 'changed': self.changed, 'error': self.error}
+
+
+def _submission(row):
+    marks = {int(student_id): present for student_id, present in json.loads(row.marks).items()}
+    return Submission(row.class_id, row.date, marks, row.period, row.changed_by, row.source)
+
+
+def _queue_submission(values):
+    # run_write() write: stages the submission row, returns its id
+    table = IngestSubmission.__table__
+    return db.session.execute(table.insert().values(**values)).inserted_primary_key[0]
+
+
+def _apply_submission(submission_id, submission):
+    # The row turns applied in the same commit as its marks
+    changes = attendance.stage_marks(*submission)
+    table = IngestSubmission.__table__
+    db.session.execute(table.update().where(table.c.id == submission_id)
+                       .values(status='applied', changed=len(changes), finished_at=datetime.utcnow()))
+    return changes
+
+
+def claim_submissions(limit, stale_after):
+    """Claim up to `limit` queued submissions, oldest first; returns their rows.
+
+    Submissions claimed more than `stale_after` (a timedelta) ago by a writer that
+    never finished them are claimed again.
+    """
+    table = IngestSubmission.__table__
+    now = datetime.utcnow()
+    token = secrets.token_hex(8)
+    claimable = or_(table.c.status == 'queued',
+                    and_(table.c.status == 'applying', table.c.claimed_at < now - stale_after))
+    with db.engine.begin() as conn:
+        ids = [row[0] for row in conn.execute(select(table.c.id).where(claimable).order_by(table.c.id).limit(limit))]
+        if not ids:
+            return []
+        # Rows another writer took in the meantime no longer match `claimable`
+        conn.execute(table.update().where(table.c.id.in_(ids), claimable)
+                     .values(status='applying', claimed_by=token, claimed_at=now))
+        return conn.execute(select(table).where(table.c.id.in_(ids), table.c.claimed_by == token)
+                            .order_by(table.c.id)).fetchall()
+
+
+def apply_batch(rows):
+    """Apply claimed submission rows in one transaction; returns one MarkChange list or exception each."""
+    results = run_batch([partial(_apply_submission, row.id, _submission(row)) for row in rows])
+    failed = [(row, result) for row, result in zip(rows, results) if isinstance(result, Exception)]
+    if failed:
+        table = IngestSubmission.__table__
+        now = datetime.utcnow()
+        for row, error in failed:
+            db.session.execute(table.update().where(table.c.id == row.id)
+                               .values(status='failed', error=str(error)[:500], finished_at=now))
+        db.session.commit()
+    return results
+
+
+class IngestService:
+    def __init__(self, app, max_batch=200, max_wait=0.05, poll=1.0, claim_timeout=300):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.poll = poll
+        self.claim_timeout = timedelta(seconds=claim_timeout)
+        self.batches = 0 # Transactions committed by the writer
+        self._tickets = OrderedDict()
+        self._lock = threading.Lock()
+        # The database work runs on one thread outside the event loop
+        self._db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-writer')
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name='ingest-loop', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        started.set()
+        self._loop.run_until_complete(self._writer())
+
+    def submit(self, class_id, day, marks, school_id=None, period=0, changed_by=None):
+        """Commit marks for a class and a period of a day to the ingest queue; returns the Ticket."""
+        submission = Submission(class_id, day, dict(marks), period, changed_by)
+        # Committed with the other writes of the moment before the ticket exists
+        submission_id = run_write(_queue_submission, dict(
+            school_id=school_id, class_id=class_id, date=day, period=period, changed_by=changed_by,
+            marks=json.dumps({str(student_id): bool(present) for student_id, present in submission.marks.items()}),
+            source=submission.source, status='queued', created_at=datetime.utcnow()))
+        ticket = Ticket(str(submission_id), school_id, submission, future=Future())
+        with self._lock:
+            self._tickets[submission_id] = ticket
+            while len(self._tickets) > MAX_TICKETS:
+                self._tickets.popitem(last=False)
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return ticket
+
+    def ticket(self, ticket_id):
+        """The Ticket of a submission to any worker, read from the table; None if unknown."""
+        try:
+            submission_id = int(ticket_id)
+        except ValueError:
+            return None
+        table = IngestSubmission.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(select(table).where(table.c.id == submission_id)).first()
+        if row is None:
+            return None
+        with self._lock:
+            local = self._tickets.get(submission_id)
+        return Ticket.from_row(row, local.future if local else None)
+
+    async def _writer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll)
+                await asyncio.sleep(self.max_wait) # Let the burst collect
+            except asyncio.TimeoutError:
+                pass # Still look for submissions of other or crashed workers
+            self._wakeup.clear()
+            try:
+                while await self._loop.run_in_executor(self._db_thread, self._apply_next):
+                    pass
+            except Exception:
+                pass # Claimed rows stay in the table and are claimed again after INGEST_CLAIM_TIMEOUT_S
+
+    def _apply_next(self):
+        # Claims and applies one batch; returns its size, 0 once the queue is empty
+        with self.app.app_context():
+            try:
+                rows = claim_submissions(self.max_batch, self.claim_timeout)
+                if not rows:
+                    return 0
+                results = apply_batch(rows)
+            finally:
+                db.session.remove()
+        self.batches += 1
+        with self._lock:
+            tickets = [self._tickets.get(row.id) for row in rows]
+        for ticket, result in zip(tickets, results):
+            if ticket is None:
+                continue # Accepted by another worker
+            if isinstance(result, Exception):
+                ticket.status, ticket.error = 'failed', str(result)
+                ticket.future.set_exception(result)
+            else:
+                ticket.status, ticket.changed = 'applied', len(result)
+                ticket.future.set_result(result)
+        return len(rows)
+
+
+_start_lock = threading.Lock()
+
+
+def get_ingest(app):
+    """The worker's IngestService, started on first use."""
+    service = app.extensions.get(INGEST_EXTENSION_KEY)
+    if service is None:
+        with _start_lock:
+            service = app.extensions.get(INGEST_EXTENSION_KEY)
+            if service is None:
+                service = app.extensions[INGEST_EXTENSION_KEY] = IngestService(
+                    app, max_batch=app.config.get('INGEST_MAX_BATCH', 200),
+                    max_wait=app.config.get('INGEST_MAX_WAIT_MS', 50) / 1000,
+                    poll=app.config.get('INGEST_POLL_S', 1.0),
+                    claim_timeout=app.config.get('INGEST_CLAIM_TIMEOUT_S', 300))
+    return service
@@ -0,0 +1,322 @@
+"""Versioned schema migrations, run with `python run.py migrate`.
+
+``db.create_all()`` only creates missing tables, it never alters existing ones. Each
+migration below brings an existing database one step closer to the models and is
+recorded in ``schema_migrations`` once it completes. Steps are written to be safe to
+re-run, so an interrupted migration can simply be started again:
+
+- ``add_column`` / ``create_index`` / ``drop_index`` skip what is already done
+- ``backfill`` updates rows in small id ranges, committing each batch together with a
+  checkpoint in ``migration_backfill_progress``, and resumes from that checkpoint;
+  writers only ever wait for one short batch
+"""
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from .models import db, Attendance, AttendanceAudit, ChangeTombstone, Class, Student, User
+
+Migration = namedtuple('Migration', ['version', 'name', 'upgrade'])
+
+MIGRATIONS = []
+# Start of the enrollments migration 5 opens for existing students: their class covers all earlier records
+EARLIEST_ENROLLMENT = date(1900, 1, 1)
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+backfill_progress = Table(
+    'migration_backfill_progress', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('step', String(100), primary_key=True),
+    Column('last_id', Integer, nullable=False),
+)
+
+
+def migration(version, name):
+    """Register an upgrade function as migration `version`."""
+    def register(upgrade):
+        MIGRATIONS.append(Migration(version, name, upgrade))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return upgrade
+    return register
+
+
+class MigrationContext:
+    """Helpers handed to each upgrade function."""
+
+    def __init__(self, engine, version, batch_size=5000, pause=0.0, log=print):
+        self.engine = engine
+        self.version = version
+        self.batch_size = batch_size
+        self.pause = pause
+        self.log = log
+
+    @property
+    def dialect(self):
+        return self.engine.dialect.name
+
+    def has_column(self, table_name, column_name):
+        return column_name in {c['name'] for c in inspect(self.engine).get_columns(table_name)}
+
+    def add_column(self, column):
+        """ALTER TABLE ... ADD COLUMN for a model column (nullable, without a default)."""
+        table_name = column.table.name
+        if self.has_column(table_name, column.name):
+            return
+        preparer = self.engine.dialect.identifier_preparer
+        ddl = f'ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column.name)} ' \
+              f'{column.type.compile(self.engine.dialect)}'
+        for fk in column.foreign_keys:
+            ddl += f' REFERENCES {preparer.quote(fk.column.table.name)} ({preparer.quote(fk.column.name)})'
+        self.log(f'  add column {table_name}.{column.name}')
+        with self.engine.begin() as conn:
+            conn.execute(text(ddl))
+
+    def create_index(self, model, index_name):
+        """Create one of the model's indexes if it does not exist yet."""
+        index = next(i for i in model.__table__.indexes if i.name == index_name)
+        self.log(f'  create index {index_name}')
+        with self.engine.begin() as conn:
+            index.create(conn, checkfirst=True)
+
+    def drop_index(self, table_name, index_name):
+        """Drop an index the models no longer define, if it exists."""
+        if index_name not in {i['name'] for i in inspect(self.engine).get_indexes(table_name)}:
+            return
+        self.log(f'  drop index {index_name}')
+        with self.engine.begin() as conn:
+            conn.execute(text(f'DROP INDEX {self.engine.dialect.identifier_preparer.quote(index_name)}'))
+
+    def rebuild_table(self, model):
+        """Recreate a small table from its model definition (SQLite only).
+
+        SQLite cannot drop or change constraints in place, so the table is copied
+        into a fresh one. Only meant for small tables such as user and class.
+        """
+        table = model.__table__
+        if self.dialect != 'sqlite':
+            self.log(f'  {table.name}: constraints must be changed manually on {self.dialect}, skipped')
+            return
+        existing = {c['name'] for c in inspect(self.engine).get_columns(table.name)}
+        shared = ', '.join(f'"{c.name}"' for c in table.columns if c.name in existing)
+        metadata = MetaData()
+        for fk in table.foreign_keys: # Referenced tables must be known to the copy
+            fk.column.table.to_metadata(metadata)
+        tmp = table.to_metadata(metadata, name=f'_rebuild_{table.name}')
+        tmp.indexes.clear()
+        self.log(f'  rebuild table {table.name}')
+        with self.engine.begin() as conn:
+            tmp.create(conn)
+            conn.execute(text(f'INSERT INTO "{tmp.name}" ({shared}) SELECT {shared} FROM "{table.name}"'))
+            conn.execute(text(f'DROP TABLE "{table.name}"'))
+            conn.execute(text(f'ALTER TABLE "{tmp.name}" RENAME TO "{table.name}"'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+    def backfill(self, step, table_name, set_sql, where_sql=None):
+        """Run `UPDATE table SET <set_sql> [WHERE <where_sql>]` in id-ranged batches.
+
+        Every batch commits on its own together with its checkpoint, so the update
+        never holds a long lock and picks up where it stopped after an interruption.
+        Returns the number of rows updated by this run.
+        """
+        condition = 'id > :low AND id <= :high' + (f' AND ({where_sql})' if where_sql else '')
+        update = text(f'UPDATE "{table_name}" SET {set_sql} WHERE {condition}')
+        key = {'version': self.version, 'step': step}
+
+        with self.engine.connect() as conn:
+            max_id = conn.execute(text(f'SELECT MAX(id) FROM "{table_name}"')).scalar() or 0
+            low = conn.execute(select(backfill_progress.c.last_id).filter_by(**key)).scalar()
+        if low is None:
+            low = 0
+            with self.engine.begin() as conn:
+                conn.execute(backfill_progress.insert().values(last_id=0, **key))
+        elif low:
+            self.log(f'  {step}: resuming after id {low}')
+
+        updated = 0
+        while low < max_id:
+            high = low + self.batch_size
+            with self.engine.begin() as conn:
+                updated += conn.execute(update, {'low': low, 'high': high}).rowcount
+                conn.execute(backfill_progress.update().filter_by(**key).values(last_id=high))
+            low = high
+            if self.pause:
+                time.sleep(self.pause) # Let other writers in between batches
+        self.log(f'  {step}: {updated} rows updated')
+        return updated
+
+
+def _ensure_tables(engine):
+    _metadata.create_all(engine)
+
+
+def applied_versions():
+    _ensure_tables(db.engine)
+    with db.engine.connect() as conn:
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def _record(conn, m):
+    conn.execute(schema_migrations.insert().values(version=m.version, name=m.name, applied_at=datetime.utcnow()))
+
+
+def stamp():
+    """Mark every migration as applied, for databases created from the current models."""
+    applied = applied_versions()
+    with db.engine.begin() as conn:
+        for m in MIGRATIONS:
+            if m.version not in applied:
+                _record(conn, m)
+
+
+def migrate(batch_size=5000, pause=0.0, log=print):
+    """Create missing tables and apply all pending migrations in order.
+
+    Returns the versions applied by this run.
+    """
+    applied = applied_versions()
+    db.create_all() # Brand-new tables only, existing ones are left to the migrations
+    done = []
+    for m in MIGRATIONS:
+        if m.version in applied:
+            continue
+        log(f'Applying {m.version:04d} {m.name}')
+        m.upgrade(MigrationContext(db.engine, m.version, batch_size=batch_size, pause=pause, log=log))
+        with db.engine.begin() as conn:
+            _record(conn, m)
+            conn.execute(backfill_progress.delete().where(backfill_progress.c.version == m.version))
+        done.append(m.version)
+    return done
+
+
+# Migrations ------------------------------------------------------------------
+
+@migration(1, 'attendance (class_id, date) index')
+def _attendance_class_date_index(ctx):
+    # The model has since replaced this index with (class_id, date, period); migration 6 swaps them
+    ctx.log('  create index ix_attendance_class_date')
+    with ctx.engine.begin() as conn:
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_attendance_class_date ON attendance (class_id, date)'))
+
+
+@migration(2, 'school tenant columns')
+def _school_columns(ctx):
+    for model in (User, Class, Student, Attendance):
+        ctx.add_column(model.__table__.c.school_id)
+    # Username and class name uniqueness become per school
+    ctx.rebuild_table(User)
+    ctx.rebuild_table(Class)
+
+
+@migration(3, 'backfill school ids and tenant indexes')
+def _school_backfill(ctx):
+    ctx.backfill('student.school_id', 'student',
+                 'school_id = (SELECT class.school_id FROM class WHERE class.id = student.class_id)',
+                 'school_id IS NULL AND class_id IS NOT NULL')
+    ctx.backfill('attendance.school_id', 'attendance',
+                 'school_id = (SELECT class.school_id FROM class WHERE class.id = attendance.class_id)',
+                 'school_id IS NULL')
+    ctx.create_index(Student, 'ix_student_school_name')
+    ctx.create_index(Attendance, 'ix_attendance_school_date')
+
+
+@migration(4, 'student card ids for scan ingest')
+def _student_card_uid(ctx):
+    ctx.add_column(Student.__table__.c.card_uid)
+    ctx.create_index(Student, 'uq_student_school_card')
+
+
+@migration(5, 'class enrollment history')
+def _enrollments(ctx):
+    ctx.add_column(Class.__table__.c.next_class_id)
+    # The enrollment table itself comes from create_all(); every assigned student
+    # gets an open enrollment in their current class, covering all earlier records
+    with ctx.engine.begin() as conn:
+        opened = conn.execute(text(
+            'INSERT INTO enrollment (school_id, student_id, class_id, valid_from) '
+            'SELECT s.school_id, s.id, s.class_id, :start FROM student s '
+            'WHERE s.class_id IS NOT NULL AND NOT EXISTS '
+            '(SELECT 1 FROM enrollment e WHERE e.student_id = s.id AND e.valid_to IS NULL)'),
+            {'start': EARLIEST_ENROLLMENT}).rowcount
+    ctx.log(f'  enrollment: {opened} rows inserted')
+
+
+@migration(6, 'attendance periods')
+def _attendance_periods(ctx):
+    ctx.add_column(Attendance.__table__.c.period)
+    ctx.backfill('period', 'attendance', 'period = 0', 'period IS NULL') # Existing marks are whole-day marks
+    ctx.create_index(Attendance, 'ix_attendance_class_date_period')
+    ctx.drop_index('attendance', 'ix_attendance_class_date') # A prefix of the new index
+
+
+@migration(7, 'guardian emails for absence notifications')
+def _guardian_email(ctx):
+    ctx.add_column(Student.__table__.c.guardian_email) # The outbox table comes from create_all()
+
+
+@migration(8, 'change feed sequence numbers')
+def _change_sequence(ctx):
+    # The counter and tombstone tables come from create_all()
+    for model, index_name in ((Class, 'ix_class_school_seq'), (Student, 'ix_student_school_seq'),
+                              (Attendance, 'ix_attendance_school_seq')):
+        table_name = model.__tablename__
+        ctx.add_column(model.__table__.c.updated_seq)
+        ctx.backfill(f'{table_name} updated_seq', table_name, 'updated_seq = 0', 'updated_seq IS NULL')
+        ctx.create_index(model, index_name)
+
+
+def _create_default_tenant_unique_index(ctx, model, index_name, column):
+    # The per-school unique constraints let any number of NULL school_ids through
+    table_name = model.__tablename__
+    with ctx.engine.connect() as conn:
+        duplicates = [row[0] for row in conn.execute(text(
+            f'SELECT "{column}" FROM "{table_name}" WHERE school_id IS NULL AND "{column}" IS NOT NULL '
+            f'GROUP BY "{column}" HAVING COUNT(*) > 1'))]
+    if duplicates:
+        raise RuntimeError(f'{table_name}: duplicate {column}s in the default school, change them first: '
+                           + ', '.join(duplicates))
+    ctx.create_index(model, index_name)
+
+
+@migration(9, 'unique usernames and class names in the default tenant')
+def _default_tenant_unique(ctx):
+    _create_default_tenant_unique_index(ctx, User, 'uq_user_default_username', 'username')
+    _create_default_tenant_unique_index(ctx, Class, 'uq_class_default_name', 'name')
+
+
+@migration(10, 'unique card ids in the default tenant')
+def _default_tenant_cards(ctx):
+    _create_default_tenant_unique_index(ctx, Student, 'uq_student_default_card', 'card_uid')
+
+
+@migration(11, 'audit log outlives deleted students')
+def _audit_without_student_key(ctx):
+    # Drops the student foreign key and lets new_value record deletions; one copy of the log
+    ctx.rebuild_table(AttendanceAudit)
+
+
+@migration(12, 'change feed moves and a seeded change counter')
+def _change_moves(ctx):
+    ctx.add_column(ChangeTombstone.__table__.c.moved_to)
+    # next_change_seq() no longer creates the counter row; without a row no number was handed out yet
+    with ctx.engine.begin() as conn:
+        seeded = conn.execute(text('INSERT INTO change_counter (id, value) SELECT 1, 0 '
+                                   'WHERE NOT EXISTS (SELECT 1 FROM change_counter)')).rowcount
+    if seeded:
+        ctx.log('  seed change_counter')
+
+
+@migration(13, 'audit log deletion entries')
+def _audit_actions(ctx):
+    # Deletions get their own action instead of posing as a mark; the mark key columns become optional
+    ctx.add_column(AttendanceAudit.__table__.c.action)
+    ctx.rebuild_table(AttendanceAudit)
+    ctx.backfill('deletion entries', 'attendance_audit', "action = 'deleted'", 'action IS NULL AND new_value IS NULL')
@@ -1,19 +1,93 @@
+import time
+from datetime import date
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session as flask_session
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Integer, String, Boolean, Date, ForeignKey
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Integer, String, Text, Boolean, Date, DateTime, Float, ForeignKey, LargeBinary, UniqueConstraint, Index, event, inspect, select, text
 from sqlalchemy.orm import relationship
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
+REPLICA_EXTENSION_KEY = 'read_replica' # app.extensions key of the replica engine
+LAST_WRITE_SESSION_KEY = '_db_write_at'
+
+def _replica_allowed():
+    if not has_app_context() or not g.get('_use_read_replica'):
+        return False
+    # Read-your-writes: a user who just committed keeps reading the primary for a while
+    if has_request_context():
+        sticky_seconds = current_app.config.get('READ_REPLICA_STICKY_SECONDS', 10)
+        if time.time() - flask_session.get(LAST_WRITE_SESSION_KEY, 0) < sticky_seconds:
+            return False
+    return True
+
+class RoutingSession(Session):
+    # Sends the reads of views marked with @use_read_replica to the READ_REPLICA_URL
+    # engine when one is configured. Flushes, and everything outside those views,
+    # keep using the primary database.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _replica_allowed():
+            replica = current_app.extensions.get(REPLICA_EXTENSION_KEY)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(session, flush_context):
+    session.info['wrote'] = True
+
+def stamp_last_write():
+    """Remember the user's last write for read-your-writes; only needed with a replica."""
+    # Without a replica the stamp would only rewrite the session cookie on every write
+    if has_request_context() and REPLICA_EXTENSION_KEY in current_app.extensions:
+        flask_session[LAST_WRITE_SESSION_KEY] = time.time()
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stamp_last_write(session):
+    if session.info.pop('wrote', False):
+        stamp_last_write()
+
+def use_read_replica(view):
+    """Mark a read-only view: its queries may be served by the read replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._use_read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
 # This 'db' object will be initialized in app/__init__.py
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+class School(db.Model):
+    # Tenant: one deployment serves every school of a district. Rows whose school_id
+    # is NULL belong to the default (single-school) tenant.
+    __tablename__ = 'school'
+    id = db.Column(Integer, primary_key=True)
+    name = db.Column(String(100), nullable=False)
+    slug = db.Column(String(50), unique=True, nullable=False) # Entered at login
+
+    def __repr__(self):
+        return f'<School {self.slug}>'
 
 class User(UserMixin, db.Model):
     __tablename__ = 'user'
     id = db.Column(Integer, primary_key=True)
-    username = db.Column(String(80), unique=True, nullable=False)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    username = db.Column(String(80), nullable=False)
     password_hash = db.Column(String(256), nullable=False) # Increased length for longer hashes
     is_admin = db.Column(Boolean, default=False, nullable=False)
 
+    # Usernames are unique per school, login looks them up by (school_id, username).
+    # NULLs never collide in a unique constraint, so the default tenant (school_id
+    # NULL) needs its own partial index
+    __table_args__ = (
+        UniqueConstraint('school_id', 'username', name='uq_user_school_username'),
+        Index('uq_user_default_username', 'username', unique=True,
+              sqlite_where=text('school_id IS NULL'), postgresql_where=text('school_id IS NULL')),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -26,11 +100,25 @@ class User(UserMixin, db.Model):
 class Class(db.Model):
     __tablename__ = 'class'
     id = db.Column(Integer, primary_key=True)
-    name = db.Column(String(100), unique=True, nullable=False)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    name = db.Column(String(100), nullable=False)
     teacher_name = db.Column(String(100), nullable=True)
+    # Class its students move up to in a promotion (app/enrollment.py); None for final years
+    next_class_id = db.Column(Integer, ForeignKey('class.id'), nullable=True)
+    updated_seq = db.Column(Integer, nullable=True) # Change feed position (app/changes.py)
+
+    # Class names are unique per school (the default tenant through the partial
+    # index, see User); also serves the ordered class dropdowns
+    __table_args__ = (
+        UniqueConstraint('school_id', 'name', name='uq_class_school_name'),
+        Index('uq_class_default_name', 'name', unique=True,
+              sqlite_where=text('school_id IS NULL'), postgresql_where=text('school_id IS NULL')),
+        Index('ix_class_school_seq', 'school_id', 'updated_seq'), # Change feed
+    )
 
     # Relationship to Student model
     students = relationship('Student', backref='class_assigned', lazy=True)
+    next_class = relationship('Class', remote_side=[id], lazy=True)
 
     def __repr__(self):
         return f'<Class {self.name}>'
@@ -38,16 +126,56 @@ class Class(db.Model):
 class Student(db.Model):
     __tablename__ = 'student'
     id = db.Column(Integer, primary_key=True)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
     first_name = db.Column(String(50), nullable=False)
     last_name = db.Column(String(50), nullable=False)
     class_id = db.Column(Integer, ForeignKey('class.id'), nullable=True)
+    card_uid = db.Column(String(64), nullable=True) # ID card / QR code read by door scanners
+    guardian_email = db.Column(String(120), nullable=True) # Absence notifications (app/notifications.py)
+    updated_seq = db.Column(Integer, nullable=True) # Change feed position (app/changes.py)
 
     # Relationship to Attendance model
     attendance_records = relationship('Attendance', backref='student', lazy=True, cascade="all, delete-orphan")
+    attendance_bitmaps = relationship('AttendanceBitmap', backref='student', lazy=True, cascade="all, delete-orphan")
+    absence_counter = relationship('AbsenceCounter', backref='student', uselist=False, lazy=True, cascade="all, delete-orphan")
+    enrollments = relationship('Enrollment', backref='student', lazy=True, cascade="all, delete-orphan")
+    notifications = relationship('NotificationOutbox', lazy=True, cascade="all, delete-orphan")
+
+    # The students list is per school, ordered by name
+    __table_args__ = (
+        Index('ix_student_school_name', 'school_id', 'last_name', 'first_name'),
+        Index('uq_student_school_card', 'school_id', 'card_uid', unique=True), # Scan lookups (app/scans.py)
+        Index('uq_student_default_card', 'card_uid', unique=True, # The default tenant (NULL school_id)
+              sqlite_where=text('school_id IS NULL'), postgresql_where=text('school_id IS NULL')),
+        Index('ix_student_school_seq', 'school_id', 'updated_seq'), # Change feed
+    )
 
     def __repr__(self):
         return f'<Student {self.first_name} {self.last_name}>'
 
+class Enrollment(db.Model):
+    # Which class a student belonged to when: [valid_from, valid_to), valid_to None
+    # while current. Student.class_id only holds the current class; rosters of past
+    # dates come from here (app/enrollment.py). Kept in step with Student.class_id
+    # by the _track_enrollments listener below.
+    __tablename__ = 'enrollment'
+    id = db.Column(Integer, primary_key=True)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    student_id = db.Column(Integer, ForeignKey('student.id'), nullable=False)
+    class_id = db.Column(Integer, ForeignKey('class.id'), nullable=False)
+    valid_from = db.Column(Date, nullable=False)
+    valid_to = db.Column(Date, nullable=True)
+
+    class_enrolled = relationship('Class', lazy=True)
+
+    __table_args__ = (
+        Index('ix_enrollment_class_interval', 'class_id', 'valid_from', 'valid_to'), # Roster of a class on a date
+        Index('ix_enrollment_student_interval', 'student_id', 'valid_from'), # Class history of a student
+    )
+
+    def __repr__(self):
+        return f'<Enrollment {self.student_id} in {self.class_id} from {self.valid_from}>'
+
 class Attendance(db.Model):
     __tablename__ = 'attendance'
     id = db.Column(Integer, primary_key=True)
@@ -55,10 +183,289 @@ class Attendance(db.Model):
     is_present = db.Column(Boolean, nullable=False, default=True)
     student_id = db.Column(Integer, ForeignKey('student.id'), nullable=False)
     class_id = db.Column(Integer, ForeignKey('class.id'), nullable=False)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    # Lesson period of the mark; 0 is the whole-day registration (see app/attendance.py)
+    period = db.Column(Integer, nullable=False, default=0)
+    updated_seq = db.Column(Integer, nullable=True) # Change feed position (app/changes.py)
 
     # Add relationship to Class model to easily query attendance by class
     class_attended = relationship('Class', backref='attendance_records', lazy=True)
 
+    __table_args__ = (
+        # Access path for a class on a day, one period of a day or a date range
+        # (rosters, saves, matrix view)
+        Index('ix_attendance_class_date_period', 'class_id', 'date', 'period'),
+        # School-wide reports by date
+        Index('ix_attendance_school_date', 'school_id', 'date'),
+        Index('ix_attendance_school_seq', 'school_id', 'updated_seq'), # Change feed
+    )
+
+    def __repr__(self):
+        return f'<Attendance {self.student_id} on {self.date} period {self.period}>'
+
+class AttendanceBitmap(db.Model):
+    # Compact storage for closed terms: one row per (student, class, term) instead of
+    # one Attendance row per school day. Bit i of each bitset is the i-th school day
+    # of the term, see app/bitmap.py for the encoding.
+    __tablename__ = 'attendance_bitmap'
+    id = db.Column(Integer, primary_key=True)
+    student_id = db.Column(Integer, ForeignKey('student.id'), nullable=False)
+    class_id = db.Column(Integer, ForeignKey('class.id'), nullable=False)
+    term_start = db.Column(Date, nullable=False)
+    term_end = db.Column(Date, nullable=False)
+    marked_bits = db.Column(LargeBinary, nullable=False) # Day has a mark at all
+    absent_bits = db.Column(LargeBinary, nullable=False) # Day was marked absent
+
+    __table_args__ = (
+        UniqueConstraint('student_id', 'class_id', 'term_start', name='uq_attendance_bitmap_student_class_term'),
+        Index('ix_attendance_bitmap_class_term', 'class_id', 'term_start'),
+    )
 
     def __repr__(self):
-        return f'<Attendance {self.student_id} on {self.date}>'
+        return f'<AttendanceBitmap {self.student_id} {self.term_start}..{self.term_end}>'
+
+class AbsenceCounter(db.Model):
+    # Per-student running counters for early-warning alerts, updated incrementally
+    # on every attendance save (see app/alerts.py) instead of rescanning Attendance.
+    __tablename__ = 'absence_counter'
+    student_id = db.Column(Integer, ForeignKey('student.id'), primary_key=True)
+    last_date = db.Column(Date, nullable=True) # Most recent marked school day
+    current_streak = db.Column(Integer, nullable=False, default=0) # Consecutive absent marked days
+    recent_bits = db.Column(Integer, nullable=False, default=0) # Bit 0 = last_date, 1 = absent
+    recent_days = db.Column(Integer, nullable=False, default=0) # Valid bits in recent_bits
+    recent_absences = db.Column(Integer, nullable=False, default=0) # Set bits in recent_bits
+    total_days = db.Column(Integer, nullable=False, default=0)
+    total_absences = db.Column(Integer, nullable=False, default=0)
+    in_alert = db.Column(Boolean, nullable=False, default=False, index=True)
+    alert_since = db.Column(Date, nullable=True)
+    updated_at = db.Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<AbsenceCounter {self.student_id} streak={self.current_streak}>'
+
+class NotificationOutbox(db.Model):
+    # Transactional outbox of parent notifications: rows are inserted in the same
+    # commit as the absent marks that cause them and sent later by the dispatcher
+    # (app/notifications.py).
+    __tablename__ = 'notification_outbox'
+    id = db.Column(Integer, primary_key=True)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    student_id = db.Column(Integer, ForeignKey('student.id'), nullable=False)
+    date = db.Column(Date, nullable=False)
+    kind = db.Column(String(20), nullable=False, default='absence')
+    status = db.Column(String(10), nullable=False, default='pending') # pending, sent, skipped or failed
+    attempts = db.Column(Integer, nullable=False, default=0)
+    last_error = db.Column(String(500), nullable=True)
+    created_at = db.Column(DateTime, nullable=False)
+    sent_at = db.Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_notification_outbox_status', 'status', 'id'), # The dispatcher drains pending rows in id order
+        Index('ix_notification_outbox_student_date', 'student_id', 'date'), # One notification per student and day
+    )
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.kind} {self.student_id} {self.date} {self.status}>'
+
+class IngestSubmission(db.Model):
+    # Durable queue of POST /api/attendance submissions (app/ingest.py): a submission is
+    # committed here before the API acknowledges it, the writer claims queued rows and
+    # marks them applied in the same commit as the marks. Ticket lookups read it.
+    __tablename__ = 'ingest_submission'
+    id = db.Column(Integer, primary_key=True) # The ticket
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    class_id = db.Column(Integer, nullable=False)
+    date = db.Column(Date, nullable=False)
+    period = db.Column(Integer, nullable=False, default=0)
+    marks = db.Column(Text, nullable=False) # JSON {student_id: is_present}
+    changed_by = db.Column(Integer, nullable=True)
+    source = db.Column(String(10), nullable=False, default='api')
+    status = db.Column(String(10), nullable=False, default='queued') # queued, applying, applied or failed
+    claimed_by = db.Column(String(16), nullable=True) # Random token of the claiming writer's batch
+    claimed_at = db.Column(DateTime, nullable=True) # When it was claimed; stale claims are retaken
+    changed = db.Column(Integer, nullable=True) # Marks created or flipped
+    error = db.Column(String(500), nullable=True)
+    created_at = db.Column(DateTime, nullable=False)
+    finished_at = db.Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_ingest_submission_status', 'status', 'id'), # Writers claim queued rows in id order
+    )
+
+    def __repr__(self):
+        return f'<IngestSubmission {self.id} {self.class_id} {self.date} {self.status}>'
+
+class AttendanceAudit(db.Model):
+    # Append-only log of mark changes: one row per mark a save created or flipped,
+    # inserted in the same commit (app/audit.py), and one per deleted student. Compaction folds old rows of one
+    # mark into a single row whose `edits` counts the changes it stands for.
+    __tablename__ = 'attendance_audit'
+    id = db.Column(Integer, primary_key=True)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    action = db.Column(String(10), nullable=True) # None: a mark change; 'deleted': the student and all their marks
+    student_id = db.Column(Integer, nullable=False) # No foreign keys: history outlives deleted students
+    class_id = db.Column(Integer, nullable=True) # and classes. The mark's class; a deleted student's last class
+    date = db.Column(Date, nullable=True) # date, period and new_value are None on deletion entries
+    period = db.Column(Integer, nullable=True, default=0)
+    old_value = db.Column(Boolean, nullable=True) # None: the mark was created
+    new_value = db.Column(Boolean, nullable=True)
+    changed_by = db.Column(Integer, ForeignKey('user.id'), nullable=True) # None: not made by a logged-in user
+    source = db.Column(String(10), nullable=False, default='web') # web, api or scan
+    changed_at = db.Column(DateTime, nullable=False)
+    edits = db.Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        Index('ix_attendance_audit_student', 'student_id', 'changed_at', 'id'), # Per-student history, newest first
+        Index('ix_attendance_audit_changed_at', 'changed_at'), # Compaction of old entries
+    )
+
+    def __repr__(self):
+        return f'<AttendanceAudit {self.student_id} {self.date} {self.period}: {self.old_value} -> {self.new_value}>'
+
+class ChangeCounter(db.Model):
+    # The single row holding the last change sequence number handed out
+    __tablename__ = 'change_counter'
+    id = db.Column(Integer, primary_key=True)
+    value = db.Column(Integer, nullable=False, default=0)
+
+@event.listens_for(ChangeCounter.__table__, 'after_create')
+def _seed_change_counter(target, connection, **kw):
+    # The row exists from the start, so handing out numbers is a plain UPDATE (migration 12 for older databases)
+    connection.execute(target.insert().values(id=1, value=0))
+
+class ChangeTombstone(db.Model):
+    # Deleted classes, students and attendance marks, and marks moved out of the
+    # attendance table by archiving or term compaction, for the change feed
+    __tablename__ = 'change_tombstone'
+    id = db.Column(Integer, primary_key=True)
+    school_id = db.Column(Integer, ForeignKey('school.id'), nullable=True)
+    seq = db.Column(Integer, nullable=False)
+    entity = db.Column(String(20), nullable=False) # 'class', 'student' or 'attendance'
+    entity_id = db.Column(Integer, nullable=False)
+    moved_to = db.Column(String(20), nullable=True) # None: deleted; 'archive' or 'bitmap': moved there
+
+    __table_args__ = (
+        Index('ix_change_tombstone_school_seq', 'school_id', 'seq'),
+    )
+
+    def __repr__(self):
+        return f'<ChangeTombstone {self.entity} {self.entity_id} at {self.seq}>'
+
+class CalendarDay(db.Model):
+    # A school's calendar: one row per day it has decided on, school day or not.
+    # Days without a row are not school days; see app/school_calendar.py.
+    __tablename__ = 'calendar_day'
+    school_key = db.Column(Integer, primary_key=True) # school_id, 0 for the default tenant
+    date = db.Column(Date, primary_key=True)
+    is_school_day = db.Column(Boolean, nullable=False, default=True)
+    label = db.Column(String(100), nullable=True) # Holiday name
+
+    def __repr__(self):
+        return f'<CalendarDay {self.school_key} {self.date} {"school" if self.is_school_day else self.label}>'
+
+class LoginBucket(db.Model):
+    # Token bucket of the login rate limiter (app/ratelimit.py), one per client IP
+    # and one per school/username, shared by every worker through the database.
+    __tablename__ = 'login_bucket'
+    key = db.Column(String(200), primary_key=True) # 'ip:<addr>' or 'user:<school code>:<username>'
+    tokens = db.Column(Float, nullable=False)
+    updated_at = db.Column(Float, nullable=False) # Epoch seconds of the last refill
+    rejected = db.Column(Integer, nullable=False, default=0) # Attempts turned away so far
+
+    def __repr__(self):
+        return f'<LoginBucket {self.key} {self.tokens:.1f}>'
+
+class ServerSession(db.Model):
+    # Server-side session store used when SESSION_BACKEND = 'database' (app/sessions.py);
+    # the cookie only carries the random session id.
+    __tablename__ = 'server_session'
+    sid = db.Column(String(64), primary_key=True)
+    data = db.Column(Text, nullable=False) # Flask's tagged JSON
+    expires_at = db.Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ServerSession {self.sid[:8]}>'
+
+class DataVersion(db.Model):
+    # Per-school counter bumped whenever a class, student or attendance row of the
+    # school is written; cached template fragments are keyed on it (app/fragments.py).
+    __tablename__ = 'data_version'
+    school_key = db.Column(Integer, primary_key=True) # school_id, 0 for the default tenant
+    version = db.Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.school_key}={self.version}>'
+
+def bump_data_version(connection, school_ids=None):
+    """Invalidate cached fragments of the given schools (None: every school)."""
+    table = DataVersion.__table__
+    if school_ids is None:
+        connection.execute(table.update().values(version=table.c.version + 1))
+        return
+    for key in {school_id or 0 for school_id in school_ids}:
+        bumped = connection.execute(table.update().where(table.c.school_key == key)
+                                    .values(version=table.c.version + 1)).rowcount
+        if not bumped:
+            connection.execute(table.insert().values(school_key=key, version=1))
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _bump_data_versions(session, flush_context):
+    school_ids = {obj.school_id for obj in (*session.new, *session.dirty, *session.deleted)
+                  if isinstance(obj, (Class, Student, Attendance))}
+    if school_ids:
+        bump_data_version(session.connection(), school_ids)
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _track_enrollments(session, flush_context, instances):
+    # Close the open enrollment and open a new one whenever a student's class changes
+    for student in [obj for obj in (*session.new, *session.dirty) if isinstance(obj, Student)]:
+        state = inspect(student)
+        by_relationship = state.attrs.class_assigned.history.has_changes()
+        if student not in session.new and not by_relationship and not state.attrs.class_id.history.has_changes():
+            continue
+        with session.no_autoflush:
+            # Enrollments start on the day they are made; only the migration that introduced
+            # them backdates the existing students (migrations.EARLIEST_ENROLLMENT)
+            start = date.today()
+            for enrollment in list(student.enrollments):
+                if enrollment.valid_to is None:
+                    if enrollment.valid_from >= start:
+                        student.enrollments.remove(enrollment) # Moved again on the same day
+                    else:
+                        enrollment.valid_to = start
+            if by_relationship:
+                target = {'class_enrolled': student.class_assigned} if student.class_assigned is not None else None
+            else:
+                target = {'class_id': student.class_id} if student.class_id is not None else None
+            if target:
+                student.enrollments.append(Enrollment(school_id=student.school_id, valid_from=start, **target))
+
+CHANGE_FEED_ENTITIES = {Class: 'class', Student: 'student', Attendance: 'attendance'}
+
+def next_change_seq(connection):
+    """Hand out the next change sequence number.
+
+    The counter row stays locked until the transaction ends, so numbers are
+    committed in the order they are handed out and a reader never sees a later
+    number before an earlier one.
+    """
+    table = ChangeCounter.__table__
+    if not connection.execute(table.update().where(table.c.id == 1).values(value=table.c.value + 1)).rowcount:
+        raise RuntimeError('The change_counter row is missing; run `python run.py migrate`.')
+    return connection.execute(select(table.c.value).where(table.c.id == 1)).scalar()
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _stamp_changes(session, flush_context, instances):
+    # Every class, student and attendance row written by a flush gets its sequence number
+    changed = [obj for obj in session.new if type(obj) in CHANGE_FEED_ENTITIES]
+    changed += [obj for obj in session.dirty
+                if type(obj) in CHANGE_FEED_ENTITIES and session.is_modified(obj, include_collections=False)]
+    deleted = [obj for obj in session.deleted if type(obj) in CHANGE_FEED_ENTITIES]
+    if not changed and not deleted:
+        return
+    seq = next_change_seq(session.connection())
+    for obj in changed:
+        obj.updated_seq = seq
+    for obj in deleted:
+        session.add(ChangeTombstone(school_id=obj.school_id, seq=seq, entity=CHANGE_FEED_ENTITIES[type(obj)],
+                                    entity_id=obj.id))
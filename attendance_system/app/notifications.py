@@ -0,0 +1,177 @@
+"""Parent absence notifications through a transactional outbox.
+
+Saving marks never talks to a mail server. When a save turns a student's day into
+an absence, attendance.stage_marks() adds one multi-row INSERT into
+``notification_outbox`` to the same transaction, so a notification exists exactly
+when its marks were committed.
+
+``python run.py notify`` runs the dispatcher: it drains pending rows in batches of
+NOTIFY_BATCH_SIZE and sends at most one message per student and day, skipping
+students without a guardian email, days already notified and days that are no
+longer absences by the time the batch is sent. Messages go through a transport:
+
+- ``file`` writes each message as an .eml file into NOTIFY_FILE_DIR (the stand-in
+  for development and tests)
+- ``smtp`` sends over one SMTP connection per batch (NOTIFY_SMTP_*); point it at
+  a local debugging server to try it out
+- any other value is the dotted path of a class built with the app config, with a
+  ``send_batch(messages)`` method returning None or an exception per message
+
+Failed messages stay pending and are retried until NOTIFY_MAX_ATTEMPTS.
+"""
+import os
+import smtplib
+import time
+from collections import namedtuple
+from datetime import datetime
+from email.message import EmailMessage
+
+from werkzeug.utils import import_string
+
+from .models import db, Attendance, NotificationOutbox, Student
+
+DispatchResult = namedtuple('DispatchResult', ['sent', 'skipped', 'failed', 'rows'])
+
+
+def enqueue_absences(day_changes, school_id=None):
+    """Add outbox rows for day changes (attendance.MarkChange) that became absences."""
+    created_at = datetime.utcnow()
+    rows = [{'school_id': school_id, 'student_id': change.student_id, 'date': change.date, 'kind': 'absence',
+             'status': 'pending', 'attempts': 0, 'created_at': created_at}
+            for change in day_changes if change.new_value is False and change.old_value is not False]
+    if rows:
+        db.session.execute(NotificationOutbox.__table__.insert(), rows)
+
+
+class FileTransport:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send_batch(self, messages):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = f'{time.time():.6f}'
+        for n, message in enumerate(messages):
+            with open(os.path.join(self.directory, f'{stamp}-{n}.eml'), 'wb') as f:
+                f.write(message.as_bytes())
+        return [None] * len(messages)
+
+
+class SMTPTransport:
+    def __init__(self, host, port=25, username=None, password=None, use_tls=False, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def send_batch(self, messages):
+        results = []
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.use_tls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password)
+                for message in messages:
+                    try:
+                        smtp.send_message(message)
+                        results.append(None)
+                    except smtplib.SMTPRecipientsRefused as e: # Only this message is affected
+                        results.append(e)
+        except (OSError, smtplib.SMTPException) as e:
+            results += [e] * (len(messages) - len(results)) # The connection is gone, the rest are retried
+        return results
+
+
+def get_transport(app):
+    config = app.config
+    name = config.get('NOTIFY_TRANSPORT', 'file')
+    if name == 'file':
+        return FileTransport(config['NOTIFY_FILE_DIR'])
+    if name == 'smtp':
+        return SMTPTransport(config['NOTIFY_SMTP_HOST'], config.get('NOTIFY_SMTP_PORT', 25),
+                             config.get('NOTIFY_SMTP_USERNAME'), config.get('NOTIFY_SMTP_PASSWORD'),
+                             config.get('NOTIFY_SMTP_USE_TLS', False))
+    return import_string(name)(config)
+
+
+def absence_message(student, day, sender):
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = student.guardian_email
+    message['Subject'] = f'{student.first_name} {student.last_name} was absent on {day:%Y-%m-%d}'
+    message.set_content(f'{student.first_name} {student.last_name} was marked absent on {day:%A, %d %B %Y}.\n\n'
+                        'Please contact the school if you have any questions.\n')
+    return message
+
+
+def dispatch_batch(transport, batch_size=200, max_attempts=5, sender='attendance@localhost'):
+    """Send one batch of pending notifications; returns a DispatchResult."""
+    rows = NotificationOutbox.query.filter(NotificationOutbox.status == 'pending') \
+        .order_by(NotificationOutbox.id).limit(batch_size).all()
+    if not rows:
+        return DispatchResult(0, 0, 0, 0)
+
+    groups = {} # (student_id, date) -> outbox rows, one message each
+    for row in rows:
+        groups.setdefault((row.student_id, row.date), []).append(row)
+    student_ids = {student_id for student_id, _ in groups}
+    days = {day for _, day in groups}
+    students = {s.id: s for s in Student.query.filter(Student.id.in_(student_ids))}
+    # Present in any period or class of the day means the day is no absence any more
+    present = {(student_id, day) for student_id, day in db.session.query(Attendance.student_id, Attendance.date)
+               .filter(Attendance.student_id.in_(student_ids), Attendance.date.in_(days),
+                       Attendance.is_present.is_(True))}
+    notified = set(db.session.query(NotificationOutbox.student_id, NotificationOutbox.date)
+                   .filter(NotificationOutbox.status == 'sent', NotificationOutbox.student_id.in_(student_ids),
+                           NotificationOutbox.date.in_(days)))
+
+    now = datetime.utcnow()
+    to_send = []
+    skipped = 0
+    for key, group in groups.items():
+        student = students.get(key[0])
+        if student is None or not student.guardian_email or key in notified or key in present:
+            for row in group:
+                row.status, row.sent_at = 'skipped', now
+            skipped += 1
+        else:
+            to_send.append((group, absence_message(student, key[1], sender)))
+
+    results = transport.send_batch([message for _, message in to_send]) if to_send else []
+    sent = failed = 0
+    for (group, _), error in zip(to_send, results):
+        for row in group:
+            if error is None:
+                row.status, row.sent_at = 'sent', now
+            else:
+                row.attempts += 1
+                row.last_error = str(error)[:500]
+                if row.attempts >= max_attempts:
+                    row.status = 'failed'
+        if error is None:
+            sent += 1
+        else:
+            failed += 1
+    db.session.commit()
+    return DispatchResult(sent, skipped, failed, len(rows))
+
+
+def run_dispatcher(app, once=False, log=print):
+    """Drain the outbox, then keep polling every NOTIFY_INTERVAL seconds (unless `once`)."""
+    config = app.config
+    with app.app_context():
+        transport = get_transport(app)
+        while True:
+            result = dispatch_batch(transport, config.get('NOTIFY_BATCH_SIZE', 200),
+                                    config.get('NOTIFY_MAX_ATTEMPTS', 5), config.get('NOTIFY_SENDER'))
+            if result.rows:
+                log(f'{result.sent} sent, {result.skipped} skipped, {result.failed} failed')
+            db.session.remove()
+            # Keep going while full batches are delivered; back off when empty or failing
+            if result.rows == config.get('NOTIFY_BATCH_SIZE', 200) and not result.failed:
+                continue
+            if once:
+                return
+            time.sleep(config.get('NOTIFY_INTERVAL', 5))
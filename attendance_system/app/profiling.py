@@ -0,0 +1,168 @@
+"""Opt-in sampling profiler for individual production requests (``PROFILING = True``).
+
+With PROFILING off nothing is installed: no request hooks, no thread. When it is
+on, a request is profiled if a random draw falls under PROFILE_SAMPLE_RATE or an
+admin sends the PROFILE_HEADER header. Other requests pay for one random() call.
+
+Profiling does not trace calls. One sampler thread per worker (started on the
+first profiled request) wakes every PROFILE_INTERVAL_MS and records the current
+stack of each thread that is serving a profiled request, so the cost is the same
+for a fast view and for one stuck in a query. Stacks are kept in the folded
+format of flamegraph.pl and speedscope (``frame;frame;frame count``).
+
+Finished profiles go into a ring buffer of the last PROFILE_BUFFER_SIZE requests
+of the worker; admins list and download them on /admin/profiles. Writes applied
+through the write coalescer run on its thread and show up as the wait in
+coalescer.run_write().
+"""
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+PROFILER_EXTENSION_KEY = 'request_profiler' # app.extensions key of the Profiler
+
+
+class RequestProfile:
+    __slots__ = ('id', 'method', 'path', 'endpoint', 'status', 'started_at', 'duration_ms', 'samples', 'stacks')
+
+    def __init__(self, profile_id, method, path, endpoint):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.status = None
+        self.started_at = datetime.utcnow()
+        self.duration_ms = None
+        self.samples = 0
+        self.stacks = Counter() # Folded stack -> samples
+
+    def folded(self):
+        """The stacks in folded format, one ``stack count`` line each."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=10):
+        """(frame, samples) of the frames most often on top of the stack."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(limit)
+
+
+def _frame_name(code):
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+
+
+def fold_stack(frame):
+    """Folded form of a frame's stack, outermost call first."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profiler:
+    def __init__(self, interval=0.005, buffer_size=50):
+        self.interval = interval
+        self.profiles = deque(maxlen=buffer_size) # Finished profiles, oldest dropped first
+        self._ids = itertools.count(1)
+        self._active = {} # thread ident -> RequestProfile being sampled
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, method, path, endpoint):
+        profile = RequestProfile(next(self._ids), method, path, endpoint)
+        with self._lock:
+            self._active[threading.get_ident()] = profile
+            if self._thread is None: # First use in this worker, so after any fork
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def stop(self, profile, status, duration):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            profile.status = status
+            profile.duration_ms = round(duration * 1000, 1)
+            self.profiles.append(profile)
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def recent(self):
+        """Finished profiles, newest first."""
+        with self._lock:
+            return list(reversed(self.profiles))
+
+    def _run(self):
+        while True:
+            with self._lock: # Sampling under the lock: stop() never races a sample of its profile
+                idle = not self._active
+                if idle:
+                    self._wakeup.clear()
+                else:
+                    frames = sys._current_frames()
+                    for ident, profile in self._active.items():
+                        frame = frames.get(ident)
+                        if frame is not None:
+                            profile.stacks[fold_stack(frame)] += 1
+                            profile.samples += 1
+                    frames = frame = None # No references to other threads' frames while sleeping
+            if idle:
+                self._wakeup.wait() # Until the next profiled request
+            else:
+                time.sleep(self.interval)
+
+
+def _wants_profile(app):
+    header = app.config.get('PROFILE_HEADER')
+    if header and request.headers.get(header):
+        # Only honoured for admins: the user is only loaded when the header is sent
+        return current_user.is_authenticated and current_user.is_admin
+    return random.random() < app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+
+
+def _start_profile():
+    app = current_app._get_current_object()
+    if _wants_profile(app):
+        g._profile = app.extensions[PROFILER_EXTENSION_KEY].start(request.method, request.path, request.endpoint)
+        g._profile_started = time.perf_counter()
+
+
+def _record_status(response):
+    profile = g.get('_profile')
+    if profile is not None:
+        profile.status = response.status_code
+    return response
+
+
+def _finish_profile(error=None):
+    profile = g.pop('_profile', None)
+    if profile is not None:
+        status = 500 if error is not None else profile.status
+        current_app.extensions[PROFILER_EXTENSION_KEY].stop(profile, status, time.perf_counter() - g._profile_started)
+
+
+def get_profiler(app):
+    """The worker's Profiler, or None when PROFILING is off."""
+    return app.extensions.get(PROFILER_EXTENSION_KEY)
+
+
+def init_app(app):
+    if not app.config.get('PROFILING'):
+        return
+    app.extensions[PROFILER_EXTENSION_KEY] = Profiler(app.config.get('PROFILE_INTERVAL_MS', 5) / 1000,
+                                                      app.config.get('PROFILE_BUFFER_SIZE', 50))
+    app.before_request(_start_profile)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_profile)
@@ -0,0 +1,110 @@
+"""Token-bucket rate limiting of login attempts.
+
+Every login POST takes one token from the bucket of the school/username it targets,
+before the user is looked up or a password hash is checked. The bucket of the client
+IP only pays for failed attempts, so a school behind one NAT address is not locked
+out by its own successful logins, but it still has to hold a token for the attempt
+to go on. Buckets refill continuously up to their capacity; an empty bucket turns
+the attempt away (HTTP 429) and counts it in the bucket's ``rejected`` column.
+Behind a reverse proxy, set TRUSTED_PROXY_HOPS so the client IP is the real one.
+
+Buckets live in the ``login_bucket`` table so all workers share them. Taking a token
+is a single conditional UPDATE, so concurrent attempts can never overdraw a bucket.
+"""
+import time
+
+from flask import current_app
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, LoginBucket
+
+
+def _settings():
+    config = current_app.config
+    return {
+        'ip': (config.get('LOGIN_IP_BUCKET_CAPACITY', 20), config.get('LOGIN_IP_REFILL_PER_MINUTE', 10)),
+        'user': (config.get('LOGIN_USER_BUCKET_CAPACITY', 5), config.get('LOGIN_USER_REFILL_PER_MINUTE', 2)),
+    }
+
+
+def ip_key(remote_addr):
+    return f'ip:{remote_addr or "unknown"}'
+
+
+def user_key(school_code, username):
+    return f"user:{(school_code or '').strip().lower()}:{(username or '').strip().lower()}"
+
+
+def take_token(key, capacity, refill_per_minute, now=None):
+    """Take one token from bucket `key`; False if it is empty. Commits immediately."""
+    now = time.time() if now is None else now
+    table = LoginBucket.__table__
+    refilled = table.c.tokens + (now - table.c.updated_at) * (refill_per_minute / 60.0)
+    available = case((refilled > capacity, capacity), else_=refilled)
+
+    with db.engine.begin() as conn:
+        taken = conn.execute(table.update()
+                             .where(table.c.key == key, available >= 1)
+                             .values(tokens=available - 1, updated_at=now)).rowcount
+        if taken:
+            return True
+        rejected = conn.execute(table.update()
+                                .where(table.c.key == key)
+                                .values(rejected=table.c.rejected + 1)).rowcount
+        if rejected:
+            return False
+    # First attempt for this key
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(key=key, tokens=capacity - 1, updated_at=now, rejected=0))
+        return True
+    except IntegrityError: # Another worker created it in the meantime
+        return take_token(key, capacity, refill_per_minute, now)
+
+
+def has_token(key, capacity, refill_per_minute, now=None):
+    """Whether bucket `key` holds a token, without taking it; an empty bucket counts a rejection."""
+    now = time.time() if now is None else now
+    table = LoginBucket.__table__
+    refilled = table.c.tokens + (now - table.c.updated_at) * (refill_per_minute / 60.0)
+    with db.engine.begin() as conn:
+        return not conn.execute(table.update()
+                                .where(table.c.key == key, refilled < 1)
+                                .values(rejected=table.c.rejected + 1)).rowcount
+
+
+def allow_login(remote_addr, school_code, username):
+    """Whether a login attempt may go on to the password check."""
+    settings = _settings()
+    if not has_token(ip_key(remote_addr), *settings['ip']):
+        return False
+    return take_token(user_key(school_code, username), *settings['user'])
+
+
+def login_failed(remote_addr):
+    """Charge a failed login attempt to the bucket of the client IP."""
+    take_token(ip_key(remote_addr), *_settings()['ip'])
+
+
+def throttle_stats(key_prefix=None, limit=50):
+    """Rejection counters: the total and the most throttled buckets."""
+    query = db.session.query(LoginBucket)
+    total = db.session.query(func.coalesce(func.sum(LoginBucket.rejected), 0))
+    if key_prefix:
+        query = query.filter(LoginBucket.key.startswith(key_prefix, autoescape=True))
+        total = total.filter(LoginBucket.key.startswith(key_prefix, autoescape=True))
+    buckets = query.filter(LoginBucket.rejected > 0) \
+        .order_by(LoginBucket.rejected.desc(), LoginBucket.key).limit(limit).all()
+    return {
+        'rejected_total': total.scalar(),
+        'buckets': [{'key': b.key, 'rejected': b.rejected, 'tokens': round(b.tokens, 2)} for b in buckets],
+    }
+
+
+def prune_buckets(max_idle_seconds=86400, now=None):
+    """Delete buckets untouched for `max_idle_seconds` (they would be full again anyway)."""
+    now = time.time() if now is None else now
+    table = LoginBucket.__table__
+    with db.engine.begin() as conn:
+        return conn.execute(table.delete().where(table.c.updated_at < now - max_idle_seconds)).rowcount
@@ -0,0 +1,108 @@
+"""Lean, ORM-free reads for the large list pages.
+
+students_list and view_attendance only print a handful of fields per row, so they
+select just those columns with Core and wrap them in named tuples instead of loading
+full ORM instances (no identity map, no attribute instrumentation, no per-object
+state). The tuples have the same attribute names the templates already use, e.g.
+``student.class_assigned.name`` and ``record.student.first_name``.
+
+Rows of one class share a single ClassRef, and attendance rows of one student share
+a single StudentRef. attendance_rows() includes the whole-day marks of compacted
+terms (bitmap.compacted_marks()).
+"""
+from collections import namedtuple
+
+from sqlalchemy import literal, select
+
+from .models import db, Attendance, Class, Student
+from .bitmap import compacted_marks
+from .tenancy import school_filter
+
+ClassRef = namedtuple('ClassRef', ['id', 'name'])
+StudentRef = namedtuple('StudentRef', ['id', 'first_name', 'last_name'])
+StudentRow = namedtuple('StudentRow', ['id', 'first_name', 'last_name', 'class_assigned'])
+AttendanceRow = namedtuple('AttendanceRow', ['student', 'class_attended', 'date', 'period', 'is_present'])
+
+
+def student_rows(school_id=None):
+    """Students of a school with their class, ordered by name."""
+    students = Student.__table__
+    classes = Class.__table__
+    query = select(students.c.id, students.c.first_name, students.c.last_name, classes.c.id, classes.c.name) \
+        .select_from(students.outerjoin(classes, classes.c.id == students.c.class_id)) \
+        .where(school_filter(students.c, school_id)) \
+        .order_by(students.c.last_name, students.c.first_name)
+
+    class_refs = {None: None}
+    rows = []
+    for student_id, first_name, last_name, class_id, class_name in db.session.execute(query):
+        class_ref = class_refs.get(class_id)
+        if class_ref is None and class_id is not None:
+            class_ref = class_refs[class_id] = ClassRef(class_id, class_name)
+        rows.append(StudentRow(student_id, first_name, last_name, class_ref))
+    return rows
+
+
+def attendance_rows(filter_date=None, class_id=None, school_id=None, source=None):
+    """Attendance records of a school, newest first, then by class and student name.
+
+    `source` is the table to read, the hot attendance table by default or an archive
+    table with the same columns.
+    """
+    marks = Attendance.__table__ if source is None else source
+    students = Student.__table__
+    classes = Class.__table__
+    # Archives of years before lesson periods only hold whole-day marks
+    period = marks.c.period if 'period' in marks.c else literal(0)
+    query = select(marks.c.date, period, marks.c.is_present, students.c.id, students.c.first_name, students.c.last_name,
+                   classes.c.id, classes.c.name) \
+        .select_from(marks.join(students, students.c.id == marks.c.student_id)
+                     .join(classes, classes.c.id == marks.c.class_id)) \
+        .where(school_filter(classes.c, school_id))
+    if filter_date is not None:
+        query = query.where(marks.c.date == filter_date)
+    if class_id is not None:
+        query = query.where(marks.c.class_id == class_id)
+    query = query.order_by(marks.c.date.desc(), classes.c.name, students.c.last_name, students.c.first_name, period)
+
+    class_refs = {}
+    student_refs = {}
+    rows = []
+    for day, row_period, is_present, student_id, first_name, last_name, row_class_id, class_name in db.session.execute(query):
+        student_ref = student_refs.get(student_id)
+        if student_ref is None:
+            student_ref = student_refs[student_id] = StudentRef(student_id, first_name, last_name)
+        class_ref = class_refs.get(row_class_id)
+        if class_ref is None:
+            class_ref = class_refs[row_class_id] = ClassRef(row_class_id, class_name)
+        rows.append(AttendanceRow(student_ref, class_ref, day, row_period, is_present))
+    if source is None:
+        rows = _with_compacted(rows, filter_date, class_id, school_id, class_refs, student_refs)
+    return rows
+
+
+def _with_compacted(rows, filter_date, class_id, school_id, class_refs, student_refs):
+    # Bitmap days the attendance table no longer holds, as whole-day rows in the same order
+    hot_days = {(row.student.id, row.class_attended.id, row.date) for row in rows}
+    compacted = [mark for mark in compacted_marks(filter_date, filter_date, class_id=class_id, school_id=school_id)
+                 if (mark.student_id, mark.class_id, mark.date) not in hot_days]
+    if not compacted:
+        return rows
+
+    missing_students = {mark.student_id for mark in compacted} - set(student_refs)
+    if missing_students:
+        students = Student.__table__
+        for ref in db.session.execute(select(students.c.id, students.c.first_name, students.c.last_name)
+                                      .where(students.c.id.in_(missing_students))):
+            student_refs[ref[0]] = StudentRef(*ref)
+    missing_classes = {mark.class_id for mark in compacted} - set(class_refs)
+    if missing_classes:
+        classes = Class.__table__
+        for ref in db.session.execute(select(classes.c.id, classes.c.name).where(classes.c.id.in_(missing_classes))):
+            class_refs[ref[0]] = ClassRef(*ref)
+
+    rows += [AttendanceRow(student_refs[mark.student_id], class_refs[mark.class_id], mark.date, 0, mark.is_present)
+             for mark in compacted if mark.student_id in student_refs]
+    rows.sort(key=lambda row: (-row.date.toordinal(), row.class_attended.name, row.student.last_name,
+                               row.student.first_name, row.period))
+    return rows
@@ -0,0 +1,113 @@
+"""End-of-term attendance reports for every class, rendered in parallel into a zip.
+
+``python run.py reports --start ... --end ...`` renders one printable HTML file per
+class: per-student totals and the students x days grid. It also writes an
+index.html that links them. Browsers print the files to PDF and their print
+styles put the grid on its own page.
+
+Classes are independent, so they fan out over a process pool of REPORT_WORKERS
+processes (default: one per CPU). Each worker builds its own app and database
+engine once. It then renders whole classes, each from the single ranged GROUP BY
+query of attendance.load_matrix(). Only the rendered HTML travels back to the
+parent, which writes each file into the zip as soon as it arrives and reports
+progress. With one worker everything runs in the calling process.
+"""
+import os
+import time
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from flask import render_template
+from werkzeug.utils import secure_filename
+
+from .models import db, Class
+from .tenancy import school_filter
+from . import attendance
+
+ClassReport = namedtuple('ClassReport', ['class_id', 'class_name', 'teacher_name', 'filename', 'html',
+                                         'students', 'absences', 'rate'])
+StudentSummary = namedtuple('StudentSummary', ['present', 'absent', 'unmarked', 'rate'])
+ReportResult = namedtuple('ReportResult', ['path', 'classes', 'seconds'])
+
+
+def _rate(present, absent):
+    return present / (present + absent) if present + absent else None
+
+
+def render_class_report(class_id, start, end):
+    """A ClassReport of one class; needs an app context."""
+    class_obj = db.session.get(Class, class_id)
+    matrix = attendance.load_matrix(class_id, start, end)
+    rows = []
+    for row in matrix.rows:
+        present = row.statuses.count(True)
+        rows.append((row, StudentSummary(present, row.absences, row.statuses.count(None), _rate(present, row.absences))))
+    html = render_template('reports/class_report.html', class_obj=class_obj, matrix=matrix, rows=rows,
+                           start=start, end=end, generated_at=datetime.utcnow())
+    present = sum(summary.present for _, summary in rows)
+    absences = sum(summary.absent for _, summary in rows)
+    filename = f'{secure_filename(class_obj.name) or "class"}-{class_id}.html'
+    return ClassReport(class_id, class_obj.name, class_obj.teacher_name, filename, html,
+                       len(rows), absences, _rate(present, absences))
+
+
+_worker_app = None
+
+
+def _init_worker(config):
+    # Runs once per pool process: its own app, and with it its own engine and connections
+    global _worker_app
+    from . import create_app
+    _worker_app = create_app(type('ReportWorkerConfig', (), config))
+
+
+def _render_in_worker(class_id, start, end):
+    with _worker_app.app_context():
+        try:
+            return render_class_report(class_id, start, end)
+        finally:
+            db.session.remove()
+
+
+def generate_reports(app, start, end, output, school_id=None, workers=None, progress=None):
+    """Render the reports of a school's classes into the zip file `output`; returns a ReportResult.
+
+    `progress(done, total, report)` is called as each class finishes. Call inside
+    an app context of `app`.
+    """
+    started = time.monotonic()
+    class_ids = [row[0] for row in db.session.query(Class.id).filter(school_filter(Class, school_id))
+                 .order_by(Class.name, Class.id)]
+    workers = workers or app.config.get('REPORT_WORKERS') or os.cpu_count() or 1
+    workers = min(workers, len(class_ids)) or 1
+
+    partial = f'{output}.partial'
+    reports = []
+    try:
+        with zipfile.ZipFile(partial, 'w', zipfile.ZIP_DEFLATED) as archive:
+            def collect(report):
+                archive.writestr(report.filename, report.html)
+                reports.append(report._replace(html=None))
+                if progress:
+                    progress(len(reports), len(class_ids), report)
+
+            if workers == 1:
+                for class_id in class_ids:
+                    collect(render_class_report(class_id, start, end))
+            else:
+                config = {key: value for key, value in app.config.items() if key.isupper()}
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+                    futures = [pool.submit(_render_in_worker, class_id, start, end) for class_id in class_ids]
+                    for future in as_completed(futures):
+                        collect(future.result())
+
+            reports.sort(key=lambda report: (report.class_name, report.class_id))
+            archive.writestr('index.html', render_template('reports/index.html', reports=reports, start=start, end=end,
+                                                           generated_at=datetime.utcnow()))
+    except BaseException:
+        os.remove(partial) # A class failed: no half-filled zip
+        raise
+    os.replace(partial, output)
+    return ReportResult(output, len(reports), round(time.monotonic() - started, 3))
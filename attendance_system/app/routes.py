@@ -12,6 +12,31 @@ from .forms import RegistrationForm, LoginForm
 # For db operations, we use the 'db' object imported.
 # For app context (like config), we can use current_app.
 
+# Write functions for run_write(): they run in the writer's session (see app/coalescer.py),
+# so they only take ids and plain values and never commit themselves
+def _add_row(model, **values):
+    db.session.add(model(**values))
+
+def _update_row(model, object_id, **values):
+    obj = db.session.get(model, object_id)
+    for name, value in values.items():
+        setattr(obj, name, value)
+
+def _delete_row(model, object_id):
+    db.session.delete(db.session.get(model, object_id))
+
+def _delete_class(class_id):
+    # Classes that promoted into this one become final years
+    Class.query.filter(Class.next_class_id == class_id).update(
+        {Class.next_class_id: None, Class.updated_seq: next_change_seq(db.session.connection())})
+    _delete_row(Class, class_id)
+
+def _delete_student(student_id, changed_by):
+    # The marks go with the student, the audit log keeps them and records the deletion
+    student = db.session.get(Student, student_id)
+    audit.record_student_deletion(student, changed_by)
+    db.session.delete(student)
+
 @login_required
 def home():
     return render_template('home.html', title='Home')
@@ -250,12 +275,14 @@ def logout():
 # This was missed in the re-write.
 
 # Final proposed content for routes.py:
-from flask import render_template, url_for, flash, redirect, request, abort, session
+from flask import render_template, url_for, flash, redirect, request, abort, session, jsonify, current_app, Response
 from flask_login import current_user, login_user, logout_user, login_required
-from .models import User, Class, Student, Attendance, db
-from .forms import RegistrationForm, LoginForm, ClassForm, StudentForm, AttendanceSelectionForm, AttendanceViewSelectionForm
-from sqlalchemy.orm import joinedload
-from datetime import datetime, date
+from .models import User, Class, Student, Attendance, School, db, use_read_replica, next_change_seq
+from .forms import RegistrationForm, LoginForm, ClassForm, StudentForm, AttendanceSelectionForm, AttendanceViewSelectionForm, AttendanceRangeForm, MissingMarksForm
+from . import alerts, archive, attendance, audit, changes, fragments, ingest, profiling, ratelimit, reads, scans, school_calendar
+from .tenancy import scoped, get_scoped_or_404, current_school_id, resolve_school
+from .coalescer import run_write
+from datetime import datetime, date, timedelta
 
 @login_required
 def home():
@@ -266,10 +293,10 @@ def register():
         return redirect(url_for('home'))
     form = RegistrationForm()
     if form.validate_on_submit():
-        user = User(username=form.username.data)
-        user.set_password(form.password.data)
-        db.session.add(user)
-        db.session.commit()
+        _, school = resolve_school(form.school.data)
+        user = User(username=form.username.data, school_id=school.id if school else None)
+        user.set_password(form.password.data) # Hashed here, not on the writer thread
+        run_write(_add_row, User, username=user.username, school_id=user.school_id, password_hash=user.password_hash)
         flash('Your account has been created! You are now able to log in.', 'success')
         return redirect(url_for('login'))
     return render_template('register.html', title='Register', form=form)
@@ -279,7 +306,13 @@ def login():
         return redirect(url_for('home'))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
+        # Throttled attempts are turned away before any lookup or password hashing
+        if not ratelimit.allow_login(request.remote_addr, form.school.data, form.username.data):
+            flash('Too many login attempts. Please wait a minute and try again.', 'danger')
+            return render_template('login.html', title='Login', form=form), 429
+        # The school code picks the tenant, usernames are only unique within it
+        found, school = resolve_school(form.school.data)
+        user = scoped(User, school.id if school else None).filter_by(username=form.username.data).first() if found else None
         if user and user.check_password(form.password.data):
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
@@ -289,6 +322,7 @@ def login():
             flash('Login Successful!', 'success')
             return redirect(next_page) if next_page else redirect(url_for('home'))
         else:
+            ratelimit.login_failed(request.remote_addr)
             flash('Login Unsuccessful. Please check username and password.', 'danger')
     return render_template('login.html', title='Login', form=form)
 
@@ -300,24 +334,24 @@ def logout():
 
 # Class Management Routes
 @login_required
+@use_read_replica
 def classes_list():
-    classes = Class.query.order_by(Class.name).all()
+    classes = scoped(Class).order_by(Class.name).all()
     return render_template('classes.html', title='Manage Classes', classes=classes)
 
 @login_required
 def add_class():
     form = ClassForm()
     if form.validate_on_submit():
-        new_class = Class(name=form.name.data, teacher_name=form.teacher_name.data)
-        db.session.add(new_class)
-        db.session.commit()
-        flash(f'Class "{new_class.name}" has been added successfully!', 'success')
+        run_write(_add_row, Class, name=form.name.data, teacher_name=form.teacher_name.data, school_id=current_school_id(),
+                  next_class_id=form.next_class.data.id if form.next_class.data else None)
+        flash(f'Class "{form.name.data}" has been added successfully!', 'success')
         return redirect(url_for('classes_list'))
     return render_template('add_edit_class.html', title='Add New Class', form=form)
 
 @login_required
 def edit_class(class_id):
-    class_to_edit = Class.query.get_or_404(class_id)
+    class_to_edit = get_scoped_or_404(Class, class_id)
     form = ClassForm(obj=class_to_edit) # Pass existing object to pre-fill form
 
     # Custom logic for validate_name during edit
@@ -325,40 +359,44 @@ def edit_class(class_id):
     if form.validate_on_submit():
         # Check if name changed and if new name conflicts
         if form.name.data != original_name:
-            existing_class = Class.query.filter(Class.name == form.name.data).first()
+            existing_class = scoped(Class).filter(Class.name == form.name.data).first()
             if existing_class:
                 form.name.errors.append('A class with this name already exists.') # Manual error
                 return render_template('add_edit_class.html', title='Edit Class', form=form, class_id=class_id)
+        if form.next_class.data is not None and form.next_class.data.id == class_id:
+            form.next_class.errors.append('A class cannot promote to itself.')
+            return render_template('add_edit_class.html', title='Edit Class', form=form, class_id=class_id)
 
-        class_to_edit.name = form.name.data
-        class_to_edit.teacher_name = form.teacher_name.data
-        db.session.commit()
-        flash(f'Class "{class_to_edit.name}" has been updated successfully!', 'success')
+        run_write(_update_row, Class, class_id, name=form.name.data, teacher_name=form.teacher_name.data,
+                  next_class_id=form.next_class.data.id if form.next_class.data else None)
+        flash(f'Class "{form.name.data}" has been updated successfully!', 'success')
         return redirect(url_for('classes_list'))
 
     # For GET request, populate form with existing data
     form.name.data = class_to_edit.name
     form.teacher_name.data = class_to_edit.teacher_name
+    form.next_class.data = class_to_edit.next_class
     return render_template('add_edit_class.html', title='Edit Class', form=form, class_id=class_id)
 
 @login_required
 def delete_class(class_id):
-    class_to_delete = Class.query.get_or_404(class_id)
+    class_to_delete = get_scoped_or_404(Class, class_id)
     # Optional: Check for students in the class before deleting
     if class_to_delete.students:
         flash(f'Class "{class_to_delete.name}" cannot be deleted because it has students assigned to it. Please reassign students first.', 'danger')
         return redirect(url_for('classes_list'))
 
-    db.session.delete(class_to_delete)
-    db.session.commit()
-    flash(f'Class "{class_to_delete.name}" has been deleted successfully!', 'success')
+    class_name = class_to_delete.name
+    run_write(_delete_class, class_id)
+    flash(f'Class "{class_name}" has been deleted successfully!', 'success')
     return redirect(url_for('classes_list'))
 
 # Student Management Routes
 @login_required
+@use_read_replica
 def students_list():
-    # Eager load class information to prevent N+1 queries in template
-    students = Student.query.options(joinedload(Student.class_assigned)).order_by(Student.last_name, Student.first_name).all()
+    # Plain rows of just the printed columns, only loaded if the cached table is stale
+    students = fragments.Deferred(reads.student_rows, current_school_id())
     return render_template('students.html', title='Manage Students', students=students)
 
 @login_required
@@ -367,28 +405,30 @@ def add_student():
     # QuerySelectField in StudentForm (class_assigned) handles choices automatically
     if form.validate_on_submit():
         # The form.class_assigned.data will be a Class object or None
-        new_student = Student(
-            first_name=form.first_name.data,
-            last_name=form.last_name.data,
-            class_assigned=form.class_assigned.data # Directly assign the Class object
-        )
-        db.session.add(new_student)
-        db.session.commit()
-        flash(f'Student "{new_student.first_name} {new_student.last_name}" has been added successfully!', 'success')
+        run_write(_add_row, Student,
+                  first_name=form.first_name.data,
+                  last_name=form.last_name.data,
+                  class_id=form.class_assigned.data.id if form.class_assigned.data else None,
+                  card_uid=form.card_uid.data or None,
+                  guardian_email=form.guardian_email.data or None,
+                  school_id=current_school_id())
+        flash(f'Student "{form.first_name.data} {form.last_name.data}" has been added successfully!', 'success')
         return redirect(url_for('students_list'))
     return render_template('add_edit_student.html', title='Add New Student', form=form)
 
 @login_required
 def edit_student(student_id):
-    student_to_edit = Student.query.get_or_404(student_id)
+    student_to_edit = get_scoped_or_404(Student, student_id)
     form = StudentForm(obj=student_to_edit) # Pass existing student object to pre-fill form
 
     if form.validate_on_submit():
-        student_to_edit.first_name = form.first_name.data
-        student_to_edit.last_name = form.last_name.data
-        student_to_edit.class_assigned = form.class_assigned.data # Assign Class object or None
-        db.session.commit()
-        flash(f'Student "{student_to_edit.first_name} {student_to_edit.last_name}" has been updated successfully!', 'success')
+        run_write(_update_row, Student, student_id,
+                  first_name=form.first_name.data,
+                  last_name=form.last_name.data,
+                  class_id=form.class_assigned.data.id if form.class_assigned.data else None,
+                  card_uid=form.card_uid.data or None,
+                  guardian_email=form.guardian_email.data or None)
+        flash(f'Student "{form.first_name.data} {form.last_name.data}" has been updated successfully!', 'success')
         return redirect(url_for('students_list'))
 
     # For GET request, WTForms populates from obj, but ensure class_assigned is correctly set if needed
@@ -397,18 +437,29 @@ def edit_student(student_id):
 
 @login_required
 def delete_student(student_id):
-    student_to_delete = Student.query.get_or_404(student_id)
+    student_to_delete = get_scoped_or_404(Student, student_id)
 
     # Attendance records will be cascade deleted due to model definition
     # (cascade="all, delete-orphan" on Student.attendance_records)
 
     student_name = f"{student_to_delete.first_name} {student_to_delete.last_name}"
-    db.session.delete(student_to_delete)
-    db.session.commit()
+    run_write(_delete_student, student_id, current_user.id)
     flash(f'Student "{student_name}" and all associated attendance records have been deleted successfully!', 'success')
     return redirect(url_for('students_list'))
 
+@login_required
+@use_read_replica
+def student_history(student_id):
+    student = get_scoped_or_404(Student, student_id)
+    entries = audit.student_history(student_id, current_app.config.get('AUDIT_HISTORY_LIMIT', 200))
+    return render_template('student_history.html', title='Attendance History', student=student, entries=entries)
+
 # Attendance Routes
+def _set_session_value(key, value):
+    # Assigning marks the session modified, which costs a re-signed cookie or a session row write
+    if session.get(key) != value:
+        session[key] = value
+
 @login_required
 def take_attendance():
     selection_form = AttendanceSelectionForm()
@@ -418,6 +469,7 @@ def take_attendance():
     class_selection_form_submitted = False
     selected_class_obj = None
     selected_date_obj = None
+    selected_period = 0
 
     if request.method == 'POST':
         # Determine which form was submitted
@@ -426,80 +478,66 @@ def take_attendance():
             class_selection_form_submitted = True
             selected_class_obj = selection_form.class_id.data
             selected_date_obj = selection_form.date.data
+            selected_period = selection_form.period.data
 
             # Store in session for retrieval if the second form submission has validation errors
             # and needs to re-render with the student list.
-            session['attendance_class_id'] = selected_class_obj.id
-            session['attendance_date_str'] = selected_date_obj.strftime('%Y-%m-%d')
-
-            students_in_class = Student.query.filter_by(class_id=selected_class_obj.id).order_by(Student.last_name, Student.first_name).all()
-            if not students_in_class:
+            # Only assigned when they differ, so reloading the same roster leaves the session untouched
+            _set_session_value('attendance_class_id', selected_class_obj.id)
+            _set_session_value('attendance_date_str', selected_date_obj.strftime('%Y-%m-%d'))
+            _set_session_value('attendance_period', selected_period)
+
+            # One query for the students and one for their marks in that period
+            students_with_attendance = attendance.load_roster(selected_class_obj.id, selected_date_obj, selected_period)
+            if not students_with_attendance:
                 flash(f"No students found in class '{selected_class_obj.name}'. Please add students to this class.", "warning")
 
-            for student in students_in_class:
-                attendance_record = Attendance.query.filter_by(
-                    student_id=student.id,
-                    class_id=selected_class_obj.id,
-                    date=selected_date_obj
-                ).first()
-                students_with_attendance.append(
-                    (student, {'is_present': attendance_record.is_present if attendance_record else True})
-                )
-
         elif 'submit_attendance' in request.form:
             # Attendance Data Submitted
             class_selection_form_submitted = True # Keep showing student list section
             hidden_class_id = request.form.get('hidden_class_id', type=int)
             hidden_date_str = request.form.get('hidden_date')
+            selected_period = request.form.get('hidden_period', 0, type=int)
 
             if not hidden_class_id or not hidden_date_str:
                 flash("Error: Missing class or date information for attendance submission.", "danger")
                 return redirect(url_for('take_attendance'))
 
-            selected_class_obj = Class.query.get(hidden_class_id)
+            selected_class_obj = scoped(Class).filter(Class.id == hidden_class_id).first()
+            if selected_class_obj is None:
+                flash("Error: Unknown class for attendance submission.", "danger")
+                return redirect(url_for('take_attendance'))
             try:
                 selected_date_obj = datetime.strptime(hidden_date_str, '%Y-%m-%d').date()
             except ValueError:
                 flash("Error: Invalid date format for attendance submission.", "danger")
                 return redirect(url_for('take_attendance'))
+            if not 0 <= selected_period <= current_app.config.get('ATTENDANCE_PERIODS', 0):
+                flash("Error: Invalid period for attendance submission.", "danger")
+                return redirect(url_for('take_attendance'))
 
             processed_student_ids = request.form.getlist('student_ids')
             if not processed_student_ids: # Repopulate if something went wrong
-                 students_in_class = Student.query.filter_by(class_id=selected_class_obj.id).order_by(Student.last_name, Student.first_name).all()
-                 for student in students_in_class:
-                    # This logic might be complex if we need to show errors alongside student list
-                    # For now, assume this path is mostly for successful processing or major errors
-                    attendance_record = Attendance.query.filter_by(student_id=student.id, class_id=selected_class_obj.id, date=selected_date_obj).first()
-                    students_with_attendance.append((student, {'is_present': attendance_record.is_present if attendance_record else True}))
+                 students_with_attendance = attendance.load_roster(selected_class_obj.id, selected_date_obj, selected_period)
                  flash("No student attendance data received. Please try again.", "warning")
 
             else:
+                marks = {}
+                # Only students enrolled in this (tenant-checked) class on that day can be marked
+                roster_ids = {student.id for student in attendance.class_students(selected_class_obj.id, selected_date_obj)}
                 for student_id_str in processed_student_ids:
                     student_id = int(student_id_str)
-                    is_present = request.form.get(f'present_{student_id}') == 'true'
-
-                    attendance_record = Attendance.query.filter_by(
-                        student_id=student_id,
-                        class_id=selected_class_obj.id,
-                        date=selected_date_obj
-                    ).first()
-
-                    if attendance_record:
-                        attendance_record.is_present = is_present
-                    else:
-                        attendance_record = Attendance(
-                            student_id=student_id,
-                            class_id=selected_class_obj.id,
-                            date=selected_date_obj,
-                            is_present=is_present
-                        )
-                        db.session.add(attendance_record)
-
-                db.session.commit()
+                    if student_id in roster_ids:
+                        marks[student_id] = request.form.get(f'present_{student_id}') == 'true'
+
+                # Existing marks are loaded in one query; absence counters are updated in the same commit
+                run_write(attendance.stage_marks, selected_class_obj.id, selected_date_obj, marks, selected_period,
+                          current_user.id)
                 flash(f"Attendance for {selected_class_obj.name} on {selected_date_obj.strftime('%Y-%m-%d')} recorded successfully!", "success")
                 # Clear session keys after successful submission
                 session.pop('attendance_class_id', None)
                 session.pop('attendance_date_str', None)
+                session.pop('attendance_period', None)
                 return redirect(url_for('take_attendance')) # Redirect to clear form, or to a view page
 
         else: # E.g. validation error on selection_form on initial POST
@@ -509,12 +547,11 @@ def take_attendance():
             # we try to reconstruct the student list if possible.
             if session.get('attendance_class_id') and session.get('attendance_date_str'):
                 class_selection_form_submitted = True
-                selected_class_obj = Class.query.get(session.get('attendance_class_id'))
+                selected_class_obj = scoped(Class).filter(Class.id == session.get('attendance_class_id')).first()
                 selected_date_obj = datetime.strptime(session.get('attendance_date_str'), '%Y-%m-%d').date()
-                students_in_class = Student.query.filter_by(class_id=selected_class_obj.id).order_by(Student.last_name, Student.first_name).all()
-                for student in students_in_class:
-                    attendance_record = Attendance.query.filter_by(student_id=student.id, class_id=selected_class_obj.id, date=selected_date_obj).first()
-                    students_with_attendance.append((student, {'is_present': attendance_record.is_present if attendance_record else True}))
+                selected_period = session.get('attendance_period', 0)
+                if selected_class_obj:
+                    students_with_attendance = attendance.load_roster(selected_class_obj.id, selected_date_obj, selected_period)
 
 
     # GET request or after selection form POST
@@ -524,10 +561,12 @@ def take_attendance():
                            students_with_attendance=students_with_attendance,
                            selected_class=selected_class_obj,
                            selected_date=selected_date_obj,
+                           selected_period=selected_period,
                            class_selection_form_submitted=class_selection_form_submitted)
 
 # Attendance Viewing Route
 @login_required
+@use_read_replica
 def view_attendance():
     form = AttendanceViewSelectionForm()
     attendance_records = []
@@ -538,26 +577,24 @@ def view_attendance():
     form_processed_no_results = False
 
     if form.validate_on_submit(): # This implies a POST request with valid data
-        query = Attendance.query.options(
-            joinedload(Attendance.student),
-            joinedload(Attendance.class_attended) # Corrected from class_assigned to class_attended
-        )
-
         selected_class_obj = form.class_id.data # This is a Class object or None
         filter_date = form.date.data           # This is a date object or None
 
         if selected_class_obj:
-            query = query.filter(Attendance.class_id == selected_class_obj.id)
             selected_class_name = selected_class_obj.name
-
         if filter_date:
-            query = query.filter(Attendance.date == filter_date)
             selected_date_str = filter_date.strftime('%Y-%m-%d')
 
-        # Order by date, then class name, then student name
-        query = query.order_by(Attendance.date.desc(), Class.name, Student.last_name, Student.first_name)
-
-        attendance_records = query.all()
+        if filter_date and archive.is_archived_date(filter_date):
+            # Closed school years live in their own archive table, the hot table never carries them
+            attendance_records = archive.load_archived_records(
+                filter_date, class_id=selected_class_obj.id if selected_class_obj else None,
+                school_id=current_school_id())
+        else:
+            # Ordered by date, then class name, then student name
+            attendance_records = reads.attendance_rows(
+                filter_date, class_id=selected_class_obj.id if selected_class_obj else None,
+                school_id=current_school_id())
 
         if not attendance_records:
             form_processed_no_results = True # Form was processed, but query returned nothing
@@ -571,3 +608,141 @@ def view_attendance():
                            selected_date_str=selected_date_str,     # Pass filter criteria for display
                            records_found=(not form_processed_no_results if request.method == 'POST' else True) # A bit complex, simplify in template
                            )
+
+# Attendance calendar (students x school days) for one class over a date range
+@login_required
+@use_read_replica
+def attendance_matrix():
+    form = AttendanceRangeForm()
+    matrix = None
+    selected_class_obj = None
+
+    if form.validate_on_submit():
+        selected_class_obj = form.class_id.data
+        matrix = attendance.load_matrix(selected_class_obj.id, form.start_date.data, form.end_date.data)
+        if not matrix.rows:
+            flash(f"No students found in class '{selected_class_obj.name}'.", 'info')
+
+    return render_template('attendance_matrix.html',
+                           title='Attendance Calendar',
+                           form=form,
+                           matrix=matrix,
+                           selected_class=selected_class_obj)
+
+# Early-warning Routes
+@login_required
+@use_read_replica
+def absence_alerts():
+    return render_template('alerts.html', title='Absence Alerts', alerts=alerts.active_alerts(current_school_id()))
+
+@login_required
+@use_read_replica
+def absence_alerts_json():
+    # Driven only by the absence_counter side table, never by a scan of attendance
+    return jsonify(alerts=alerts.alert_feed(current_school_id()))
+
+# Classes nobody took attendance for on a school day, see app/school_calendar.py
+@login_required
+@use_read_replica
+def missing_marks():
+    form = MissingMarksForm()
+    if request.method == 'GET':
+        form.end_date.data = date.today() - timedelta(days=1)
+        form.start_date.data = form.end_date.data - timedelta(days=current_app.config.get('MISSING_MARKS_DAYS', 7) - 1)
+    report = school_days = None
+    if request.method == 'GET' or form.validate_on_submit():
+        start, end = form.start_date.data, form.end_date.data
+        report = school_calendar.missing_marks(start, end, current_school_id())
+        school_days = school_calendar.school_days(start, end, current_school_id())
+    return render_template('missing_marks.html', title='Missing Attendance', form=form, report=report,
+                           school_days=school_days)
+
+# Incremental sync for external systems, see app/changes.py
+@login_required
+@use_read_replica
+def changes_feed():
+    try:
+        cursor = changes.parse_cursor(request.args.get('since'))
+    except ValueError:
+        return jsonify(error='Unknown cursor, expected the "next" value of an earlier page.'), 400
+    page_size = current_app.config.get('CHANGE_FEED_PAGE_SIZE', 500)
+    limit = max(1, min(request.args.get('limit', page_size, type=int), page_size))
+    items, next_cursor, has_more = changes.changes_since(cursor, current_school_id(), limit)
+    return jsonify(changes=items, next=next_cursor, has_more=has_more)
+
+# Door scanner events (JSON), see app/scans.py
+@login_required
+def ingest_scans_api():
+    events = (request.get_json(silent=True) or {}).get('scans')
+    if not isinstance(events, list):
+        return jsonify(error='Expected {"scans": [{"card": str, "ts": "YYYY-MM-DDTHH:MM:SS", "device": str}]}.'), 400
+    if len(events) > current_app.config.get('SCAN_MAX_BATCH', 5000):
+        return jsonify(error='Too many scans in one batch.'), 413
+    return jsonify(scans.ingest_scans(events, current_school_id(), current_user.id)._asdict())
+
+# Login throttling counters, for admins
+@login_required
+def login_throttle_stats():
+    if not current_user.is_admin:
+        abort(403)
+    # Admins of the default tenant run the deployment and see every bucket, school
+    # admins only the username buckets of their school
+    key_prefix = None
+    if current_user.school_id is not None:
+        key_prefix = ratelimit.user_key(db.session.get(School, current_user.school_id).slug, '')
+    return jsonify(ratelimit.throttle_stats(key_prefix))
+
+# Request profiles (PROFILING, see app/profiling.py); they cover every school, so only
+# admins of the default tenant, who run the deployment, can see them
+def _require_deployment_admin():
+    if not current_user.is_admin or current_user.school_id is not None:
+        abort(403)
+
+@login_required
+def request_profiles():
+    _require_deployment_admin()
+    profiler = profiling.get_profiler(current_app._get_current_object())
+    return render_template('profiles.html', title='Request Profiles', enabled=profiler is not None,
+                           profiles=profiler.recent() if profiler else [])
+
+@login_required
+def download_profile(profile_id):
+    _require_deployment_admin()
+    profiler = profiling.get_profiler(current_app._get_current_object())
+    profile = profiler.get(profile_id) if profiler else None
+    if profile is None:
+        abort(404)
+    return Response(profile.folded(), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.folded'})
+
+# Asynchronous attendance submission (JSON); applied in batches by app/ingest.py
+@login_required
+def submit_attendance_api():
+    payload = request.get_json(silent=True) or {}
+    try:
+        class_id = int(payload['class_id'])
+        day = datetime.strptime(payload['date'], '%Y-%m-%d').date()
+        submitted = {int(student_id): bool(present) for student_id, present in payload['marks'].items()}
+        period = int(payload.get('period', 0))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify(error='Expected {"class_id": int, "date": "YYYY-MM-DD", "period": int (optional), '
+                             '"marks": {student_id: bool}}.'), 400
+    if not 0 <= period <= current_app.config.get('ATTENDANCE_PERIODS', 0):
+        return jsonify(error='Unknown period.'), 400
+
+    if scoped(Class).filter(Class.id == class_id).first() is None:
+        return jsonify(error='Unknown class.'), 404
+    # Only students enrolled in this (tenant-checked) class on that day can be marked
+    roster_ids = {student.id for student in attendance.class_students(class_id, day)}
+    marks = {student_id: present for student_id, present in submitted.items() if student_id in roster_ids}
+
+    service = ingest.get_ingest(current_app._get_current_object())
+    ticket = service.submit(class_id, day, marks, current_school_id(), period, current_user.id)
+    return jsonify(**ticket.as_dict(), ignored=len(submitted) - len(marks)), 202
+
+@login_required
+def attendance_ticket_api(ticket_id):
+    ticket = ingest.get_ingest(current_app._get_current_object()).ticket(ticket_id)
+    if ticket is None or ticket.school_id != current_school_id():
+        return jsonify(error='Unknown ticket.'), 404
+    return jsonify(ticket.as_dict())
@@ -0,0 +1,137 @@
+"""Automatic attendance from door card / QR scanners.
+
+``POST /api/scans`` takes batches of scan events ``{"card": ..., "ts": ISO time,
+"device": ...}``. Every scan is resolved to (student, class) through an in-memory
+map of the school's cards and their students' enrollments, so a batch costs no
+per-scan queries and a scan counts for the class the student was in on its day,
+even when it arrives after a transfer. Repeated scans of a
+student on the same day collapse into one mark, and all marks of a batch are staged
+per (class, day) with attendance.stage_marks() in a single write. Existing marks for
+that day only change if they said absent.
+
+The card map is reloaded every SCAN_DIRECTORY_TTL seconds, and at most every
+SCAN_DIRECTORY_MISS_RELOAD seconds when a batch has cards it does not know, so
+newly issued cards and class moves are picked up without a query per scan.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from .models import db, Enrollment, Student
+from .tenancy import school_filter
+from .coalescer import run_write
+from . import attendance
+
+ScanResult = namedtuple('ScanResult', ['accepted', 'duplicates', 'unknown_cards', 'unassigned', 'invalid',
+                                       'marks_changed'])
+
+
+class CardDirectory:
+    """{card_uid: (student_id, enrollments)} per school, cached in the worker.
+
+    `enrollments` are the student's (valid_from, valid_to, class_id) intervals.
+    """
+
+    def __init__(self):
+        self._maps = {} # school key -> (loaded_at, {card_uid: (student_id, enrollments)})
+        self._last_miss_reload = {}
+        self._lock = threading.Lock()
+
+    def _load(self, school_id):
+        rows = db.session.execute(
+            select(Student.card_uid, Student.id, Enrollment.valid_from, Enrollment.valid_to, Enrollment.class_id)
+            .select_from(Student).outerjoin(Enrollment, Enrollment.student_id == Student.id)
+            .where(school_filter(Student, school_id), Student.card_uid.isnot(None)))
+        cards = {}
+        for card_uid, student_id, valid_from, valid_to, class_id in rows:
+            enrollments = cards.setdefault(card_uid, (student_id, []))[1]
+            if class_id is not None:
+                enrollments.append((valid_from, valid_to, class_id))
+        return cards
+
+    def lookup(self, school_id, now=None):
+        now = time.monotonic() if now is None else now
+        key = school_id or 0
+        with self._lock:
+            entry = self._maps.get(key)
+        if entry is None or now - entry[0] > current_app.config.get('SCAN_DIRECTORY_TTL', 60):
+            entry = (now, self._load(school_id))
+            with self._lock:
+                self._maps[key] = entry
+        return entry[1]
+
+    def reload_on_miss(self, school_id, now=None):
+        """Reload after unknown cards, unless that already happened very recently. Returns the map."""
+        now = time.monotonic() if now is None else now
+        key = school_id or 0
+        with self._lock:
+            if now - self._last_miss_reload.get(key, float('-inf')) < current_app.config.get('SCAN_DIRECTORY_MISS_RELOAD', 5):
+                return self._maps[key][1]
+            self._last_miss_reload[key] = now
+        entry = (now, self._load(school_id))
+        with self._lock:
+            self._maps[key] = entry
+        return entry[1]
+
+
+directory = CardDirectory()
+
+
+def _scan_day(value):
+    return datetime.fromisoformat(value).date()
+
+
+def _class_on(enrollments, day):
+    for valid_from, valid_to, class_id in enrollments:
+        if valid_from <= day and (valid_to is None or day < valid_to):
+            return class_id
+    return None
+
+
+def _stage_scan_marks(groups, changed_by=None):
+    changed = 0
+    for (class_id, day), marks in groups.items():
+        changed += len(attendance.stage_marks(class_id, day, marks, attendance.WHOLE_DAY, changed_by, 'scan'))
+    return changed
+
+
+def ingest_scans(events, school_id=None, changed_by=None):
+    """Turn scan events into present marks of a school; returns a ScanResult.
+
+    `changed_by` is the id of the user (device account) posting the scans, for the audit log.
+    """
+    cards = directory.lookup(school_id)
+    if any(isinstance(e, dict) and e.get('card') not in cards for e in events):
+        cards = directory.reload_on_miss(school_id)
+
+    groups = {} # (class_id, day) -> {student_id: True}
+    seen = set()
+    duplicates = invalid = unassigned = 0
+    unknown = set()
+    for event in events:
+        try:
+            card, day = str(event['card']), _scan_day(event['ts'])
+        except (KeyError, TypeError, ValueError):
+            invalid += 1
+            continue
+        match = cards.get(card)
+        if match is None:
+            unknown.add(card)
+            continue
+        student_id, enrollments = match
+        class_id = _class_on(enrollments, day)
+        if class_id is None: # In no class on that day
+            unassigned += 1
+            continue
+        if (student_id, day) in seen:
+            duplicates += 1
+            continue
+        seen.add((student_id, day))
+        groups.setdefault((class_id, day), {})[student_id] = True
+
+    changed = run_write(_stage_scan_marks, groups, changed_by) if groups else 0
+    return ScanResult(len(seen), duplicates, sorted(unknown), unassigned, invalid, changed)
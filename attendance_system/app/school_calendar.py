@@ -0,0 +1,85 @@
+"""School calendar and the missing-marks report.
+
+``calendar_day`` holds the days each school has decided on: school days, and
+holidays that override them. ``python run.py calendar`` adds the weekdays of a
+range as school days, ``python run.py holiday`` takes days off again.
+
+``missing_marks()`` lists every (class, school day) pair without a single mark in
+one anti-join: the calendar days of the range, joined to the school's classes,
+minus the pairs that have a mark in any period (an EXISTS probe on the attendance
+(class_id, date, period) index each). Classes with nobody enrolled that day (enrollment interval
+index) are left out, and so are the days a term bitmap holds a mark for: they are
+decoded with bitmap.compacted_marks(), as a compacted term keeps the days nobody
+marked unmarked. Archived school years are not checked.
+"""
+from collections import namedtuple
+
+from sqlalchemy import exists, func, or_, select
+
+from .models import db, Attendance, CalendarDay, Class, Enrollment
+from .bitmap import ANY_SCHOOL, compacted_marks, term_days
+from .tenancy import school_filter
+
+MissingMark = namedtuple('MissingMark', ['school_id', 'class_id', 'class_name', 'teacher_name', 'date'])
+
+
+def _school_key(school_id):
+    return school_id or 0
+
+
+def add_school_days(start, end, school_id=None):
+    """Make the weekdays of a range school days, keeping days already in the calendar.
+
+    Returns the number of days added.
+    """
+    key = _school_key(school_id)
+    known = {day for day, in db.session.query(CalendarDay.date)
+             .filter(CalendarDay.school_key == key, CalendarDay.date.between(start, end))}
+    days = [day for day in term_days(start, end) if day not in known]
+    db.session.add_all(CalendarDay(school_key=key, date=day, is_school_day=True) for day in days)
+    db.session.commit()
+    return len(days)
+
+
+def add_holiday(start, end, label, school_id=None):
+    """Mark the weekdays of a range as no school days; returns the number of days."""
+    key = _school_key(school_id)
+    existing = {day.date: day for day in CalendarDay.query
+                .filter(CalendarDay.school_key == key, CalendarDay.date.between(start, end))}
+    days = term_days(start, end)
+    for day in days:
+        entry = existing.get(day) or CalendarDay(school_key=key, date=day)
+        entry.is_school_day, entry.label = False, label
+        db.session.add(entry)
+    db.session.commit()
+    return len(days)
+
+
+def school_days(start, end, school_id=None):
+    """School days of a school in a range, in order."""
+    return [day for day, in db.session.query(CalendarDay.date)
+            .filter(CalendarDay.school_key == _school_key(school_id), CalendarDay.is_school_day.is_(True),
+                    CalendarDay.date.between(start, end))
+            .order_by(CalendarDay.date)]
+
+
+def missing_marks(start, end, school_id=None, every_school=False):
+    """MissingMark rows of a school (or of every school) in a range, by date and class."""
+    calendar = CalendarDay.__table__.c
+    classes = Class.__table__.c
+    attendance = Attendance.__table__.c
+    enrollments = Enrollment.__table__.c
+
+    query = select(classes.school_id, classes.id, classes.name, classes.teacher_name, calendar.date) \
+        .select_from(Class.__table__.join(CalendarDay.__table__,
+                                          calendar.school_key == func.coalesce(classes.school_id, 0))) \
+        .where(calendar.is_school_day.is_(True), calendar.date.between(start, end),
+               ~exists().where(attendance.class_id == classes.id, attendance.date == calendar.date),
+               exists().where(enrollments.class_id == classes.id, enrollments.valid_from <= calendar.date,
+                              or_(enrollments.valid_to.is_(None), enrollments.valid_to > calendar.date))) \
+        .order_by(calendar.date, classes.name)
+    if not every_school:
+        query = query.where(school_filter(classes, school_id))
+    compacted = {(mark.class_id, mark.date)
+                 for mark in compacted_marks(start, end, school_id=ANY_SCHOOL if every_school else school_id)}
+    return [MissingMark(*row) for row in db.session.execute(query) if (row.id, row.date) not in compacted]
@@ -0,0 +1,118 @@
+"""Server-side sessions stored in the database (``SESSION_BACKEND = 'database'``).
+
+The cookie only carries a random session id. The session data lives in the
+``server_session`` table, so cookies stay small whatever the views store.
+
+Nothing is written on requests that leave the session alone: no row update, no
+Set-Cookie header and no signing. The expiry is only pushed forward once less than
+half of PERMANENT_SESSION_LIFETIME is left. Expired rows are deleted with
+``python run.py prune_sessions``.
+
+Logging in and logging out rotate the id: the session continues under a new id
+and the old row is deleted, so an id planted or seen before the login (session
+fixation) or kept after the logout is worthless.
+"""
+import secrets
+from datetime import datetime
+
+from flask import session as flask_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from flask_login import user_logged_in, user_logged_out
+
+from .models import db, ServerSession
+
+
+class ServerSideSession(SecureCookieSession):
+    # SecureCookieSession already tracks `modified` and `accessed`
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.replaced_sid = None
+
+    def rotate(self):
+        """Keep the data under a new id; the old row is deleted when the session is saved."""
+        if self.sid is not None:
+            self.replaced_sid = self.sid
+        self.sid = None
+        self.expires_at = None
+        self.modified = True
+
+
+class DatabaseSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            table = ServerSession.__table__
+            with db.engine.connect() as conn:
+                row = conn.execute(table.select().where(table.c.sid == sid)).first()
+            if row is not None and row.expires_at > datetime.utcnow():
+                return ServerSideSession(self.serializer.loads(row.data), sid=sid, expires_at=row.expires_at)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.replaced_sid:
+            delete_session(session.replaced_sid)
+
+        if not session:
+            if session.modified and (session.sid or session.replaced_sid):
+                if session.sid:
+                    delete_session(session.sid)
+                response.delete_cookie(self.get_cookie_name(app), domain=self.get_cookie_domain(app),
+                                       path=self.get_cookie_path(app))
+            return
+
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        stale = session.sid is not None and session.expires_at - now < lifetime / 2
+        if not session.modified and not stale:
+            return # Read-only request
+
+        new_sid = session.sid is None
+        sid = session.sid or secrets.token_urlsafe(32)
+        values = {'data': self.serializer.dumps(dict(session)), 'expires_at': now + lifetime}
+        table = ServerSession.__table__
+        with db.engine.begin() as conn:
+            updated = 0 if new_sid else conn.execute(table.update().where(table.c.sid == sid).values(**values)).rowcount
+            if not updated:
+                conn.execute(table.insert().values(sid=sid, **values))
+
+        # The id never changes, the cookie only needs re-sending when it is new or carries an expiry
+        if new_sid or session.permanent:
+            response.set_cookie(self.get_cookie_name(app), sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=self.get_cookie_domain(app),
+                                path=self.get_cookie_path(app),
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+
+def delete_session(sid):
+    table = ServerSession.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.sid == sid))
+
+
+def prune_sessions(now=None):
+    """Delete expired sessions; returns how many were removed."""
+    table = ServerSession.__table__
+    with db.engine.begin() as conn:
+        return conn.execute(table.delete().where(table.c.expires_at <= (now or datetime.utcnow()))).rowcount
+
+
+def _rotate_session(app, **extra):
+    if isinstance(flask_session, ServerSideSession):
+        flask_session.rotate()
+
+
+def init_app(app):
+    if app.config.get('SESSION_BACKEND', 'cookie') == 'database':
+        app.session_interface = DatabaseSessionInterface()
+        user_logged_in.connect(_rotate_session, app)
+        user_logged_out.connect(_rotate_session, app)
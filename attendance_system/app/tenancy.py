@@ -0,0 +1,53 @@
+"""Tenant (school) scoping.
+
+Every row of User, Class, Student and Attendance carries a school_id. A request's
+tenant is the school of the logged-in user; views and forms must read through
+``scoped()`` so one school never sees another's data. A NULL school_id is the
+default tenant of a single-school deployment.
+"""
+from flask import abort
+from flask_login import current_user
+
+from .models import School
+
+
+def current_school_id():
+    """School id of the logged-in user (None for the default tenant or anonymous users)."""
+    if current_user and current_user.is_authenticated:
+        return current_user.school_id
+    return None
+
+
+def school_filter(model, school_id):
+    """Filter clause matching `model` rows of one tenant (NULL-safe)."""
+    if school_id is None:
+        return model.school_id.is_(None)
+    return model.school_id == school_id
+
+
+def scoped(model, school_id=None):
+    """`model.query` restricted to the current (or given) tenant."""
+    if school_id is None:
+        school_id = current_school_id()
+    return model.query.filter(school_filter(model, school_id))
+
+
+def get_scoped_or_404(model, object_id):
+    """Like `model.query.get_or_404()`, but 404s for rows of another tenant too."""
+    obj = scoped(model).filter(model.id == object_id).first()
+    if obj is None:
+        abort(404)
+    return obj
+
+
+def resolve_school(slug):
+    """School for a slug entered at login/registration.
+
+    Returns (found, school): a blank slug is the default tenant (True, None), an
+    unknown slug is (False, None).
+    """
+    slug = (slug or '').strip().lower()
+    if not slug:
+        return True, None
+    school = School.query.filter_by(slug=slug).first()
+    return school is not None, school
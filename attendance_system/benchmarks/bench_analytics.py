@@ -0,0 +1,47 @@
+"""Time the vectorized analytics on a synthetic district year.
+
+Usage (from the attendance_system directory):
+    python benchmarks/bench_analytics.py [--students 10000] [--days 190]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import analytics  # noqa: E402
+
+
+def synthetic_columns(students, days, absence_rate=0.06, seed=0):
+    rng = np.random.default_rng(seed)
+    school_days = np.busday_offset(np.datetime64('2023-09-04'), np.arange(days), roll='forward')
+    student_id = np.repeat(np.arange(1, students + 1, dtype=np.int64), days)
+    return analytics.AttendanceColumns(student_id,
+                                       student_id // 30,
+                                       np.tile(school_days, students),
+                                       rng.random(students * days) > absence_rate)
+
+
+def timed(label, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f'{label:<24} {time.perf_counter() - start:8.3f}s')
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=190)
+    args = parser.parse_args()
+
+    columns = synthetic_columns(args.students, args.days)
+    print(f'{len(columns.student_id):,} marks')
+    days = timed('daily', analytics.daily, columns)
+    timed('absence_rates', analytics.absence_rates, days)
+    timed('chronic_absentees', analytics.chronic_absentees, days, threshold=0.10)
+    timed('absence_streaks', analytics.absence_streaks, days)
+    timed('rolling_absence_rate', analytics.rolling_absence_rate, days, window=20)
+    timed('weekday_pattern', analytics.weekday_pattern, days)
@@ -0,0 +1,60 @@
+"""Concurrent small writes on a SQLite file, committed one by one vs. coalesced.
+
+Usage (from the attendance_system directory):
+    python benchmarks/bench_coalescer.py [--threads 16] [--writes 50] [--window-ms 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app, db  # noqa: E402
+from app.coalescer import run_write  # noqa: E402
+from app.models import Class  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def add_class(name):
+    db.session.add(Class(name=name))
+
+
+def hammer(app, threads, writes, tag):
+    def worker(thread_no):
+        with app.test_request_context():
+            for i in range(writes):
+                run_write(add_class, f'{tag}-{thread_no}-{i}')
+            db.session.remove()
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--writes', type=int, default=50)
+    parser.add_argument('--window-ms', type=float, default=5)
+    args = parser.parse_args()
+    total = args.threads * args.writes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for coalescing in (False, True):
+            config = type('BenchConfig', (Config,), {
+                'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, f'bench_{coalescing}.db')}",
+                'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}},
+                'TEMPLATE_CACHE_DIR': None, 'WRITE_COALESCING': coalescing,
+                'WRITE_COALESCE_WINDOW_MS': args.window_ms})
+            app = create_app(config)
+            with app.app_context():
+                db.create_all()
+            elapsed = hammer(app, args.threads, args.writes, 'c' if coalescing else 'd')
+            label = 'coalesced' if coalescing else 'commit per write'
+            print(f'{label:<18} {total:,} writes in {elapsed:6.2f}s  {total / elapsed:8.0f} writes/s')
@@ -0,0 +1,74 @@
+"""Compare ORM and lean (Core + named tuple) reads of the list pages.
+
+Usage (from the attendance_system directory):
+    python benchmarks/bench_reads.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app import create_app, db, reads  # noqa: E402
+from app.models import Attendance, Class, Student  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+
+def populate(rows, class_size=30):
+    classes = [Class(name=f'Class {i}') for i in range(rows // class_size + 1)]
+    db.session.add_all(classes)
+    db.session.flush()
+    students = [Student(first_name=f'First{i}', last_name=f'Last{i}', class_id=classes[i // class_size].id)
+                for i in range(rows)]
+    db.session.add_all(students)
+    db.session.flush()
+    day = date(2024, 1, 8)
+    db.session.add_all([Attendance(student_id=s.id, class_id=s.class_id, date=day, is_present=i % 9 != 0)
+                        for i, s in enumerate(students)])
+    db.session.commit()
+    return day
+
+
+def orm_students():
+    return Student.query.options(joinedload(Student.class_assigned)).order_by(Student.last_name, Student.first_name).all()
+
+
+def orm_attendance(day):
+    return Attendance.query.options(joinedload(Attendance.student), joinedload(Attendance.class_attended)) \
+        .filter(Attendance.date == day).join(Student).join(Class) \
+        .order_by(Attendance.date.desc(), Class.name, Student.last_name, Student.first_name).all()
+
+
+def measure(label, fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all() # Start every run with an empty identity map
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    db.session.expunge_all()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<22} {best * 1000:9.1f} ms {peak / 1024 / 1024:8.1f} MiB peak  ({len(result):,} rows)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        day = populate(args.rows)
+        measure('students ORM', orm_students, args.repeat)
+        measure('students lean', reads.student_rows, args.repeat)
+        measure('attendance ORM', lambda: orm_attendance(day), args.repeat)
+        measure('attendance lean', lambda: reads.attendance_rows(day), args.repeat)
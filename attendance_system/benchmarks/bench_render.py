@@ -0,0 +1,67 @@
+"""Time rendering of the large list tables, per 1k rows.
+
+Compares a full render (fragment cache cold) with a render served from the
+fragment cache. Usage (from the attendance_system directory):
+    python benchmarks/bench_render.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import render_template  # noqa: E402
+
+from app import create_app, db, reads  # noqa: E402
+from app.forms import AttendanceViewSelectionForm  # noqa: E402
+from app.fragments import FRAGMENT_CACHE_EXTENSION_KEY  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+
+def student_rows(count, class_size=30):
+    classes = [reads.ClassRef(i, f'Class {i}') for i in range(count // class_size + 1)]
+    return [reads.StudentRow(i, f'First{i}', f'Last{i}', classes[i // class_size]) for i in range(count)]
+
+
+def attendance_rows(count, day=date(2024, 1, 8)):
+    return [reads.AttendanceRow(reads.StudentRef(row.id, row.first_name, row.last_name), row.class_assigned,
+                                day, 0, row.id % 9 != 0)
+            for row in student_rows(count)]
+
+
+def measure(label, render, rows, repeat, cached):
+    best = float('inf')
+    for _ in range(repeat):
+        if not cached:
+            app.extensions[FRAGMENT_CACHE_EXTENSION_KEY].clear()
+        start = time.perf_counter()
+        render()
+        best = min(best, time.perf_counter() - start)
+    print(f'{label:<36} {best * 1000:9.1f} ms  {best * 1000 / (rows / 1000):7.2f} ms per 1k rows')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(TestingConfig)
+    with app.test_request_context():
+        db.create_all()
+        form = AttendanceViewSelectionForm()
+        students = student_rows(args.rows)
+        records = attendance_rows(args.rows)
+
+        def render_students():
+            return render_template('students.html', students=students)
+
+        def render_attendance():
+            return render_template('view_attendance.html', form=form, attendance_records=records,
+                                   selected_class_name=None, selected_date_str='2024-01-08')
+
+        for name, render in (('students.html', render_students), ('view_attendance.html', render_attendance)):
+            render() # Compile the template outside the timings
+            measure(f'{name} full', render, args.rows, args.repeat, cached=False)
+            measure(f'{name} cached fragment', render, args.rows, args.repeat, cached=True)
@@ -0,0 +1,72 @@
+"""Replay a morning of door scans against /api/scans and report throughput.
+
+Builds a SQLite file with a school's students and cards, generates scan events
+(every student scans at one or more doors, some several times) and posts them in
+batches through the real endpoint. Usage (from the attendance_system directory):
+    python benchmarks/bench_scans.py [--students 3000] [--repeat-rate 0.3] [--batch 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as day_time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app, db  # noqa: E402
+from app.models import Class, Student, User  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def populate(students, class_size=30):
+    classes = [Class(name=f'Class {i}') for i in range(students // class_size + 1)]
+    db.session.add_all(classes)
+    db.session.flush()
+    db.session.add_all([Student(first_name=f'F{i}', last_name=f'L{i}', class_id=classes[i // class_size].id,
+                                card_uid=f'CARD{i:06d}') for i in range(students)])
+    user = User(username='scanner')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+
+
+def scan_events(students, repeat_rate, doors=8, seed=0):
+    rng = random.Random(seed)
+    start = datetime.combine(date.today(), day_time(7, 45)) # Students are enrolled from today
+    events = []
+    for i in range(students):
+        for _ in range(1 + (rng.random() < repeat_rate)):
+            events.append({'card': f'CARD{i:06d}', 'device': f'door-{rng.randrange(doors)}',
+                           'ts': (start + timedelta(seconds=rng.randrange(900))).isoformat()})
+    events.sort(key=lambda e: e['ts'])
+    return events
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=3000)
+    parser.add_argument('--repeat-rate', type=float, default=0.3)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = type('BenchConfig', (Config,), {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'scans.db')}",
+            'TEMPLATE_CACHE_DIR': None, 'WTF_CSRF_ENABLED': False})
+        app = create_app(config)
+        with app.app_context():
+            db.create_all()
+            populate(args.students)
+        events = scan_events(args.students, args.repeat_rate)
+
+        client = app.test_client()
+        client.post('/login', data={'username': 'scanner', 'password': 'password'})
+        start = time.perf_counter()
+        changed = 0
+        for offset in range(0, len(events), args.batch):
+            response = client.post('/api/scans', json={'scans': events[offset:offset + args.batch]})
+            changed += response.get_json()['marks_changed']
+        elapsed = time.perf_counter() - start
+        print(f'{len(events):,} scans in {elapsed:.2f}s  {len(events) / elapsed:,.0f} scans/s  '
+              f'({changed:,} marks written, batches of {args.batch})')
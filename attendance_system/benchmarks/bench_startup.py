@@ -0,0 +1,56 @@
+"""Report the cold-start cost of the app: importing it and calling create_app().
+
+Runs fresh interpreters with `python -X importtime` and prints the wall time plus
+the packages that take longest to import. Usage (from the attendance_system directory):
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--code "..."]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_CODE = 'from app import create_app; create_app()'
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def run(code, importtime=False):
+    """Run `code` in a fresh interpreter; returns (seconds, stderr)."""
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', code]
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def self_time_by_package(stderr):
+    """Microseconds of import self time per top-level package."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            totals[match.group(4).split('.')[0]] += int(match.group(1))
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--code', default=STARTUP_CODE, help="Statement to time (default: %(default)s)")
+    args = parser.parse_args()
+
+    baseline = statistics.median(run('pass')[0] for _ in range(args.runs))
+    startup = statistics.median(run(args.code)[0] for _ in range(args.runs))
+    print(f'interpreter           {baseline * 1000:8.1f} ms')
+    print(f'startup (median)      {startup * 1000:8.1f} ms   {(startup - baseline) * 1000:8.1f} ms over a bare interpreter')
+
+    _, stderr = run(args.code, importtime=True)
+    totals = self_time_by_package(stderr)
+    print(f'\n{"package":<28} {"self ms":>8}')
+    for package, micros in sorted(totals.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{package:<28} {micros / 1000:8.1f}')
@@ -7,11 +7,108 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica for list pages and reports; writes always go to the primary
+    READ_REPLICA_URL = os.environ.get('READ_REPLICA_URL')
+    # After committing, a user keeps reading from the primary for this long
+    READ_REPLICA_STICKY_SECONDS = 10
     WTF_CSRF_ENABLED = True # Default, can be overridden by TestingConfig
+    # School years start on the 1st of this month; closed years can be moved out of
+    # the hot attendance table with `python run.py archive --year <year>`
+    SCHOOL_YEAR_START_MONTH = int(os.environ.get('SCHOOL_YEAR_START_MONTH', 9))
+    # Students missing more than this share of school days are chronic absentees
+    CHRONIC_ABSENCE_THRESHOLD = 0.10
+    # Early-warning alerts: N consecutive absences, or more than CHRONIC_ABSENCE_THRESHOLD
+    # of the last ABSENCE_ALERT_WINDOW marked days (once at least ABSENCE_ALERT_MIN_DAYS are known)
+    ABSENCE_ALERT_STREAK = 3
+    ABSENCE_ALERT_WINDOW = 20
+    ABSENCE_ALERT_MIN_DAYS = 5
+    # Lesson periods a day can be marked in besides the whole-day registration
+    ATTENDANCE_PERIODS = int(os.environ.get('ATTENDANCE_PERIODS', 8))
+    # Days looked back by the missing attendance page and `python run.py missing_marks`
+    MISSING_MARKS_DAYS = 7
+    # 'cookie' keeps the session in the signed cookie, 'database' stores it server-side
+    # and the cookie only carries its id (expired rows: `python run.py prune_sessions`)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cookie')
+    # Funnel view writes through one writer thread that commits everything arriving within
+    # WRITE_COALESCE_WINDOW_MS in one transaction (None: only for SQLite databases)
+    WRITE_COALESCING = None
+    WRITE_COALESCE_WINDOW_MS = 5
+    WRITE_COALESCE_MAX_BATCH = 100
+    # Seconds run_write() waits for the writer before raising TimeoutError
+    WRITE_COALESCE_TIMEOUT_S = 30
+    # /api/attendance: the writer commits up to INGEST_MAX_BATCH submissions per transaction,
+    # collected for at most INGEST_MAX_WAIT_MS after the first one
+    INGEST_MAX_BATCH = 200
+    INGEST_MAX_WAIT_MS = 50
+    # Submissions are committed to ingest_submission before the 202; writers also look for
+    # queued rows every INGEST_POLL_S and retake claims older than INGEST_CLAIM_TIMEOUT_S
+    INGEST_POLL_S = 1.0
+    INGEST_CLAIM_TIMEOUT_S = 300
+    # /api/scans: largest accepted batch, and how long the in-memory card map is trusted
+    # (unknown cards trigger a reload at most every SCAN_DIRECTORY_MISS_RELOAD seconds)
+    SCAN_MAX_BATCH = 5000
+    SCAN_DIRECTORY_TTL = 60
+    SCAN_DIRECTORY_MISS_RELOAD = 5
+    # /api/changes: largest page of the change feed
+    CHANGE_FEED_PAGE_SIZE = 500
+    # Login rate limiting: token buckets per client IP (charged for failed logins only)
+    # and per school/username (charged for every attempt)
+    LOGIN_IP_BUCKET_CAPACITY = 20
+    LOGIN_IP_REFILL_PER_MINUTE = 10
+    LOGIN_USER_BUCKET_CAPACITY = 5
+    LOGIN_USER_REFILL_PER_MINUTE = 2
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto are trusted; the
+    # client IP (request.remote_addr) is taken from them. 0: the app is reached directly
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+    # Parent absence notifications: saves add them to an outbox that `python run.py notify`
+    # sends in batches through NOTIFY_TRANSPORT ('file', 'smtp' or a class's dotted path)
+    NOTIFY_ABSENCES = True
+    NOTIFY_TRANSPORT = os.environ.get('NOTIFY_TRANSPORT', 'file')
+    NOTIFY_FILE_DIR = os.environ.get('NOTIFY_FILE_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'outbox')
+    NOTIFY_SENDER = os.environ.get('NOTIFY_SENDER', 'attendance@localhost')
+    NOTIFY_SMTP_HOST = os.environ.get('NOTIFY_SMTP_HOST', 'localhost')
+    NOTIFY_SMTP_PORT = int(os.environ.get('NOTIFY_SMTP_PORT', 25))
+    NOTIFY_SMTP_USERNAME = os.environ.get('NOTIFY_SMTP_USERNAME')
+    NOTIFY_SMTP_PASSWORD = os.environ.get('NOTIFY_SMTP_PASSWORD')
+    NOTIFY_SMTP_USE_TLS = os.environ.get('NOTIFY_SMTP_USE_TLS') == '1'
+    NOTIFY_BATCH_SIZE = 200
+    NOTIFY_INTERVAL = 5 # Seconds between polls of an empty outbox
+    NOTIFY_MAX_ATTEMPTS = 5
+    # Sampling profiler (app/profiling.py): off by default. When on, PROFILE_SAMPLE_RATE of
+    # requests, and admin requests sending PROFILE_HEADER, are sampled every PROFILE_INTERVAL_MS;
+    # each worker keeps the last PROFILE_BUFFER_SIZE profiles for /admin/profiles
+    PROFILING = os.environ.get('PROFILING') == '1'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01))
+    PROFILE_HEADER = 'X-Profile'
+    PROFILE_INTERVAL_MS = 5
+    PROFILE_BUFFER_SIZE = 50
+    # Attendance audit log: entries shown on a student's history page, and the age in days
+    # after which `python run.py compact_audit` folds a mark's entries into one
+    AUDIT_HISTORY_LIMIT = 200
+    AUDIT_COMPACT_AFTER_DAYS = 365
+    # `python run.py backup`: where backups go, and how the online copy paces itself
+    # (pages per step, pause between steps, restarts before copying the rest at once)
+    BACKUP_DIR = os.environ.get('BACKUP_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'backups')
+    BACKUP_PAGES_PER_STEP = 256
+    BACKUP_STEP_SLEEP_MS = 10
+    BACKUP_MAX_RESTARTS = 5
+    # `python run.py reports`: processes rendering class reports (None: one per CPU)
+    REPORT_WORKERS = int(os.environ['REPORT_WORKERS']) if os.environ.get('REPORT_WORKERS') else None
+    REPORT_DIR = os.environ.get('REPORT_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'reports')
+    # Compiled templates are cached here so new workers start warm (None disables)
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'jinja_cache')
+    # Rendered table fragments kept per worker (0 disables the fragment cache)
+    FRAGMENT_CACHE_SIZE = 256
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:' # Use in-memory SQLite database for tests
+    READ_REPLICA_URL = None
+    TEMPLATE_CACHE_DIR = None
     WTF_CSRF_ENABLED = False # Disable CSRF protection for simpler form testing in unit tests
     # LOGIN_DISABLED can be set here if needed, but Flask-Login's own testing utilities are often preferred
     # For example, by directly logging in a test user without going through the form.
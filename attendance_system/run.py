@@ -1,4 +1,5 @@
 import argparse
+from datetime import datetime
 from app import create_app, create_db, db # Corrected import
 
 # Create the app instance using the factory
@@ -6,7 +7,24 @@ app = create_app()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Manage the Flask application.")
-    parser.add_argument('action', nargs='?', help="Action to perform (e.g., 'create_db')")
+    parser.add_argument('action', nargs='?', help="Action to perform (e.g., 'create_db', 'create_school', 'archive', 'compact', 'rebuild_counters', 'migrate', 'compile_templates', 'prune_login_buckets', 'prune_sessions', 'promote', 'calendar', 'holiday', 'missing_marks', 'notify', 'compact_audit', 'backup', 'restore', 'reports', 'analytics')")
+    parser.add_argument('--year', type=int, help="School year to archive (the calendar year it starts in)")
+    parser.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="First day (YYYY-MM-DD)")
+    parser.add_argument('--end', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(), help="Last day (YYYY-MM-DD)")
+    parser.add_argument('--class-id', type=int, help="Limit the action to one class")
+    parser.add_argument('--name', help="Name of the school to create")
+    parser.add_argument('--slug', help="School code users enter at login")
+    parser.add_argument('--label', help="Name of the holiday")
+    parser.add_argument('--days', type=int, help="compact_audit: fold entries older than this many days")
+    parser.add_argument('--output', help="backup/reports: file to write (default: a timestamped file in BACKUP_DIR/REPORT_DIR); restore: new database file")
+    parser.add_argument('--workers', type=int, help="reports: processes to render with (default REPORT_WORKERS, else one per CPU)")
+    parser.add_argument('--input', help="restore: backup file to restore")
+    parser.add_argument('--gzip', action='store_true', help="backup: compress the backup")
+    parser.add_argument('--no-verify', action='store_true', help="backup: skip the integrity check of the copy")
+    parser.add_argument('--delete-rows', action='store_true', help="compact: delete the folded attendance rows (reads use the bitmaps)")
+    parser.add_argument('--once', action='store_true', help="notify: drain the outbox and exit instead of polling")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Rows per backfill batch when migrating")
+    parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between backfill batches")
     args = parser.parse_args()
 
     if args.action == 'create_db':
@@ -14,6 +32,174 @@ if __name__ == '__main__':
         with app.app_context(): # Ensure app context is active for db operations
             create_db(app)
         print("Database created successfully.")
+    elif args.action == 'archive':
+        if args.year is None:
+            parser.error("archive requires --year")
+        from app.archive import archive_year
+        with app.app_context():
+            try:
+                moved = archive_year(args.year)
+            except ValueError as e:
+                parser.error(str(e))
+        print(f"Archived {moved} attendance records of school year {args.year}.")
+    elif args.action == 'compact':
+        if args.start is None or args.end is None:
+            parser.error("compact requires --start and --end of a closed term")
+        from app.bitmap import compact_term
+        from app.models import Class
+        with app.app_context():
+            class_ids = [args.class_id] if args.class_id else [c.id for c in Class.query.order_by(Class.id)]
+            try:
+                folded = sum(compact_term(class_id, args.start, args.end, delete_rows=args.delete_rows)
+                             for class_id in class_ids)
+            except ValueError as e:
+                parser.error(str(e))
+        print(f"Folded {folded} attendance records into term bitmaps.")
+    elif args.action == 'create_school':
+        if not args.name or not args.slug:
+            parser.error("create_school requires --name and --slug")
+        from app.models import School
+        with app.app_context():
+            school = School(name=args.name, slug=args.slug.strip().lower())
+            db.session.add(school)
+            db.session.commit()
+            print(f"Created school {school.name} (code '{school.slug}', id {school.id}).")
+    elif args.action == 'rebuild_counters':
+        from app.alerts import rebuild_counters
+        with app.app_context():
+            students = rebuild_counters()
+        print(f"Rebuilt absence counters for {students} students.")
+    elif args.action == 'migrate':
+        from app.migrations import migrate
+        with app.app_context():
+            applied = migrate(batch_size=args.batch_size, pause=args.pause)
+        print(f"Applied {len(applied)} migration(s)." if applied else "Database is up to date.")
+    elif args.action == 'compile_templates':
+        from app.fragments import compile_templates
+        if not app.config.get('TEMPLATE_CACHE_DIR'):
+            parser.error("compile_templates requires TEMPLATE_CACHE_DIR")
+        print(f"Compiled {compile_templates(app)} templates into {app.config['TEMPLATE_CACHE_DIR']}.")
+    elif args.action == 'prune_login_buckets':
+        from app.ratelimit import prune_buckets
+        with app.app_context():
+            pruned = prune_buckets()
+        print(f"Deleted {pruned} idle login rate-limit buckets.")
+    elif args.action == 'prune_sessions':
+        from app.sessions import prune_sessions
+        with app.app_context():
+            pruned = prune_sessions()
+        print(f"Deleted {pruned} expired sessions.")
+    elif args.action == 'promote':
+        if args.start is None:
+            parser.error("promote requires --start, the first day in the new classes")
+        from app.enrollment import promote_classes
+        from app.tenancy import resolve_school
+        with app.app_context():
+            school_id = None
+            if args.slug:
+                found, school = resolve_school(args.slug)
+                if not found:
+                    parser.error(f"unknown school code '{args.slug}'")
+                school_id = school.id
+            moved = promote_classes(args.start, school_id)
+        print(f"Promoted {moved} students to their next class from {args.start}.")
+    elif args.action in ('calendar', 'holiday', 'missing_marks'):
+        from datetime import date, timedelta
+        from app import school_calendar
+        from app.tenancy import resolve_school
+        with app.app_context():
+            school_id = None
+            if args.slug:
+                found, school = resolve_school(args.slug)
+                if not found:
+                    parser.error(f"unknown school code '{args.slug}'")
+                school_id = school.id
+            if args.action == 'calendar':
+                if args.start is None or args.end is None:
+                    parser.error("calendar requires --start and --end")
+                added = school_calendar.add_school_days(args.start, args.end, school_id)
+                print(f"Added {added} school days.")
+            elif args.action == 'holiday':
+                if args.start is None or not args.label:
+                    parser.error("holiday requires --start and --label")
+                days = school_calendar.add_holiday(args.start, args.end or args.start, args.label, school_id)
+                print(f"Marked {days} days as '{args.label}'.")
+            else:
+                # Daily job: without dates, the last MISSING_MARKS_DAYS days up to yesterday
+                end = args.end or date.today() - timedelta(days=1)
+                start = args.start or end - timedelta(days=app.config['MISSING_MARKS_DAYS'] - 1)
+                report = school_calendar.missing_marks(start, end, school_id, every_school=not args.slug)
+                for missing in report:
+                    print(f"{missing.date:%Y-%m-%d}  school {missing.school_id or '-'}  class {missing.class_id} "
+                          f"{missing.class_name} ({missing.teacher_name or 'no teacher'})")
+                print(f"{len(report)} class days without attendance between {start} and {end}.")
+    elif args.action == 'notify':
+        from app.notifications import run_dispatcher
+        run_dispatcher(app, once=args.once)
+    elif args.action == 'compact_audit':
+        from datetime import timedelta
+        from app.audit import compact_audit
+        days = args.days if args.days is not None else app.config['AUDIT_COMPACT_AFTER_DAYS']
+        with app.app_context():
+            removed = compact_audit(datetime.utcnow() - timedelta(days=days))
+        print(f"Folded audit entries older than {days} days, {removed} rows removed.")
+    elif args.action == 'backup':
+        import os
+        from app.backup import backup_database, database_path
+        try:
+            source = database_path(app.config['SQLALCHEMY_DATABASE_URI'])
+        except ValueError as e:
+            parser.error(str(e))
+        target = args.output
+        if not target:
+            os.makedirs(app.config['BACKUP_DIR'], exist_ok=True)
+            name = f"{os.path.splitext(os.path.basename(source))[0]}-{datetime.now():%Y%m%d-%H%M%S}.db"
+            target = os.path.join(app.config['BACKUP_DIR'], name + ('.gz' if args.gzip else ''))
+        try:
+            result = backup_database(source, target, compress=args.gzip, check=not args.no_verify,
+                                     pages=app.config['BACKUP_PAGES_PER_STEP'],
+                                     sleep=app.config['BACKUP_STEP_SLEEP_MS'] / 1000,
+                                     max_restarts=app.config['BACKUP_MAX_RESTARTS'])
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Backed up {result.pages} pages to {result.path} ({result.size} bytes) in {result.seconds}s"
+              f"{', verified' if result.verified else ''}; restarted {result.restarts} times by concurrent writes.")
+    elif args.action == 'restore':
+        if not args.input or not args.output:
+            parser.error("restore requires --input and --output")
+        from app.backup import restore_backup
+        try:
+            restore_backup(args.input, args.output)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Restored {args.input} into {args.output}. Stop the app before pointing DATABASE_URL at it.")
+    elif args.action == 'reports':
+        if args.start is None or args.end is None:
+            parser.error("reports requires --start and --end")
+        import os
+        from app.reports import generate_reports
+        from app.tenancy import resolve_school
+        with app.app_context():
+            school_id = None
+            if args.slug:
+                found, school = resolve_school(args.slug)
+                if not found:
+                    parser.error(f"unknown school code '{args.slug}'")
+                school_id = school.id
+            output = args.output
+            if not output:
+                os.makedirs(app.config['REPORT_DIR'], exist_ok=True)
+                output = os.path.join(app.config['REPORT_DIR'],
+                                      f"attendance-{args.slug or 'default'}-{args.start}-{args.end}.zip")
+            result = generate_reports(app, args.start, args.end, output, school_id, args.workers,
+                                      progress=lambda done, total, report: print(f"[{done}/{total}] {report.class_name}"))
+        print(f"Wrote {result.classes} class reports to {result.path} in {result.seconds}s.")
+    elif args.action == 'analytics':
+        import json
+        from app.analytics import summarize
+        with app.app_context():
+            summary = summarize(start=args.start, end=args.end, class_id=args.class_id)
+        print(json.dumps(summary, indent=2))
     else:
         print("Starting Flask development server...")
         app.run(debug=True)
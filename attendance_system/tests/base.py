@@ -53,7 +53,7 @@ class BaseTestCase(unittest.TestCase):
         db.session.commit()
         return new_class
 
-    def create_student(self, first_name="Test", last_name="Student", class_obj=None):
+    def create_student(self, first_name="Test", last_name="Student", class_obj=None, enrolled_from=None):
         # If class_obj is provided, assign student to it
         # Ensure class_obj is committed if it's new
         student_data = {
@@ -66,6 +66,10 @@ class BaseTestCase(unittest.TestCase):
         new_student = Student(**student_data)
         db.session.add(new_student)
         db.session.commit()
+        if enrolled_from and new_student.enrollments:
+            # Students join their class on the day they are added; backdate it for past rosters
+            new_student.enrollments[0].valid_from = enrolled_from
+            db.session.commit()
         return new_student
 
     def create_attendance_record(self, student_obj, class_obj, att_date, is_present=True):
@@ -0,0 +1,89 @@
+from .base import BaseTestCase
+from attendance_system.app import alerts, attendance
+from attendance_system.app.models import AbsenceCounter, db
+from datetime import date, timedelta
+
+class AlertsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['ABSENCE_ALERT_STREAK'] = 3
+        self.class_obj = self.create_class(name="Alert Class")
+        self.student = self.create_student(first_name="Often", last_name="Away", class_obj=self.class_obj)
+        self.other = self.create_student(first_name="Always", last_name="Here", class_obj=self.class_obj)
+        self.monday = date(2024, 1, 8)
+
+    def save_day(self, offset, student_present, other_present=True):
+        return attendance.save_marks(self.class_obj.id, self.monday + timedelta(days=offset),
+                                     {self.student.id: student_present, self.other.id: other_present})
+
+    def counter(self, student):
+        return db.session.get(AbsenceCounter, student.id)
+
+    def test_save_marks_only_reports_real_changes(self):
+        changes = self.save_day(0, False)
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(self.save_day(0, False), []) # Re-submitting the same marks writes nothing
+        changes = self.save_day(0, True)
+        self.assertEqual([(c.student_id, c.old_value, c.new_value) for c in changes], [(self.student.id, False, True)])
+
+    def test_streak_raises_alert(self):
+        self.save_day(0, False)
+        self.save_day(1, False)
+        self.assertFalse(self.counter(self.student).in_alert)
+        self.save_day(2, False)
+
+        counter = self.counter(self.student)
+        self.assertEqual(counter.current_streak, 3)
+        self.assertTrue(counter.in_alert)
+        self.assertEqual(counter.alert_since, self.monday + timedelta(days=2))
+        self.assertFalse(self.counter(self.other).in_alert)
+
+        feed = alerts.alert_feed()
+        self.assertEqual([entry['student_id'] for entry in feed], [self.student.id])
+
+    def test_editing_last_day_adjusts_streak(self):
+        for offset in range(3):
+            self.save_day(offset, False)
+        self.save_day(2, True) # Correct the latest day to present
+        counter = self.counter(self.student)
+        self.assertEqual(counter.current_streak, 0)
+        self.assertEqual(counter.total_absences, 2)
+        self.assertEqual(counter.recent_absences, 2)
+
+        self.save_day(2, False) # And back again
+        self.assertEqual(self.counter(self.student).current_streak, 3)
+
+    def test_older_days_rebuild_window_and_streak(self):
+        self.save_day(0, False)
+        self.save_day(1, True)
+        self.save_day(3, False)
+        self.save_day(1, False) # Corrected two days later
+        counter = self.counter(self.student)
+        self.assertEqual((counter.current_streak, counter.recent_bits, counter.recent_absences), (3, 0b111, 3))
+        self.assertTrue(counter.in_alert)
+
+        self.save_day(2, True) # Marked late: a new day inside the window
+        counter = self.counter(self.student)
+        self.assertEqual((counter.current_streak, counter.recent_days, counter.recent_bits), (1, 4, 0b1101))
+        self.assertEqual((counter.total_days, counter.total_absences), (4, 3))
+        self.assertEqual(counter.last_date, self.monday + timedelta(days=3))
+
+    def test_rebuild_matches_incremental_counters(self):
+        for offset, present in enumerate([True, False, False, True, False]):
+            self.save_day(offset, present)
+        incremental = self.counter(self.student)
+        expected = (incremental.current_streak, incremental.recent_bits, incremental.total_absences, incremental.in_alert)
+
+        self.assertEqual(alerts.rebuild_counters(), 2)
+        rebuilt = self.counter(self.student)
+        self.assertEqual((rebuilt.current_streak, rebuilt.recent_bits, rebuilt.total_absences, rebuilt.in_alert), expected)
+
+    def test_alerts_json_feed(self):
+        for offset in range(3):
+            self.save_day(offset, False)
+        self.client.post('/register', data=dict(username="counsellor", password="password", confirm_password="password"))
+        self.client.post('/login', data=dict(username="counsellor", password="password"))
+
+        response = self.client.get('/alerts.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['alerts'][0]['current_streak'], 3)
@@ -0,0 +1,54 @@
+from .base import BaseTestCase
+from attendance_system.app import analytics
+from datetime import date
+
+class AnalyticsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        class_obj = self.create_class(name="Analytics Class")
+        self.alice = self.create_student(first_name="Alice", last_name="A", class_obj=class_obj)
+        self.bob = self.create_student(first_name="Bob", last_name="B", class_obj=class_obj)
+        # Alice: present Mon, absent Tue-Thu, present Fri, absent the next Mon
+        alice_days = [(date(2024, 1, 8), True), (date(2024, 1, 9), False), (date(2024, 1, 10), False),
+                      (date(2024, 1, 11), False), (date(2024, 1, 12), True), (date(2024, 1, 15), False)]
+        for day, present in alice_days:
+            self.create_attendance_record(self.alice, class_obj, day, is_present=present)
+        for day in (date(2024, 1, 8), date(2024, 1, 9), date(2024, 1, 15)):
+            self.create_attendance_record(self.bob, class_obj, day, is_present=True)
+
+    def test_load_columns(self):
+        columns = analytics.load_columns()
+        self.assertEqual(len(columns.student_id), 9)
+        self.assertEqual(columns.date.dtype.name, 'datetime64[D]')
+        self.assertEqual(int(columns.is_present.sum()), 5)
+
+        only_january_8 = analytics.load_columns(start=date(2024, 1, 8), end=date(2024, 1, 8))
+        self.assertEqual(len(only_january_8.student_id), 2)
+
+    def test_absence_rates_and_chronic_flags(self):
+        days = analytics.daily(analytics.load_columns())
+        rates = analytics.absence_rates(days)
+        by_student = dict(zip(rates.student_id.tolist(), rates.absences.tolist()))
+        self.assertEqual(by_student, {self.alice.id: 4, self.bob.id: 0})
+        self.assertEqual(analytics.chronic_absentees(days).tolist(), [self.alice.id])
+
+    def test_absence_streaks(self):
+        days = analytics.daily(analytics.load_columns())
+        student_ids, longest, current = analytics.absence_streaks(days)
+        result = {sid: (l, c) for sid, l, c in zip(student_ids.tolist(), longest.tolist(), current.tolist())}
+        self.assertEqual(result[self.alice.id], (3, 1))
+        self.assertEqual(result[self.bob.id], (0, 0))
+
+    def test_rolling_absence_rate_stays_within_student(self):
+        days = analytics.daily(analytics.load_columns())
+        rolling = analytics.rolling_absence_rate(days, window=2)
+        # Bob's first day must not see Alice's last absence
+        self.assertEqual(rolling.tolist(), [0.0, 0.5, 1.0, 1.0, 0.5, 0.5, 0.0, 0.0, 0.0])
+
+    def test_summarize(self):
+        summary = analytics.summarize(window=3)
+        self.assertEqual(summary['students'], 2)
+        self.assertEqual(summary['chronic_absentees'], [self.alice.id])
+        self.assertEqual(summary['weekday_pattern']['Tuesday'], 0.5)
+        self.assertAlmostEqual(summary['recent_absence_rates'][self.alice.id], 2 / 3)
+        self.assertEqual(summary['recent_absence_rates'][self.bob.id], 0.0)
@@ -0,0 +1,57 @@
+from .base import BaseTestCase
+from attendance_system.app import archive
+from attendance_system.app.models import Attendance, db
+from sqlalchemy import func, select
+from datetime import date
+
+class ArchiveTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.create_class(name="Archive Class")
+        self.student = self.create_student(first_name="Old", last_name="Timer", class_obj=self.class_obj)
+        self.current_year = archive.school_year_for(date.today())
+        self.old_year = self.current_year - 2
+
+        old_start, _ = archive.school_year_bounds(self.old_year)
+        self.create_attendance_record(self.student, self.class_obj, old_start, is_present=False)
+        self.create_attendance_record(self.student, self.class_obj, date(self.old_year + 1, 1, 15))
+        self.create_attendance_record(self.student, self.class_obj, date.today())
+
+    def count_rows(self, selectable):
+        return db.session.execute(select(func.count()).select_from(selectable)).scalar()
+
+    def test_school_year_bounds(self):
+        """A school year starting in September runs until the end of August."""
+        self.assertEqual(archive.school_year_for(date(2023, 9, 1), start_month=9), 2023)
+        self.assertEqual(archive.school_year_for(date(2024, 8, 31), start_month=9), 2023)
+        self.assertEqual(archive.school_year_bounds(2023, start_month=9), (date(2023, 9, 1), date(2024, 8, 31)))
+
+    def test_archive_year_moves_rows_out_of_hot_table(self):
+        moved = archive.archive_year(self.old_year)
+
+        self.assertEqual(moved, 2)
+        self.assertEqual(Attendance.query.count(), 1) # Only the current year stays hot
+        self.assertEqual(archive.archived_years(), [self.old_year])
+        with db.engine.connect() as conn:
+            archive_table = archive.get_archive_table(self.old_year, conn)
+        self.assertEqual(self.count_rows(archive_table), 2)
+        self.assertEqual(self.count_rows(archive.history_table()), 3) # Union view sees everything
+
+    def test_archive_current_year_is_refused(self):
+        with self.assertRaises(ValueError):
+            archive.archive_year(self.current_year)
+        self.assertEqual(Attendance.query.count(), 3)
+
+    def test_load_archived_records(self):
+        archive.archive_year(self.old_year)
+        old_start, _ = archive.school_year_bounds(self.old_year)
+
+        self.assertTrue(archive.is_archived_date(old_start))
+        self.assertFalse(archive.is_archived_date(date.today()))
+
+        records = archive.load_archived_records(old_start, class_id=self.class_obj.id)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].student.first_name, "Old")
+        self.assertEqual(records[0].class_attended.name, "Archive Class")
+        self.assertEqual(records[0].date, old_start)
+        self.assertFalse(records[0].is_present)
@@ -0,0 +1,59 @@
+from .base import BaseTestCase
+from attendance_system.app import attendance, db
+from attendance_system.app.models import Enrollment
+from datetime import date
+
+class AttendanceMatrixTestCase(BaseTestCase):
+    def test_load_matrix(self):
+        class_obj = self.create_class(name="Matrix Class")
+        other_class = self.create_class(name="Other Class")
+        alice = self.create_student(first_name="Alice", last_name="A", class_obj=class_obj)
+        bob = self.create_student(first_name="Bob", last_name="B", class_obj=class_obj)
+        self.create_attendance_record(alice, class_obj, date(2024, 1, 8), is_present=True)
+        self.create_attendance_record(alice, class_obj, date(2024, 1, 9), is_present=False)
+        self.create_attendance_record(bob, class_obj, date(2024, 1, 9), is_present=False)
+        self.create_attendance_record(bob, other_class, date(2024, 1, 10), is_present=False) # Other class, ignored
+        self.create_attendance_record(alice, class_obj, date(2024, 1, 22), is_present=False) # Out of range
+
+        matrix = attendance.load_matrix(class_obj.id, date(2024, 1, 8), date(2024, 1, 14))
+
+        self.assertEqual(len(matrix.days), 5) # Monday to Friday
+        self.assertEqual([row.student.first_name for row in matrix.rows], ["Alice", "Bob"])
+        self.assertEqual(matrix.rows[0].statuses, [True, False, None, None, None])
+        self.assertEqual(matrix.rows[1].statuses, [None, False, None, None, None])
+        self.assertEqual([row.absences for row in matrix.rows], [1, 1])
+        self.assertEqual(matrix.absences_per_day, [0, 2, 0, 0, 0])
+
+    def test_load_matrix_keeps_students_who_moved(self):
+        class_obj = self.create_class(name="Old Class")
+        new_class = self.create_class(name="New Class")
+        moved = self.create_student(first_name="Moved", last_name="On", class_obj=new_class)
+        self.create_attendance_record(moved, class_obj, date(2024, 1, 8), is_present=False)
+
+        matrix = attendance.load_matrix(class_obj.id, date(2024, 1, 8), date(2024, 1, 8))
+        self.assertEqual([row.student.id for row in matrix.rows], [moved.id])
+
+    def test_load_matrix_students_enrolled_in_the_range(self):
+        class_obj = self.create_class(name="Matrix Class")
+        other_class = self.create_class(name="Other Class")
+        stayed = self.create_student(first_name="Stayed", last_name="A", class_obj=class_obj,
+                                     enrolled_from=date(2023, 9, 1))
+        left = self.create_student(first_name="Left", last_name="B", class_obj=other_class)
+        joined = self.create_student(first_name="Joined", last_name="C", class_obj=other_class)
+        db.session.add_all([Enrollment(student_id=left.id, class_id=class_obj.id,
+                                       valid_from=date(2023, 9, 1), valid_to=date(2024, 1, 10)),
+                            Enrollment(student_id=joined.id, class_id=class_obj.id,
+                                       valid_from=date(2024, 2, 1), valid_to=date(2024, 3, 1))])
+        db.session.commit()
+
+        # Left mid-range, without marks: still a row; joined after the range: none
+        matrix = attendance.load_matrix(class_obj.id, date(2024, 1, 8), date(2024, 1, 12))
+        self.assertEqual([row.student.id for row in matrix.rows], [stayed.id, left.id])
+
+    def test_load_matrix_skips_students_added_later(self):
+        class_obj = self.create_class(name="Matrix Class")
+        new = self.create_student(first_name="New", last_name="A", class_obj=class_obj)
+        self.assertEqual([e.valid_from for e in new.enrollments], [date.today()])
+
+        matrix = attendance.load_matrix(class_obj.id, date(2024, 1, 8), date(2024, 1, 12))
+        self.assertEqual(matrix.rows, [])
@@ -0,0 +1,73 @@
+from .base import BaseTestCase
+from attendance_system.app import db, attendance, audit
+from attendance_system.app.models import AttendanceAudit, User
+from datetime import date, datetime, timedelta
+
+class AuditTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.create_class(name="Audit Class")
+        self.amy = self.create_student(first_name="Amy", class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        self.bob = self.create_student(first_name="Bob", class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        self.day = date(2024, 1, 8)
+
+    def entries(self):
+        return [(e.student_id, e.old_value, e.new_value, e.edits) for e in AttendanceAudit.query.order_by(AttendanceAudit.id)]
+
+    def test_only_changes_are_logged(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: True, self.bob.id: True})
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False, self.bob.id: True})
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False, self.bob.id: True})
+        self.assertEqual(self.entries(), [(self.amy.id, None, True, 1), (self.bob.id, None, True, 1),
+                                          (self.amy.id, True, False, 1)])
+
+        history = audit.student_history(self.amy.id)
+        self.assertEqual([(h.old_value, h.new_value, h.class_name) for h in history],
+                         [(True, False, "Audit Class"), (None, True, "Audit Class")])
+
+    def test_take_attendance_records_the_user(self):
+        self.register_user()
+        self.login_user()
+        self.client.post('/attendance/take', data={
+            'submit_attendance': 'Submit', 'hidden_class_id': self.class_obj.id, 'hidden_date': '2024-01-08',
+            'hidden_period': '0', 'student_ids': [str(self.amy.id)]}, follow_redirects=True)
+        user = User.query.one()
+        self.assertEqual({(e.changed_by, e.source) for e in AttendanceAudit.query}, {(user.id, 'web')})
+
+        # The checked students are the absent ones
+        response = self.client.get(f'/students/{self.amy.id}/history')
+        self.assertIn(b'Absent', response.data)
+        self.assertIn(user.username.encode(), response.data)
+
+    def test_deleting_a_student_keeps_their_log(self):
+        self.register_user()
+        self.login_user()
+        amy_id, class_id = self.amy.id, self.class_obj.id
+        attendance.save_marks(class_id, self.day, {amy_id: False})
+        response = self.client.post(f'/delete_student/{amy_id}')
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(self.entries(), [(amy_id, None, False, 1), (amy_id, None, None, 1)])
+        deletion = AttendanceAudit.query.order_by(AttendanceAudit.id.desc()).first()
+        self.assertEqual((deletion.action, deletion.class_id, deletion.date, deletion.changed_by),
+                         (audit.STUDENT_DELETED, class_id, None, User.query.one().id))
+
+        # Deletions are no mark: compaction leaves them next to the mark's own entries
+        AttendanceAudit.query.update({AttendanceAudit.changed_at: datetime.utcnow() - timedelta(days=400)})
+        db.session.commit()
+        self.assertEqual(audit.compact_audit(datetime.utcnow() - timedelta(days=365)), 0)
+        self.assertEqual([entry.action for entry in audit.student_history(amy_id)], [audit.STUDENT_DELETED, None])
+
+    def test_compaction_folds_old_entries_per_mark(self):
+        for value in (True, False, True, False):
+            attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: value})
+        attendance.save_marks(self.class_obj.id, self.day, {self.bob.id: False})
+        old = datetime.utcnow() - timedelta(days=400)
+        AttendanceAudit.query.update({AttendanceAudit.changed_at: old})
+        db.session.commit()
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: True}) # Recent, kept as it is
+
+        self.assertEqual(audit.compact_audit(datetime.utcnow() - timedelta(days=365)), 3)
+        self.assertEqual(sorted(self.entries(), key=repr), sorted([(self.amy.id, None, False, 4), (self.bob.id, None, False, 1),
+                                                                   (self.amy.id, False, True, 1)], key=repr))
+        self.assertEqual(audit.compact_audit(datetime.utcnow() - timedelta(days=365)), 0)
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from attendance_system.app import backup
+
+class BackupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = self.path('site.db')
+        conn = sqlite3.connect(self.source)
+        conn.execute('CREATE TABLE attendance (id INTEGER PRIMARY KEY, note TEXT)')
+        conn.executemany('INSERT INTO attendance (note) VALUES (?)', [('x' * 200,)] * 2000)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def count(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute('SELECT count(*) FROM attendance').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_backup_and_restore_gzipped(self):
+        result = backup.backup_database(self.source, self.path('backup.db.gz'), compress=True, pages=16, sleep=0)
+        self.assertTrue(result.verified)
+        self.assertLess(result.size, os.path.getsize(self.source))
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['backup.db.gz', 'site.db']) # No partial files left
+
+        backup.restore_backup(self.path('backup.db.gz'), self.path('restored.db'))
+        self.assertEqual(self.count(self.path('restored.db')), 2000)
+        with self.assertRaises(ValueError):
+            backup.restore_backup(self.path('backup.db.gz'), self.path('restored.db'))
+
+    def test_writes_during_backup_restart_it(self):
+        writer = sqlite3.connect(self.source)
+
+        def write_between_steps(seconds):
+            writer.execute("INSERT INTO attendance (note) VALUES ('late')")
+            writer.commit()
+        try:
+            with mock.patch.object(backup.time, 'sleep', write_between_steps):
+                result = backup.backup_database(self.source, self.path('backup.db'), pages=4, sleep=1, max_restarts=2)
+        finally:
+            writer.close()
+        # Two restarts, then the rest in one step: the copy includes every committed write
+        self.assertEqual(result.restarts, 3)
+        self.assertEqual(self.count(self.path('backup.db')), self.count(self.source))
+
+    def test_restore_rejects_a_damaged_backup(self):
+        with open(self.path('broken.db'), 'wb') as f:
+            f.write(b'not a database' * 100)
+        with self.assertRaises(ValueError):
+            backup.restore_backup(self.path('broken.db'), self.path('restored.db'))
+        self.assertFalse(os.path.exists(self.path('restored.db')))
+
+    def test_only_sqlite_files(self):
+        self.assertEqual(backup.database_path('sqlite:////srv/site.db'), '/srv/site.db')
+        with self.assertRaises(ValueError):
+            backup.database_path('sqlite:///:memory:')
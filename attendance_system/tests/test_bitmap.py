@@ -0,0 +1,76 @@
+from .base import BaseTestCase
+from attendance_system.app import analytics, attendance, bitmap, reads
+from attendance_system.app.models import Attendance, AttendanceBitmap, db
+from datetime import date
+
+class BitmapTestCase(BaseTestCase):
+    TERM_START = date(2024, 1, 8)  # A Monday
+    TERM_END = date(2024, 1, 19)   # Two school weeks later
+
+    def test_term_days_skips_weekends(self):
+        days = bitmap.term_days(self.TERM_START, self.TERM_END)
+        self.assertEqual(len(days), 10)
+        self.assertNotIn(date(2024, 1, 13), days)
+
+    def test_encode_decode_round_trip(self):
+        days = bitmap.term_days(self.TERM_START, self.TERM_END)
+        marks = {days[0]: True, days[3]: False, days[9]: False}
+
+        marked_bits, absent_bits = bitmap.encode_marks(days, marks)
+
+        self.assertEqual(len(marked_bits), 2) # Ten days fit in two bytes
+        self.assertEqual(bitmap.popcount(marked_bits), 3)
+        self.assertEqual(bitmap.popcount(absent_bits), 2)
+        self.assertEqual(bitmap.decode_marks(days, marked_bits, absent_bits), marks)
+
+    def test_encode_rejects_non_school_day(self):
+        days = bitmap.term_days(self.TERM_START, self.TERM_END)
+        with self.assertRaises(ValueError):
+            bitmap.encode_marks(days, {date(2024, 1, 13): True})
+
+    def test_compact_term(self):
+        class_obj = self.create_class(name="Bitmap Class")
+        alice = self.create_student(first_name="Alice", last_name="A", class_obj=class_obj)
+        bob = self.create_student(first_name="Bob", last_name="B", class_obj=class_obj)
+        self.create_attendance_record(alice, class_obj, date(2024, 1, 8), is_present=False)
+        self.create_attendance_record(alice, class_obj, date(2024, 1, 9), is_present=False)
+        self.create_attendance_record(bob, class_obj, date(2024, 1, 9), is_present=True)
+        self.create_attendance_record(bob, class_obj, date(2024, 1, 13), is_present=True) # Saturday, not folded
+
+        folded = bitmap.compact_term(class_obj.id, self.TERM_START, self.TERM_END, delete_rows=True)
+
+        self.assertEqual(folded, 3)
+        self.assertEqual(Attendance.query.count(), 1)
+        self.assertEqual(AttendanceBitmap.query.count(), 2)
+
+        totals = {t.student_id: t for t in bitmap.term_totals(class_obj.id, self.TERM_START)}
+        self.assertEqual((totals[alice.id].marked, totals[alice.id].absent), (2, 2))
+        self.assertEqual((totals[bob.id].marked, totals[bob.id].absent), (1, 0))
+
+        daily = bitmap.daily_absence_counts(class_obj.id, self.TERM_START, self.TERM_END)
+        self.assertEqual(daily[date(2024, 1, 8)], 1)
+        self.assertEqual(daily[date(2024, 1, 10)], 0)
+
+        self.assertEqual(bitmap.student_term_marks(bob.id, class_obj.id, self.TERM_START), {date(2024, 1, 9): True})
+
+    def test_compacted_days_are_still_read(self):
+        class_obj = self.create_class(name="Bitmap Class")
+        alice = self.create_student(first_name="Alice", last_name="A", class_obj=class_obj)
+        self.create_attendance_record(alice, class_obj, date(2024, 1, 8), is_present=False)
+        self.create_attendance_record(alice, class_obj, date(2024, 1, 9), is_present=True)
+        bitmap.compact_term(class_obj.id, self.TERM_START, self.TERM_END, delete_rows=True)
+        self.assertEqual(Attendance.query.count(), 0)
+
+        matrix = attendance.load_matrix(class_obj.id, self.TERM_START, self.TERM_END)
+        self.assertEqual(matrix.rows[0].statuses[:3], [False, True, None])
+        rows = reads.attendance_rows(class_id=class_obj.id)
+        self.assertEqual([(row.date, row.is_present, row.student.first_name) for row in rows],
+                         [(date(2024, 1, 9), True, 'Alice'), (date(2024, 1, 8), False, 'Alice')])
+        self.assertEqual(reads.attendance_rows(filter_date=date(2024, 1, 8))[0].class_attended.name, "Bitmap Class")
+        columns = analytics.load_columns(class_id=class_obj.id)
+        self.assertEqual(columns.is_present.tolist(), [False, True])
+
+    def test_only_closed_terms_are_compacted(self):
+        class_obj = self.create_class(name="Bitmap Class")
+        with self.assertRaises(ValueError):
+            bitmap.compact_term(class_obj.id, date.today(), date.today())
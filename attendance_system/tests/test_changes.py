@@ -0,0 +1,78 @@
+from .base import BaseTestCase
+from attendance_system.app import db, archive, attendance, bitmap, changes
+from attendance_system.app.enrollment import promote_classes
+from attendance_system.app.models import ChangeCounter, Student
+from datetime import date
+
+class ChangesTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.create_class(name="Sync Class")
+        self.student = self.create_student(class_obj=self.class_obj)
+        attendance.save_marks(self.class_obj.id, date(2024, 1, 8), {self.student.id: False})
+
+    def drain(self, cursor=changes.START, limit=500):
+        seen = []
+        while True:
+            items, next_cursor, has_more = changes.changes_since(cursor, limit=limit)
+            seen += items
+            cursor = changes.parse_cursor(next_cursor)
+            if not has_more:
+                return seen, cursor
+
+    def test_initial_load_and_increments(self):
+        items, cursor = self.drain()
+        self.assertEqual([(c['entity'], c['op']) for c in items],
+                         [('class', 'upsert'), ('student', 'upsert'), ('attendance', 'upsert')])
+        self.assertEqual(items[2]['data']['date'], '2024-01-08')
+        self.assertEqual(self.drain(cursor)[0], [])
+
+        self.student.last_name = "Renamed"
+        db.session.commit()
+        items, cursor = self.drain(cursor)
+        self.assertEqual([(c['entity'], c['data']['last_name']) for c in items], [('student', 'Renamed')])
+
+        # Deleting a student also deletes its marks
+        student_id = self.student.id
+        db.session.delete(self.student)
+        db.session.commit()
+        items, cursor = self.drain(cursor)
+        self.assertEqual(sorted((c['entity'], c['op'], c['id']) for c in items),
+                         sorted([('student', 'delete', student_id), ('attendance', 'delete', 1)]))
+
+    def test_pages_split_rows_of_one_change(self):
+        other = self.create_class(name="Next Year")
+        self.class_obj.next_class_id = other.id
+        db.session.commit()
+        for n in range(4):
+            self.create_student(first_name=f"S{n}", class_obj=self.class_obj)
+        _, cursor = self.drain()
+
+        # A promotion stamps all moved students with one sequence number
+        promote_classes(date(2025, 9, 1))
+        items, _ = self.drain(cursor, limit=2)
+        self.assertEqual(len({c['seq'] for c in items}), 1)
+        self.assertEqual(sorted(c['id'] for c in items), sorted(s.id for s in Student.query))
+
+    def test_changes_api(self):
+        self.register_user()
+        self.login_user()
+        response = self.client.get('/api/changes?limit=2')
+        payload = response.get_json()
+        self.assertEqual((len(payload['changes']), payload['has_more']), (2, True))
+        response = self.client.get(f"/api/changes?since={payload['next']}")
+        self.assertEqual([c['entity'] for c in response.get_json()['changes']], ['attendance'])
+        self.assertEqual(self.client.get('/api/changes?since=nope').status_code, 400)
+
+    def test_archived_and_compacted_marks_are_moves(self):
+        attendance.save_marks(self.class_obj.id, date(2022, 1, 10), {self.student.id: True})
+        _, cursor = self.drain()
+
+        bitmap.compact_term(self.class_obj.id, date(2024, 1, 8), date(2024, 1, 12), delete_rows=True)
+        archive.archive_year(2021)
+        items, cursor = self.drain(cursor)
+        self.assertEqual([(c['entity'], c['op'], c['id'], c['to']) for c in items],
+                         [('attendance', 'moved', 1, 'bitmap'), ('attendance', 'moved', 2, 'archive')])
+
+    def test_counter_row_is_seeded_with_the_table(self):
+        self.assertEqual(db.session.get(ChangeCounter, 1).value, 3) # setUp's class, student and marks
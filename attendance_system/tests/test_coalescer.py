@@ -0,0 +1,61 @@
+from .base import BaseTestCase
+from attendance_system.app import coalescer, db
+from attendance_system.app.models import Class
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from unittest import mock
+
+def add_class(name):
+    db.session.add(Class(name=name))
+    return name
+
+class CoalescerTestCase(BaseTestCase):
+    def test_run_batch_isolates_failures(self):
+        results = coalescer.run_batch([lambda: add_class("One"), lambda: add_class(None), # name is NOT NULL
+                                       lambda: add_class("Two")])
+
+        self.assertEqual(results[0], "One")
+        self.assertIsInstance(results[1], IntegrityError)
+        self.assertEqual(results[2], "Two")
+        self.assertEqual(sorted(c.name for c in Class.query.all()), ["One", "Two"])
+
+    def test_writes_within_window_share_a_commit(self):
+        writer = coalescer.WriteCoalescer(self.app, window=0.5)
+        futures = [writer.submit(lambda name=name: add_class(name)) for name in ("A", "B", None)]
+
+        self.assertEqual(futures[0].result(timeout=5), "A")
+        self.assertEqual(futures[1].result(timeout=5), "B")
+        with self.assertRaises(IntegrityError):
+            futures[2].result(timeout=5)
+        self.assertEqual(writer.batches, 1)
+        self.assertEqual(Class.query.count(), 2)
+
+    def test_run_write_reports_errors_to_caller(self):
+        with self.app.test_request_context():
+            self.assertEqual(coalescer.run_write(add_class, "Fresh"), "Fresh")
+            with self.assertRaises(IntegrityError):
+                coalescer.run_write(add_class, None)
+        self.assertEqual(Class.query.filter_by(name="Fresh").count(), 1)
+
+    def test_writer_survives_batch_errors(self):
+        writer = coalescer.WriteCoalescer(self.app, window=0)
+        with mock.patch.object(coalescer, 'run_batch', side_effect=RuntimeError("database gone")):
+            with self.assertRaises(RuntimeError):
+                writer.submit(lambda: add_class("Lost")).result(timeout=5)
+        self.assertEqual(writer.submit(lambda: add_class("After")).result(timeout=5), "After")
+
+    def test_dead_writer_is_restarted(self):
+        writer = coalescer.WriteCoalescer(self.app, window=0)
+        # A BaseException gets past the guard and ends the thread
+        with mock.patch.object(writer, '_apply', side_effect=KeyboardInterrupt), mock.patch('threading.excepthook'):
+            writer.submit(lambda: add_class("Lost"))
+            writer._thread.join(timeout=5)
+        self.assertEqual(writer.submit(lambda: add_class("After")).result(timeout=5), "After")
+        self.assertEqual(writer.restarts, 1)
+
+    def test_run_write_times_out(self):
+        self.app.config.update(WRITE_COALESCING=True, WRITE_COALESCE_TIMEOUT_S=0.01)
+        blocked = mock.patch.object(coalescer.WriteCoalescer, '_apply', lambda self, batch: None) # Never answers
+        with blocked, self.app.test_request_context():
+            with self.assertRaises(FutureTimeoutError):
+                coalescer.run_write(add_class, "Slow")
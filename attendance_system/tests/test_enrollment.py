@@ -0,0 +1,75 @@
+from .base import BaseTestCase
+from attendance_system.app import db, attendance
+from attendance_system.app.enrollment import promote_classes
+from attendance_system.app.models import Enrollment, Student
+from datetime import date
+
+class EnrollmentTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_class(name="Year 1")
+        self.second = self.create_class(name="Year 2")
+        self.third = self.create_class(name="Year 3")
+        self.joined = date(2023, 9, 1)
+
+    def intervals(self, student):
+        return [(e.class_id, e.valid_from, e.valid_to)
+                for e in Enrollment.query.filter_by(student_id=student.id).order_by(Enrollment.valid_from)]
+
+    def test_transfer_keeps_past_rosters(self):
+        student = self.create_student(first_name="Tia", class_obj=self.first, enrolled_from=self.joined)
+        self.assertEqual(self.intervals(student), [(self.first.id, self.joined, None)])
+
+        student.class_id = self.second.id
+        db.session.commit()
+        today = date.today()
+        self.assertEqual(self.intervals(student), [(self.first.id, self.joined, today),
+                                                   (self.second.id, today, None)])
+        past = date(2024, 1, 8)
+        self.assertEqual(attendance.class_students(self.first.id, past), [student])
+        self.assertEqual(attendance.class_students(self.second.id, past), [])
+        self.assertEqual(attendance.class_students(self.second.id, today), [student])
+        self.assertEqual(attendance.class_students(self.first.id), [])
+
+        # Moving again on the same day replaces today's enrollment instead of adding an empty one
+        student.class_assigned = self.third
+        db.session.commit()
+        self.assertEqual(self.intervals(student), [(self.first.id, self.joined, today),
+                                                   (self.third.id, today, None)])
+
+        student.class_id = None
+        db.session.commit()
+        self.assertEqual(self.intervals(student), [(self.first.id, self.joined, today)])
+
+    def test_promote_classes(self):
+        self.first.next_class_id = self.second.id
+        self.second.next_class_id = self.third.id # Year 3 is the final year
+        db.session.commit()
+        ann = self.create_student(first_name="Ann", class_obj=self.first, enrolled_from=self.joined)
+        ben = self.create_student(first_name="Ben", class_obj=self.second, enrolled_from=self.joined)
+        cat = self.create_student(first_name="Cat", class_obj=self.third, enrolled_from=self.joined)
+        start = date(2025, 9, 1)
+
+        self.assertEqual(promote_classes(start), 2)
+        db.session.expire_all()
+        self.assertEqual([db.session.get(Student, s.id).class_id for s in (ann, ben, cat)],
+                         [self.second.id, self.third.id, self.third.id])
+        self.assertEqual(self.intervals(ann), [(self.first.id, self.joined, start),
+                                               (self.second.id, start, None)])
+        self.assertEqual(attendance.class_students(self.second.id, date(2025, 6, 30)), [ben])
+        self.assertEqual(attendance.class_students(self.second.id, start), [ann])
+        self.assertEqual(attendance.class_students(self.third.id, start), [ben, cat])
+
+    def test_take_attendance_uses_roster_of_the_day(self):
+        student = self.create_student(first_name="Tia", class_obj=self.first, enrolled_from=self.joined)
+        student.class_id = self.second.id
+        db.session.commit()
+        self.register_user()
+        self.login_user()
+
+        response = self.client.post('/attendance/take', data={
+            'submit_attendance': 'Submit', 'hidden_class_id': self.first.id, 'hidden_date': '2024-01-08',
+            'student_ids': [str(student.id)], f'present_{student.id}': 'false'}, follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        marks = attendance.load_marks(self.first.id, date(2024, 1, 8))
+        self.assertFalse(marks[student.id].is_present)
@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+from .base import BaseTestCase
+from attendance_system.app import create_app, db, fragments
+from attendance_system.app.models import Student
+from attendance_system.config import TestingConfig
+
+class FragmentCacheTestCase(BaseTestCase):
+    def render(self, rows):
+        template = self.app.jinja_env.from_string(
+            "{% cache 'names' %}{% for s in rows %}{{ s.first_name }};{% endfor %}{% endcache %}")
+        with self.app.test_request_context():
+            return template.render(rows=rows)
+
+    def test_fragment_cached_until_data_changes(self):
+        class_obj = self.create_class()
+        self.create_student(first_name="Amy", class_obj=class_obj)
+        load = lambda: Student.query.order_by(Student.id).all()
+
+        self.assertEqual(self.render(load()), "Amy;")
+        # Same data version: the cached fragment is served and the rows are never loaded
+        self.assertEqual(self.render(fragments.Deferred(self.fail)), "Amy;")
+
+        self.create_student(first_name="Bob", class_obj=class_obj)
+        self.assertEqual(self.render(load()), "Amy;Bob;")
+
+        student = Student.query.filter_by(first_name="Bob").one()
+        student.first_name = "Rob"
+        db.session.commit()
+        self.assertEqual(self.render(load()), "Amy;Rob;")
+
+    def test_bytecode_cache_written_to_disk(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            config = type('BytecodeConfig', (TestingConfig,), {'TEMPLATE_CACHE_DIR': cache_dir})
+            app = create_app(config)
+            fragments.compile_templates(app)
+            self.assertTrue(any(name.endswith('.cache') for name in os.listdir(cache_dir)))
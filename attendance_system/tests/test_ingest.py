@@ -0,0 +1,111 @@
+from .base import BaseTestCase
+from attendance_system.app import ingest
+from attendance_system.app.coalescer import get_coalescer
+from attendance_system.app.models import Attendance, IngestSubmission, db
+from datetime import date, datetime, timedelta
+from unittest import mock
+import threading
+
+class IngestTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.create_class(name="Ingest Class")
+        self.amy = self.create_student(first_name="Amy", class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        self.bob = self.create_student(first_name="Bob", class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        self.day = date(2024, 1, 8)
+
+    def test_submit_and_poll_ticket(self):
+        self.register_user(username="ingestuser")
+        self.login_user(username="ingestuser")
+        stranger = self.create_student(first_name="Other") # Not on the roster
+
+        response = self.client.post('/api/attendance', json={
+            'class_id': self.class_obj.id, 'date': '2024-01-08',
+            'marks': {str(self.amy.id): True, str(self.bob.id): False, str(stranger.id): False}})
+        self.assertEqual(response.status_code, 202)
+        body = response.get_json()
+        self.assertEqual(body['ignored'], 1)
+
+        ingest.get_ingest(self.app).ticket(body['ticket']).future.result(timeout=5)
+        status = self.client.get(f"/api/attendance/{body['ticket']}").get_json()
+        self.assertEqual((status['status'], status['changed']), ('applied', 2))
+        self.assertEqual({(a.student_id, a.is_present) for a in Attendance.query.all()},
+                         {(self.amy.id, True), (self.bob.id, False)})
+
+    def test_bad_requests(self):
+        self.register_user(username="ingestuser")
+        self.login_user(username="ingestuser")
+        self.assertEqual(self.client.post('/api/attendance', json={'class_id': 'x'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/attendance', json={
+            'class_id': 999, 'date': '2024-01-08', 'marks': {}}).status_code, 404)
+        self.assertEqual(self.client.get('/api/attendance/nope').status_code, 404)
+
+    def test_submissions_share_one_transaction(self):
+        service = ingest.IngestService(self.app, max_batch=50, max_wait=0.5)
+        other_class = self.create_class(name="Second Class")
+        carl = self.create_student(first_name="Carl", class_obj=other_class)
+        tickets = [service.submit(self.class_obj.id, self.day, {self.amy.id: False}),
+                   service.submit(other_class.id, self.day, {carl.id: True}),
+                   service.submit(self.class_obj.id, self.day, {self.amy.id: True})] # Later one wins
+
+        results = [ticket.future.result(timeout=5) for ticket in tickets]
+        self.assertEqual(service.batches, 1)
+        self.assertEqual([len(changes) for changes in results], [1, 1, 1])
+        self.assertTrue(Attendance.query.filter_by(student_id=self.amy.id).one().is_present)
+
+    def test_concurrent_submissions_share_one_commit(self):
+        self.app.config.update(WRITE_COALESCING=True, WRITE_COALESCE_WINDOW_MS=500)
+        service = ingest.IngestService(self.app, poll=60)
+        tickets = []
+
+        def submit(student_id):
+            with self.app.app_context():
+                tickets.append(service.submit(self.class_obj.id, self.day, {student_id: True}))
+
+        with mock.patch.object(service._loop, 'call_soon_threadsafe'):
+            threads = [threading.Thread(target=submit, args=(student.id,)) for student in (self.amy, self.bob)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+        coalescer = get_coalescer(self.app)
+        self.assertEqual((coalescer.batches, coalescer.writes), (1, 2))
+        self.assertEqual(IngestSubmission.query.filter_by(status='queued').count(), len(tickets))
+
+    def test_failing_submission_only_fails_its_ticket(self):
+        service = ingest.IngestService(self.app, max_batch=50, max_wait=0.5)
+        good = service.submit(self.class_obj.id, self.day, {self.amy.id: False})
+        bad = service.submit(12345, self.day, {self.amy.id: False}) # No such class
+
+        self.assertEqual(len(good.future.result(timeout=5)), 1)
+        with self.assertRaises(Exception):
+            bad.future.result(timeout=5)
+        self.assertEqual(bad.status, 'failed')
+
+    def test_queued_submissions_outlive_their_worker(self):
+        crashed = ingest.IngestService(self.app, poll=60)
+        with mock.patch.object(crashed._loop, 'call_soon_threadsafe'): # Gone before its writer woke up
+            ticket = crashed.submit(self.class_obj.id, self.day, {self.amy.id: False})
+        self.assertEqual(db.session.get(IngestSubmission, int(ticket.id)).status, 'queued')
+
+        other = ingest.IngestService(self.app, poll=60) # Another worker
+        self.assertEqual(other._apply_next(), 1) # What its writer does on its next wake-up
+        status = other.ticket(ticket.id)
+        self.assertEqual(status.status, 'applied')
+        self.assertEqual((status.changed, status.school_id, status.future), (1, None, None))
+        self.assertFalse(Attendance.query.filter_by(student_id=self.amy.id).one().is_present)
+
+    def test_stale_claims_are_taken_again(self):
+        service = ingest.IngestService(self.app, poll=60)
+        with mock.patch.object(service._loop, 'call_soon_threadsafe'):
+            ticket = service.submit(self.class_obj.id, self.day, {self.bob.id: True})
+        submission = db.session.get(IngestSubmission, int(ticket.id))
+        submission.status, submission.claimed_at = 'applying', datetime.utcnow() - timedelta(minutes=1)
+        db.session.commit()
+
+        self.assertEqual(ingest.claim_submissions(10, timedelta(minutes=5)), []) # Still being applied
+        rows = ingest.claim_submissions(10, timedelta(seconds=30))
+        self.assertEqual([row.id for row in rows], [int(ticket.id)])
+        self.assertEqual(len(ingest.apply_batch(rows)[0]), 1)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(IngestSubmission, int(ticket.id)).status, 'applied')
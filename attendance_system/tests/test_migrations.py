@@ -0,0 +1,98 @@
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from attendance_system.app import create_app, db
+from attendance_system.app import migrations
+from attendance_system.app.models import Attendance, Student
+from attendance_system.config import TestingConfig
+from .base import BaseTestCase
+
+# The schema as it was before tenants and the attendance indexes
+LEGACY_SCHEMA = [
+    'CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(20) NOT NULL UNIQUE, '
+    'password_hash VARCHAR(128), is_admin BOOLEAN)',
+    'CREATE TABLE class (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE, teacher_name VARCHAR(100))',
+    'CREATE TABLE student (id INTEGER PRIMARY KEY, first_name VARCHAR(100) NOT NULL, '
+    'last_name VARCHAR(100) NOT NULL, class_id INTEGER REFERENCES class (id))',
+    'CREATE TABLE attendance (id INTEGER PRIMARY KEY, date DATE NOT NULL, is_present BOOLEAN NOT NULL, '
+    'student_id INTEGER NOT NULL REFERENCES student (id), class_id INTEGER NOT NULL REFERENCES class (id))',
+]
+
+
+class MigrationsTestCase(BaseTestCase):
+    def setUp(self):
+        # Start from the legacy schema instead of the current models
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        with db.engine.begin() as conn:
+            for ddl in LEGACY_SCHEMA:
+                conn.execute(text(ddl))
+            conn.execute(text("INSERT INTO user (id, username, password_hash, is_admin) VALUES (1, 'admin', 'x', 1)"))
+            conn.execute(text("INSERT INTO class (id, name, teacher_name) VALUES (1, 'Class 1', 'T')"))
+            conn.execute(text("INSERT INTO student (id, first_name, last_name, class_id) VALUES (1, 'A', 'B', 1)"))
+            for i in range(1, 26):
+                conn.execute(text('INSERT INTO attendance (id, date, is_present, student_id, class_id) '
+                                  "VALUES (:id, '2024-01-08', 1, 1, 1)"), {'id': i})
+        self.log = []
+
+    def test_migrate_legacy_database(self):
+        applied = migrations.migrate(batch_size=10, log=self.log.append)
+
+        self.assertEqual(applied, [m.version for m in migrations.MIGRATIONS])
+        inspector = inspect(db.engine)
+        for table_name in ('user', 'class', 'student', 'attendance'):
+            self.assertIn('school_id', {c['name'] for c in inspector.get_columns(table_name)})
+        attendance_indexes = {i['name'] for i in inspector.get_indexes('attendance')}
+        self.assertTrue({'ix_attendance_class_date_period', 'ix_attendance_school_date'} <= attendance_indexes)
+        self.assertNotIn('ix_attendance_class_date', attendance_indexes)
+        self.assertIn('  drop index ix_attendance_class_date', self.log) # Created by 1, replaced in 6
+        self.assertEqual({a.period for a in db.session.query(Attendance)}, {0})
+        self.assertIn('uq_class_school_name', {c['name'] for c in inspector.get_unique_constraints('class')})
+        self.assertIn('uq_user_default_username', {i['name'] for i in inspector.get_indexes('user')})
+        self.assertEqual(db.session.execute(text('SELECT COUNT(*) FROM change_counter')).scalar(), 1)
+        self.assertEqual({fk['referred_table'] for fk in inspector.get_foreign_keys('attendance_audit')},
+                         {'school', 'user'}) # The log outlives deleted students
+        audit_columns = {c['name']: c for c in inspector.get_columns('attendance_audit')}
+        self.assertTrue(audit_columns['class_id']['nullable'] and 'action' in audit_columns)
+        self.assertEqual(db.session.query(Attendance).count(), 25)
+        self.assertEqual(db.session.get(Student, 1).class_assigned.name, 'Class 1')
+
+        # Nothing left to do on a second run
+        self.assertEqual(migrations.migrate(log=self.log.append), [])
+
+    def test_backfill_resumes_from_checkpoint(self):
+        migrations.migrate(log=self.log.append)
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT INTO school (id, name, slug) VALUES (7, 'North', 'north')"))
+            conn.execute(text('UPDATE class SET school_id = 7'))
+            conn.execute(text('UPDATE attendance SET school_id = NULL'))
+            # An earlier run got as far as id 20 before it was interrupted
+            conn.execute(migrations.backfill_progress.insert().values(version=99, step='demo', last_id=20))
+
+        ctx = migrations.MigrationContext(db.engine, 99, batch_size=2, log=self.log.append)
+        updated = ctx.backfill('demo', 'attendance',
+                               'school_id = (SELECT class.school_id FROM class WHERE class.id = attendance.class_id)',
+                               'school_id IS NULL')
+
+        self.assertEqual(updated, 5)
+        with db.engine.connect() as conn:
+            self.assertEqual(conn.execute(text('SELECT COUNT(*) FROM attendance WHERE school_id = 7')).scalar(), 5)
+            last_id = conn.execute(text("SELECT last_id FROM migration_backfill_progress WHERE step = 'demo'")).scalar()
+        self.assertGreaterEqual(last_id, 25)
+
+    def test_create_db_stamps_current_version(self):
+        db.drop_all()
+        with db.engine.begin() as conn:
+            for table_name in ('attendance', 'student', 'class', 'user'):
+                conn.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+        db.create_all()
+        migrations.stamp()
+        self.assertEqual(migrations.applied_versions(), {m.version for m in migrations.MIGRATIONS})
+        self.assertEqual(migrations.migrate(log=self.log.append), [])
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+
+from .base import BaseTestCase
+from attendance_system.app import db, attendance, notifications
+from attendance_system.app.models import NotificationOutbox
+from datetime import date
+
+class RecordingTransport:
+    def __init__(self, error=None):
+        self.messages = []
+        self.error = error
+
+    def send_batch(self, messages):
+        if self.error:
+            return [self.error] * len(messages)
+        self.messages += messages
+        return [None] * len(messages)
+
+class NotificationsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.create_class(name="Notify Class")
+        self.amy = self.create_student(first_name="Amy", class_obj=self.class_obj)
+        self.bob = self.create_student(first_name="Bob", class_obj=self.class_obj)
+        self.amy.guardian_email = "parent@example.com"
+        db.session.commit()
+        self.day = date(2024, 1, 8)
+
+    def statuses(self):
+        return sorted((row.student_id, row.status) for row in NotificationOutbox.query)
+
+    def test_absences_are_queued_with_the_marks(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False, self.bob.id: True})
+        self.assertEqual(self.statuses(), [(self.amy.id, 'pending')])
+
+        # Saving the same absence again queues nothing, absent in another period neither
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False})
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False}, period=2)
+        self.assertEqual(len(self.statuses()), 1)
+
+    def test_dispatch_once_per_student_and_day(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False, self.bob.id: False})
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: True})
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False}) # Queued a second time
+        transport = RecordingTransport()
+
+        result = notifications.dispatch_batch(transport)
+        self.assertEqual(result, notifications.DispatchResult(sent=1, skipped=1, failed=0, rows=3))
+        self.assertEqual([m['To'] for m in transport.messages], ['parent@example.com'])
+        self.assertIn('Amy', transport.messages[0]['Subject'])
+        # Bob has no guardian email
+        self.assertEqual(self.statuses(), [(self.amy.id, 'sent'), (self.amy.id, 'sent'), (self.bob.id, 'skipped')])
+
+        # A later absence the same day is not sent again
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: True})
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False})
+        self.assertEqual(notifications.dispatch_batch(transport).skipped, 1)
+        self.assertEqual(len(transport.messages), 1)
+
+    def test_no_longer_absent_is_skipped(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False})
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: True}, period=1)
+        transport = RecordingTransport()
+        self.assertEqual(notifications.dispatch_batch(transport).skipped, 1)
+        self.assertEqual(transport.messages, [])
+
+    def test_failed_sends_are_retried(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False})
+        failing = RecordingTransport(error=OSError('connection refused'))
+        self.assertEqual(notifications.dispatch_batch(failing, max_attempts=2).failed, 1)
+        row = NotificationOutbox.query.one()
+        self.assertEqual((row.status, row.attempts, row.last_error), ('pending', 1, 'connection refused'))
+        notifications.dispatch_batch(failing, max_attempts=2)
+        self.assertEqual(NotificationOutbox.query.one().status, 'failed')
+
+    def test_file_transport(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.amy.id: False})
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config.update(NOTIFY_TRANSPORT='file', NOTIFY_FILE_DIR=directory)
+            notifications.run_dispatcher(self.app, once=True, log=lambda line: None)
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 1)
+            with open(os.path.join(directory, files[0])) as f:
+                self.assertIn('To: parent@example.com', f.read())
@@ -0,0 +1,60 @@
+from .base import BaseTestCase
+from attendance_system.app import alerts, attendance
+from attendance_system.app.models import AbsenceCounter, Attendance
+from datetime import date
+
+class PeriodsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.create_class(name="Period Class")
+        self.student = self.create_student(class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        self.day = date(2024, 1, 8)
+
+    def counter(self):
+        return AbsenceCounter.query.filter_by(student_id=self.student.id).one()
+
+    def test_marks_per_period(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.student.id: False}, period=1)
+        changes = attendance.save_marks(self.class_obj.id, self.day, {self.student.id: True}, period=2)
+
+        self.assertEqual(changes, [attendance.MarkChange(self.student.id, self.class_obj.id, self.day, 2, None, True)])
+        self.assertEqual({(a.period, a.is_present) for a in Attendance.query.all()}, {(1, False), (2, True)})
+        roster = attendance.load_roster(self.class_obj.id, self.day, 1)
+        self.assertEqual([(s.id, data['is_present']) for s, data in roster], [(self.student.id, False)])
+        # The whole-day registration is still unmarked
+        self.assertEqual(attendance.load_marks(self.class_obj.id, self.day), {})
+
+    def test_absence_counters_follow_days(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.student.id: False}, period=1)
+        self.assertEqual((self.counter().total_days, self.counter().total_absences), (1, 1))
+
+        # Present in a later lesson: the day is no absence any more, and still one day
+        attendance.save_marks(self.class_obj.id, self.day, {self.student.id: True}, period=2)
+        self.assertEqual((self.counter().total_days, self.counter().total_absences), (1, 0))
+        attendance.save_marks(self.class_obj.id, self.day, {self.student.id: False}, period=3)
+        self.assertEqual((self.counter().total_days, self.counter().total_absences), (1, 0))
+
+    def test_matrix_uses_the_day_status(self):
+        attendance.save_marks(self.class_obj.id, self.day, {self.student.id: False}, period=1)
+        matrix = attendance.load_matrix(self.class_obj.id, self.day, self.day)
+        self.assertEqual(matrix.rows[0].statuses, [False])
+
+        attendance.save_marks(self.class_obj.id, self.day, {self.student.id: True}, period=2)
+        matrix = attendance.load_matrix(self.class_obj.id, self.day, self.day)
+        self.assertEqual(matrix.rows[0].statuses, [True]) # Present in one period: present that day
+        self.assertEqual(alerts.rebuild_counters(), 1)
+        self.assertEqual((self.counter().total_days, self.counter().total_absences), (1, 0))
+
+    def test_take_attendance_for_a_period(self):
+        self.register_user()
+        self.login_user()
+        response = self.client.post('/attendance/take', data={
+            'submit_attendance': 'Submit', 'hidden_class_id': self.class_obj.id, 'hidden_date': '2024-01-08',
+            'hidden_period': '3', 'student_ids': [str(self.student.id)]}, follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(a.period, a.is_present) for a in Attendance.query.all()], [(3, False)])
+
+        response = self.client.post('/attendance/take', data={
+            'submit_attendance': 'Submit', 'hidden_class_id': self.class_obj.id, 'hidden_date': '2024-01-08',
+            'hidden_period': '99', 'student_ids': [str(self.student.id)]}, follow_redirects=True)
+        self.assertIn(b'Invalid period', response.data)
@@ -0,0 +1,59 @@
+import time
+
+from .base import BaseTestCase
+from attendance_system.app import create_app, db, profiling
+from attendance_system.app.models import User
+from attendance_system.config import TestingConfig
+
+class ProfilingConfig(TestingConfig):
+    PROFILING = True
+    PROFILE_SAMPLE_RATE = 0.0 # Only requests with the header
+    PROFILE_INTERVAL_MS = 1
+    PROFILE_BUFFER_SIZE = 2
+
+class ProfilingTestCase(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(ProfilingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+        self.register_user()
+        User.query.one().is_admin = True
+        db.session.commit()
+        self.login_user()
+        self.profiler = profiling.get_profiler(self.app)
+
+    def test_admin_header_requests_are_profiled(self):
+        self.client.get('/classes')
+        self.assertEqual(self.profiler.recent(), [])
+
+        self.client.get('/classes', headers={'X-Profile': '1'})
+        profile, = self.profiler.recent()
+        self.assertEqual((profile.path, profile.status), ('/classes', 200))
+
+    def test_stacks_are_folded_and_downloadable(self):
+        profile = self.profiler.start('GET', '/slow', 'slow')
+        deadline = time.monotonic() + 0.05
+        while time.monotonic() < deadline: # Busy, so the sampler sees this frame
+            pass
+        self.profiler.stop(profile, 200, 0.05)
+        self.assertGreater(profile.samples, 0)
+        self.assertIn('test_stacks_are_folded_and_downloadable', profile.folded())
+
+        response = self.client.get(f'/admin/profiles/{profile.id}.folded')
+        self.assertEqual(response.status_code, 200)
+        line = response.get_data(as_text=True).splitlines()[0]
+        self.assertTrue(line.rsplit(' ', 1)[1].isdigit())
+        self.assertIn(b'/slow', self.client.get('/admin/profiles').data)
+
+    def test_ring_buffer_keeps_the_latest(self):
+        for _ in range(3):
+            self.client.get('/alerts.json', headers={'X-Profile': '1'})
+        self.assertEqual([p.id for p in self.profiler.recent()], [3, 2])
+        self.assertEqual(self.client.get('/admin/profiles/1.folded').status_code, 404)
+
+    def test_off_by_default(self):
+        app = create_app(TestingConfig)
+        self.assertIsNone(profiling.get_profiler(app))
+        self.assertEqual(app.before_request_funcs.get(None, []), [])
@@ -0,0 +1,64 @@
+from .base import BaseTestCase
+from attendance_system.app import create_app, db, ratelimit
+from attendance_system.app.models import LoginBucket, User
+from attendance_system.config import TestingConfig
+from unittest import mock
+
+class ProxyConfig(TestingConfig):
+    TRUSTED_PROXY_HOPS = 1
+
+class RateLimitTestCase(BaseTestCase):
+    def test_bucket_empties_and_refills(self):
+        now = 1000.0
+        self.assertTrue(all(ratelimit.take_token('k', 3, 6, now=now) for _ in range(3)))
+        self.assertFalse(ratelimit.take_token('k', 3, 6, now=now))
+        self.assertFalse(ratelimit.take_token('k', 3, 6, now=now + 5)) # Half a token back
+        self.assertTrue(ratelimit.take_token('k', 3, 6, now=now + 10)) # 6 per minute = one per 10s
+        self.assertFalse(ratelimit.take_token('k', 3, 6, now=now + 10))
+        # Capacity caps the refill
+        self.assertEqual(sum(ratelimit.take_token('k', 3, 6, now=now + 3600) for _ in range(5)), 3)
+        self.assertEqual(db.session.get(LoginBucket, 'k').rejected, 5)
+
+    def test_throttled_login_skips_password_check(self):
+        self.register_user(username="victim", password="password")
+        self.app.config['LOGIN_USER_BUCKET_CAPACITY'] = 2
+        with mock.patch.object(User, 'check_password', autospec=True, return_value=False) as check:
+            statuses = [self.client.post('/login', data=dict(username="victim", password="wrong")).status_code
+                        for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 429, 429])
+        self.assertEqual(check.call_count, 2)
+
+        stats = ratelimit.throttle_stats()
+        self.assertEqual(stats['rejected_total'], 2)
+        self.assertEqual(stats['buckets'][0]['key'], ratelimit.user_key('', 'victim'))
+
+    def test_ip_bucket_only_pays_for_failures(self):
+        self.app.config.update(LOGIN_IP_BUCKET_CAPACITY=2, LOGIN_USER_BUCKET_CAPACITY=100)
+        self.register_user(username="natuser", password="password")
+        for _ in range(3): # A whole school behind one address keeps logging in
+            self.assertEqual(self.login_user(username="natuser", password="password").status_code, 200)
+            self.client.get('/logout')
+        statuses = [self.client.post('/login', data=dict(username="natuser", password="wrong")).status_code
+                    for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(db.session.get(LoginBucket, ratelimit.ip_key('127.0.0.1')).rejected, 1)
+
+    def test_client_ip_from_trusted_proxy(self):
+        app = create_app(ProxyConfig)
+        with app.app_context():
+            db.create_all()
+            app.test_client().post('/login', data=dict(username="nobody", password="wrong"),
+                                   headers={'X-Forwarded-For': '203.0.113.7'})
+            self.assertIsNotNone(db.session.get(LoginBucket, ratelimit.ip_key('203.0.113.7')))
+            db.session.remove()
+
+    def test_stats_admin_only(self):
+        self.register_user(username="plainuser", password="password")
+        self.login_user(username="plainuser", password="password")
+        self.assertEqual(self.client.get('/admin/login_throttle.json').status_code, 403)
+
+        User.query.filter_by(username="plainuser").update({'is_admin': True})
+        db.session.commit()
+        response = self.client.get('/admin/login_throttle.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['rejected_total'], 0)
@@ -0,0 +1,43 @@
+from .base import BaseTestCase
+from attendance_system.app import db, reads
+from attendance_system.app.models import School, Student
+from datetime import date
+
+class ReadsTestCase(BaseTestCase):
+    def test_student_rows(self):
+        class_obj = self.create_class(name="Lean Class")
+        self.create_student(first_name="Zed", last_name="Z", class_obj=class_obj)
+        self.create_student(first_name="Amy", last_name="A", class_obj=class_obj)
+        self.create_student(first_name="Nobody", last_name="N")
+        school = School(name="Other", slug="other")
+        db.session.add(school)
+        db.session.commit()
+        db.session.add(Student(first_name="Else", last_name="E", school_id=school.id))
+        db.session.commit()
+
+        rows = reads.student_rows()
+
+        self.assertEqual([row.first_name for row in rows], ["Amy", "Nobody", "Zed"])
+        self.assertEqual(rows[0].class_assigned.name, "Lean Class")
+        self.assertIsNone(rows[1].class_assigned)
+        self.assertIs(rows[0].class_assigned, rows[2].class_assigned) # One ClassRef per class
+        self.assertEqual([row.first_name for row in reads.student_rows(school.id)], ["Else"])
+
+    def test_attendance_rows(self):
+        class_a = self.create_class(name="A Class")
+        class_b = self.create_class(name="B Class")
+        amy = self.create_student(first_name="Amy", last_name="A", class_obj=class_a)
+        bob = self.create_student(first_name="Bob", last_name="B", class_obj=class_b)
+        self.create_attendance_record(bob, class_b, date(2024, 1, 8), is_present=False)
+        self.create_attendance_record(amy, class_a, date(2024, 1, 8), is_present=True)
+        self.create_attendance_record(amy, class_a, date(2024, 1, 9), is_present=False)
+
+        rows = reads.attendance_rows()
+        self.assertEqual([(row.date, row.class_attended.name, row.student.first_name) for row in rows],
+                         [(date(2024, 1, 9), "A Class", "Amy"),
+                          (date(2024, 1, 8), "A Class", "Amy"),
+                          (date(2024, 1, 8), "B Class", "Bob")])
+        self.assertFalse(rows[0].is_present)
+
+        rows = reads.attendance_rows(date(2024, 1, 8), class_id=class_b.id)
+        self.assertEqual([(row.student.last_name, row.is_present) for row in rows], [("B", False)])
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from .base import BaseTestCase
+from attendance_system.app import create_app
+from attendance_system.app.models import Class, db, use_read_replica, REPLICA_EXTENSION_KEY
+from attendance_system.config import TestingConfig
+from flask import session
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    """Two SQLite files stand in for the primary and its read replica."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        class ReplicaConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.tmpdir, 'primary.db')
+            READ_REPLICA_URL = 'sqlite:///' + os.path.join(self.tmpdir, 'replica.db')
+
+        self.app = create_app(ReplicaConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.replica = self.app.extensions[REPLICA_EXTENSION_KEY]
+        db.metadata.create_all(self.replica)
+
+        # Different contents make it visible which database answered
+        db.session.add(Class(name="On Primary"))
+        db.session.commit()
+        with self.replica.begin() as conn:
+            conn.execute(Class.__table__.insert(), [{'name': "On Replica"}])
+
+    def tearDown(self):
+        db.session.remove()
+        for engine in list(db.engines.values()) + [self.replica]:
+            engine.dispose()
+        self.app_context.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def class_names(self):
+        return [c.name for c in Class.query.all()]
+
+    def test_reads_default_to_primary(self):
+        with self.app.test_request_context():
+            self.assertEqual(self.class_names(), ["On Primary"])
+
+    def test_read_only_view_uses_replica(self):
+        with self.app.test_request_context():
+            names = use_read_replica(self.class_names)()
+            self.assertEqual(names, ["On Replica"])
+        db.session.remove()
+
+    def test_recent_write_sticks_to_primary(self):
+        with self.app.test_request_context():
+            db.session.add(Class(name="Fresh"))
+            db.session.commit()
+            self.assertIn('_db_write_at', session)
+            db.session.remove()
+            # Within the stickiness window the user must see their own write
+            self.assertEqual(sorted(use_read_replica(self.class_names)()), ["Fresh", "On Primary"])
+            db.session.remove()
+
+            self.app.config['READ_REPLICA_STICKY_SECONDS'] = 0
+            self.assertEqual(use_read_replica(self.class_names)(), ["On Replica"])
+        db.session.remove()
+
+
+class NoReplicaTestCase(BaseTestCase):
+    def test_write_leaves_session_alone(self):
+        with self.app.test_request_context():
+            db.session.add(Class(name="Fresh"))
+            db.session.commit()
+            # No replica to steer away from, so no reason to rewrite the session cookie
+            self.assertNotIn('_db_write_at', session)
+            self.assertFalse(session.modified)
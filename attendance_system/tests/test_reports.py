@@ -0,0 +1,55 @@
+import os
+import tempfile
+import zipfile
+
+from .base import BaseTestCase
+from attendance_system.app import create_app, db, attendance, reports
+from attendance_system.config import TestingConfig
+from datetime import date
+
+class ReportsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, 'term.zip')
+        self.start, self.end = date(2024, 1, 8), date(2024, 1, 12)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def add_classes(self):
+        for n in range(3):
+            class_obj = self.create_class(name=f"Class {n}")
+            student = self.create_student(first_name=f"Pupil{n}", class_obj=class_obj)
+            attendance.save_marks(class_obj.id, self.start, {student.id: False})
+            attendance.save_marks(class_obj.id, self.end, {student.id: True})
+
+    def test_one_file_per_class_and_an_index(self):
+        self.add_classes()
+        seen = []
+        result = reports.generate_reports(self.app, self.start, self.end, self.output, workers=1,
+                                          progress=lambda done, total, report: seen.append((done, total)))
+        self.assertEqual(seen, [(1, 3), (2, 3), (3, 3)])
+        with zipfile.ZipFile(result.path) as archive:
+            names = archive.namelist()
+            self.assertEqual(sorted(names), ['Class_0-1.html', 'Class_1-2.html', 'Class_2-3.html', 'index.html'])
+            report = archive.read('Class_0-1.html').decode()
+        self.assertIn('Pupil0', report)
+        self.assertIn('50.0%', report) # One present, one absent day
+
+    def test_process_pool(self):
+        # The workers open the database themselves, so it has to be a file
+        path = os.path.join(self.directory.name, 'site.db')
+        class FileConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        app = create_app(FileConfig)
+        with app.app_context():
+            db.create_all()
+            self.add_classes()
+            result = reports.generate_reports(app, self.start, self.end, self.output, workers=2)
+            db.session.remove()
+        self.assertEqual(result.classes, 3)
+        with zipfile.ZipFile(result.path) as archive:
+            self.assertIn('Pupil2', archive.read('Class_2-3.html').decode())
+        self.assertFalse(os.path.exists(self.output + '.partial'))
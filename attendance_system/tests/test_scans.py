@@ -0,0 +1,73 @@
+from .base import BaseTestCase
+from attendance_system.app import db, scans
+from attendance_system.app.models import Attendance, Student
+from sqlalchemy.exc import IntegrityError
+from datetime import date
+
+class ScansTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.create_class(name="Scan Class")
+        self.amy = self.create_student(first_name="Amy", class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        self.bob = self.create_student(first_name="Bob", class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        self.amy.card_uid, self.bob.card_uid = "CARD-A", "CARD-B"
+        db.session.commit()
+        scans.directory = scans.CardDirectory() # Nothing cached from other tests
+
+    def test_ingest_scans(self):
+        self.create_attendance_record(self.bob, self.class_obj, date(2024, 1, 8), is_present=False)
+        result = scans.ingest_scans([
+            {'card': 'CARD-A', 'ts': '2024-01-08T08:00:01', 'device': 'door-1'},
+            {'card': 'CARD-A', 'ts': '2024-01-08T08:00:03', 'device': 'door-2'}, # Repeat
+            {'card': 'CARD-B', 'ts': '2024-01-08T08:05:00', 'device': 'door-1'},
+            {'card': 'CARD-A', 'ts': '2024-01-09T08:00:00', 'device': 'door-1'}, # Next day
+            {'card': 'NOPE', 'ts': '2024-01-08T08:00:00', 'device': 'door-1'},
+            {'card': 'CARD-B', 'ts': 'yesterday', 'device': 'door-1'},
+        ])
+
+        self.assertEqual(result, scans.ScanResult(accepted=3, duplicates=1, unknown_cards=['NOPE'], unassigned=0,
+                                                  invalid=1, marks_changed=3))
+        marks = {(a.student_id, a.date): a.is_present for a in Attendance.query.all()}
+        self.assertEqual(marks, {(self.amy.id, date(2024, 1, 8)): True, (self.bob.id, date(2024, 1, 8)): True,
+                                 (self.amy.id, date(2024, 1, 9)): True})
+
+        # Replaying the same scans changes nothing
+        again = scans.ingest_scans([{'card': 'CARD-A', 'ts': '2024-01-08T09:00:00', 'device': 'door-1'}])
+        self.assertEqual(again.marks_changed, 0)
+
+    def test_new_card_picked_up_on_miss(self):
+        scans.ingest_scans([{'card': 'CARD-A', 'ts': '2024-01-08T08:00:00'}]) # Map loaded
+        carl = self.create_student(first_name="Carl", class_obj=self.class_obj, enrolled_from=date(2023, 9, 1))
+        carl.card_uid = "CARD-C"
+        db.session.commit()
+
+        result = scans.ingest_scans([{'card': 'CARD-C', 'ts': '2024-01-08T08:00:00'}])
+        self.assertEqual((result.accepted, result.unknown_cards), (1, []))
+
+    def test_late_scans_count_for_the_class_of_their_day(self):
+        other_class = self.create_class(name="Other Class")
+        self.amy.class_id = other_class.id # Transferred today
+        db.session.commit()
+        today = date.today()
+
+        result = scans.ingest_scans([{'card': 'CARD-A', 'ts': '2024-01-08T08:00:00'},
+                                     {'card': 'CARD-A', 'ts': today.isoformat() + 'T08:00:00'},
+                                     {'card': 'CARD-B', 'ts': '2023-08-31T08:00:00'}]) # Before Bob enrolled
+        self.assertEqual((result.accepted, result.unassigned), (2, 1))
+        marks = {(a.class_id, a.date) for a in Attendance.query.filter_by(student_id=self.amy.id)}
+        self.assertEqual(marks, {(self.class_obj.id, date(2024, 1, 8)), (other_class.id, today)})
+
+    def test_cards_are_unique_in_the_default_school(self):
+        self.bob.card_uid = "CARD-A"
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_scan_api(self):
+        self.register_user(username="scanner")
+        self.login_user(username="scanner")
+        response = self.client.post('/api/scans', json={'scans': [{'card': 'CARD-B', 'ts': '2024-01-08T08:00:00',
+                                                                    'device': 'door-1'}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['marks_changed'], 1)
+        self.assertEqual(self.client.post('/api/scans', json={'scans': 'x'}).status_code, 400)
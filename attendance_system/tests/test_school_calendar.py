@@ -0,0 +1,68 @@
+from .base import BaseTestCase
+from attendance_system.app import db, school_calendar
+from attendance_system.app.bitmap import compact_term
+from attendance_system.app.models import Class, School, Student
+from datetime import date
+
+class SchoolCalendarTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Monday 2024-01-08 to Friday 2024-01-12, Wednesday off
+        school_calendar.add_school_days(date(2024, 1, 6), date(2024, 1, 12))
+        school_calendar.add_holiday(date(2024, 1, 10), date(2024, 1, 10), 'Teacher training')
+        self.math = self.create_class(name="Math")
+        self.art = self.create_class(name="Art")
+        self.empty = self.create_class(name="Empty") # No students, never reported
+        self.student = self.create_student(class_obj=self.math, enrolled_from=date(2023, 9, 1))
+        self.artist = self.create_student(first_name="Art", class_obj=self.art, enrolled_from=date(2023, 9, 1))
+
+    def test_calendar(self):
+        self.assertEqual(school_calendar.school_days(date(2024, 1, 1), date(2024, 1, 31)),
+                         [date(2024, 1, 8), date(2024, 1, 9), date(2024, 1, 11), date(2024, 1, 12)])
+        # Adding the range again keeps the holiday
+        self.assertEqual(school_calendar.add_school_days(date(2024, 1, 8), date(2024, 1, 12)), 0)
+
+    def test_missing_marks(self):
+        for day in (date(2024, 1, 8), date(2024, 1, 9), date(2024, 1, 11)):
+            self.create_attendance_record(self.student, self.math, day)
+        self.create_attendance_record(self.artist, self.art, date(2024, 1, 8), is_present=False)
+
+        report = school_calendar.missing_marks(date(2024, 1, 8), date(2024, 1, 12))
+        self.assertEqual([(m.date, m.class_name) for m in report],
+                         [(date(2024, 1, 9), 'Art'), (date(2024, 1, 11), 'Art'),
+                          (date(2024, 1, 12), 'Art'), (date(2024, 1, 12), 'Math')])
+
+        # Compacted days no longer have attendance rows, but only the unmarked one is missing
+        compact_term(self.math.id, date(2024, 1, 8), date(2024, 1, 12), delete_rows=True)
+        report = school_calendar.missing_marks(date(2024, 1, 8), date(2024, 1, 12))
+        self.assertEqual([m.date for m in report if m.class_name == 'Math'], [date(2024, 1, 12)])
+
+    def test_missing_marks_per_school(self):
+        school = School(name="North", slug="north")
+        db.session.add(school)
+        db.session.commit()
+        north = Class(name="North Math", school_id=school.id)
+        db.session.add(north)
+        db.session.commit()
+        north_student = Student(first_name="N", last_name="S", class_id=north.id, school_id=school.id)
+        db.session.add(north_student)
+        db.session.commit()
+        north_student.enrollments[0].valid_from = date(2023, 9, 1)
+        db.session.commit()
+        self.assertEqual(school_calendar.missing_marks(date(2024, 1, 8), date(2024, 1, 8), school.id), [])
+
+        school_calendar.add_school_days(date(2024, 1, 8), date(2024, 1, 8), school.id)
+        self.assertEqual([m.class_name for m in school_calendar.missing_marks(date(2024, 1, 8), date(2024, 1, 8),
+                                                                              school.id)], ['North Math'])
+        everywhere = school_calendar.missing_marks(date(2024, 1, 8), date(2024, 1, 8), every_school=True)
+        self.assertEqual(sorted(m.class_name for m in everywhere), ['Art', 'Math', 'North Math'])
+
+    def test_missing_marks_page(self):
+        self.register_user()
+        self.login_user()
+        response = self.client.post('/attendance/missing', data={'start_date': '2024-01-08',
+                                                                  'end_date': '2024-01-12'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'2024-01-12', response.data)
+        self.assertIn(b'Math', response.data)
+        self.assertNotIn(b'2024-01-10', response.data)
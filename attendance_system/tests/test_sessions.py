@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from .base import BaseTestCase
+from attendance_system.app import create_app, db, sessions
+from attendance_system.app.models import ServerSession
+from attendance_system.config import TestingConfig
+
+class DatabaseSessionConfig(TestingConfig):
+    SESSION_BACKEND = 'database'
+
+class DatabaseSessionTestCase(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(DatabaseSessionConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def test_session_stored_server_side(self):
+        self.register_user(username="sessionuser")
+        response = self.client.post('/login', data=dict(username="sessionuser", password="password"))
+        self.assertEqual(response.status_code, 302)
+        cookie = self.client.get_cookie('session')
+        self.assertLess(len(cookie.value), 64) # Just the id
+        self.assertEqual(db.session.get(ServerSession, cookie.value).sid, cookie.value)
+
+        # Read-only requests neither touch the row nor send a cookie
+        self.client.get('/home') # Drops the flashed messages
+        response = self.client.get('/alerts.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Set-Cookie', response.headers)
+
+    def test_login_and_logout_rotate_the_id(self):
+        self.register_user(username="rotateuser")
+        with self.client.session_transaction() as session:
+            session['planted'] = True # A session that exists before the login
+        before = self.client.get_cookie('session').value
+
+        self.client.post('/login', data=dict(username="rotateuser", password="password"))
+        after_login = self.client.get_cookie('session').value
+        self.assertNotEqual(after_login, before)
+        self.assertIsNone(db.session.get(ServerSession, before))
+
+        self.client.get('/logout')
+        after_logout = self.client.get_cookie('session').value
+        self.assertNotEqual(after_logout, after_login)
+        self.assertIsNone(db.session.get(ServerSession, after_login))
+        self.assertEqual(ServerSession.query.count(), 1) # Only the one carrying the logout message
+
+    def test_roster_reload_leaves_session_untouched(self):
+        class_obj = self.create_class()
+        self.create_student(class_obj=class_obj)
+        self.register_user(username="rosteruser")
+        self.login_user(username="rosteruser")
+        data = dict(class_id=class_obj.id, date='2024-01-08', submit_select='Load')
+        self.client.post('/attendance/take', data=data)
+        response = self.client.post('/attendance/take', data=data)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Set-Cookie', response.headers)
+
+    def test_prune_sessions(self):
+        now = datetime.utcnow()
+        db.session.add_all([ServerSession(sid='old', data='{}', expires_at=now - timedelta(minutes=1)),
+                            ServerSession(sid='live', data='{}', expires_at=now + timedelta(days=1))])
+        db.session.commit()
+        self.assertEqual(sessions.prune_sessions(), 1)
+        self.assertEqual([s.sid for s in ServerSession.query.all()], ['live'])
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing the app and calling create_app() must stay under this (best of a few runs)
+STARTUP_BUDGET_SECONDS = 2.0
+# Only needed once a request is dispatched or a report is built
+LAZY_MODULES = ['app.routes', 'app.forms', 'flask_wtf', 'wtforms', 'wtforms_sqlalchemy', 'numpy']
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+print(time.perf_counter() - start)
+print(' '.join(sorted(m for m in %r if m in sys.modules)))
+""" % (LAZY_MODULES,)
+
+class StartupTestCase(unittest.TestCase):
+    def probe(self):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout.splitlines()
+        return float(output[0]), output[1].split() if len(output) > 1 else []
+
+    def test_create_app_skips_web_stack(self):
+        _, loaded = self.probe()
+        self.assertEqual(loaded, [])
+
+    def test_startup_budget(self):
+        best = min(self.probe()[0] for _ in range(3))
+        self.assertLess(best, STARTUP_BUDGET_SECONDS)
+
+if __name__ == '__main__':
+    unittest.main()
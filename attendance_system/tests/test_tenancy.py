@@ -0,0 +1,79 @@
+from .base import BaseTestCase
+from attendance_system.app import tenancy
+from attendance_system.app.forms import get_all_classes
+from attendance_system.app.models import School, User, Class, db
+from flask_login import login_user
+from sqlalchemy.exc import IntegrityError
+
+class TenancyTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.north = School(name="North High", slug="north")
+        self.south = School(name="South High", slug="south")
+        db.session.add_all([self.north, self.south])
+        db.session.commit()
+
+    def create_user(self, username, school):
+        user = User(username=username, school_id=school.id if school else None)
+        user.set_password("password")
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def test_resolve_school(self):
+        self.assertEqual(tenancy.resolve_school(""), (True, None))
+        self.assertEqual(tenancy.resolve_school(" North "), (True, self.north))
+        self.assertEqual(tenancy.resolve_school("west"), (False, None))
+
+    def test_class_names_are_unique_per_school(self):
+        db.session.add(Class(name="Math", school_id=self.north.id))
+        db.session.add(Class(name="Math", school_id=self.south.id))
+        db.session.commit() # Same name in two schools is fine
+
+        db.session.add(Class(name="Math", school_id=self.north.id))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_default_school_names_are_unique(self):
+        # The default tenant's school_id is NULL, which a plain unique constraint ignores
+        for duplicate in ([Class(name="Dup"), Class(name="Dup")],
+                          [User(username="dup", password_hash="x"), User(username="dup", password_hash="x")]):
+            db.session.add_all(duplicate)
+            with self.assertRaises(IntegrityError):
+                db.session.commit()
+            db.session.rollback()
+
+    def test_queries_are_scoped_to_the_users_school(self):
+        db.session.add_all([Class(name="North Math", school_id=self.north.id),
+                            Class(name="South Math", school_id=self.south.id),
+                            Class(name="Default Math")])
+        db.session.commit()
+        north_user = self.create_user("teacher", self.north)
+
+        with self.app.test_request_context():
+            login_user(north_user)
+            self.assertEqual([c.name for c in get_all_classes()], ["North Math"])
+            self.assertEqual(tenancy.scoped(Class).count(), 1)
+        self.assertEqual([c.name for c in tenancy.scoped(Class, self.south.id)], ["South Math"])
+
+    def test_login_resolves_tenant(self):
+        self.create_user("teacher", self.north)
+        self.create_user("teacher", self.south) # Same username in another school
+
+        response = self.client.post('/login', data=dict(school="south", username="teacher", password="password"))
+        self.assertEqual(response.status_code, 302)
+        with self.client.session_transaction() as sess:
+            logged_in = db.session.get(User, int(sess['_user_id']))
+        self.assertEqual(logged_in.school_id, self.south.id)
+
+    def test_other_schools_objects_are_not_found(self):
+        south_class = Class(name="South Only", school_id=self.south.id)
+        db.session.add(south_class)
+        db.session.commit()
+        self.create_user("teacher", self.north)
+        self.client.post('/login', data=dict(school="north", username="teacher", password="password"))
+
+        response = self.client.post(f'/delete_class/{south_class.id}')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNotNone(db.session.get(Class, south_class.id))